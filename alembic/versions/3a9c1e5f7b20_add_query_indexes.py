@@ -0,0 +1,83 @@
+"""Add indexes for API filters and sort orders
+
+Revision ID: 3a9c1e5f7b20
+Revises: 182183820ac5
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3a9c1e5f7b20'
+down_revision: Union[str, Sequence[str], None] = '182183820ac5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Same indexes as init_database() in app.py; tables or columns that do not
+# exist in this schema are skipped
+INDEXES = [
+    ('idx_mosques_active_name', 'mosques', ['is_active', 'name']),
+    ('idx_events_active_date', 'events', ['is_active', 'event_date', 'event_time']),
+    ('idx_events_mosque_date', 'events', ['mosque_id', 'event_date']),
+    ('idx_news_status_published', 'news', ['status', 'published_at']),
+    ('idx_news_author', 'news', ['author_id']),
+    ('idx_users_mosque', 'users', ['mosque_id']),
+    ('idx_user_sessions_user', 'user_sessions', ['user_id']),
+    ('idx_donations_created', 'donations', ['created_at']),
+    ('idx_donations_mosque_created', 'donations', ['mosque_id', 'created_at']),
+    ('idx_donations_campaign', 'donations', ['campaign_id']),
+    ('idx_campaigns_status_created', 'campaigns', ['status', 'created_at']),
+    ('idx_campaigns_mosque', 'campaigns', ['mosque_id']),
+    ('idx_media_files_public_created', 'media_files', ['is_public', 'created_at']),
+    ('idx_media_files_uploaded_by', 'media_files', ['uploaded_by']),
+    ('idx_notifications_user_created', 'notifications', ['user_id', 'created_at']),
+    ('idx_notifications_user_unread', 'notifications', ['user_id', 'is_read']),
+    ('idx_analytics_events_created', 'analytics_events', ['created_at']),
+    ('idx_analytics_events_mosque_created', 'analytics_events', ['mosque_id', 'created_at']),
+    ('idx_page_views_created', 'page_views', ['created_at']),
+    ('idx_user_activity_user_created', 'user_activity', ['user_id', 'created_at']),
+    ('idx_user_activity_created', 'user_activity', ['created_at']),
+]
+
+# Names of the indexes upgrade() created. Any index that already existed
+# (from the initial schema or init_database()) is left alone by downgrade().
+CREATED_TABLE = 'query_indexes_created'
+
+
+def _applicable_indexes():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    for name, table, columns in INDEXES:
+        if table not in tables:
+            continue
+        existing_columns = {column['name'] for column in inspector.get_columns(table)}
+        existing_indexes = {index['name'] for index in inspector.get_indexes(table)}
+        if set(columns) <= existing_columns:
+            yield name, table, columns, name in existing_indexes
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    created = []
+    for name, table, columns, exists in _applicable_indexes():
+        if not exists:
+            op.create_index(name, table, columns, unique=False)
+            created.append({'name': name})
+
+    record = op.create_table(CREATED_TABLE, sa.Column('name', sa.String(100), primary_key=True))
+    if created:
+        op.bulk_insert(record, created)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    created = {row[0] for row in op.get_bind().execute(sa.text(f'SELECT name FROM {CREATED_TABLE}'))}
+    for name, table, columns, exists in _applicable_indexes():
+        if exists and name in created:
+            op.drop_index(name, table_name=table)
+    op.drop_table(CREATED_TABLE)
@@ -0,0 +1,224 @@
+"""
+Buffered analytics ingestion for VGM Website
+Accepts tracking rows without touching the database on the request thread and writes them in batches
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+import logging
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# INSERT statement per buffered table; created_at is captured at submit time
+# so batching does not shift timestamps
+INSERT_STATEMENTS = {
+    'analytics_events': '''
+        INSERT INTO analytics_events (event_type, user_id, mosque_id, event_data, ip_address, user_agent, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''',
+    'page_views': '''
+        INSERT INTO page_views (page_path, user_id, session_id, ip_address, user_agent, referrer, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''',
+    'user_activity': '''
+        INSERT INTO user_activity (user_id, activity_type, activity_data, ip_address, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''',
+}
+
+
+class AnalyticsBuffer:
+    """Bounded in-process queue of analytics rows flushed with executemany.
+
+    A background thread writes a batch once ``batch_size`` rows are queued or
+    ``flush_interval`` seconds after the first row of a batch arrived, so a
+    burst of page views costs one transaction instead of one commit each.
+    When the queue is full, ``submit`` waits at most ``block_timeout`` seconds
+    and then drops the row and counts it. ``after_write`` is called with the
+    writer connection after each committed batch (e.g. to run rollups).
+    """
+
+    def __init__(self, pool, max_size: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 1.0, block_timeout: float = 0.0,
+                 after_write: Optional[Callable[[sqlite3.Connection], Any]] = None):
+        self.pool = pool
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self.after_write = after_write
+
+        self._queue: 'queue.Queue[Tuple[str, tuple]]' = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid = os.getpid()
+        self._closed = False
+        self._stats = {
+            'submitted': 0,
+            'written': 0,
+            'dropped': 0,
+            'failed': 0,
+            'batches': 0,
+        }
+
+    def _ensure_worker(self):
+        """Start the flush thread lazily, and again in a forked worker"""
+        with self._lock:
+            pid = os.getpid()
+            if pid != self._pid:
+                # Rows queued before the fork belong to the parent
+                self._pid = pid
+                self._queue = queue.Queue(maxsize=self.max_size)
+                self._thread = None
+                self._conn = None
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='analytics-flush', daemon=True)
+                self._thread.start()
+
+    def submit(self, table: str, row: tuple) -> bool:
+        """Queue one row for ``table``; returns False if it was dropped"""
+        if table not in INSERT_STATEMENTS:
+            raise ValueError(f"Unknown analytics table: {table}")
+        if self._closed:
+            return self._write([(table, self._stamp(row))])
+
+        self._ensure_worker()
+        try:
+            if self.block_timeout > 0:
+                self._queue.put((table, self._stamp(row)), timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait((table, self._stamp(row)))
+        except queue.Full:
+            with self._lock:
+                self._stats['dropped'] += 1
+            return False
+
+        with self._lock:
+            self._stats['submitted'] += 1
+        return True
+
+    @staticmethod
+    def _stamp(row: tuple) -> tuple:
+        # Same format as SQLite CURRENT_TIMESTAMP (UTC)
+        return tuple(row) + (datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),)
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect(self.flush_interval)
+            if batch:
+                self._write(batch)
+
+    def _collect(self, wait: float) -> List[Tuple[str, tuple]]:
+        """Wait up to ``wait`` for a first row, then gather a batch"""
+        try:
+            first = self._queue.get(timeout=wait)
+        except queue.Empty:
+            return []
+        if first is None:
+            return []
+
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                break
+            batch.append(item)
+        return batch
+
+    def _write(self, batch: List[Tuple[str, tuple]]) -> bool:
+        """Insert a batch in one transaction, grouped by table.
+
+        Uses the buffer's own connection rather than the pool's thread-local
+        one, so a flush from a request thread (or after close) can never
+        commit or roll back that request's open transaction.
+        """
+        grouped: Dict[str, List[tuple]] = {}
+        for table, row in batch:
+            grouped.setdefault(table, []).append(row)
+
+        with self._write_lock:
+            try:
+                if self._conn is None:
+                    self._conn = self.pool.dedicated_connection()
+                for table, rows in grouped.items():
+                    self._conn.executemany(INSERT_STATEMENTS[table], rows)
+                self._conn.commit()
+            except sqlite3.Error as e:
+                if self._conn is not None:
+                    self._conn.rollback()
+                logger.error(f"Failed to write {len(batch)} analytics rows: {e}")
+                with self._lock:
+                    self._stats['failed'] += len(batch)
+                return False
+
+            if self.after_write is not None:
+                try:
+                    self.after_write(self._conn)
+                except Exception as e:
+                    logger.error(f"Analytics after_write hook failed: {e}")
+
+        with self._lock:
+            self._stats['written'] += len(batch)
+            self._stats['batches'] += 1
+        return True
+
+    def flush(self) -> int:
+        """Write everything queued so far on the calling thread"""
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                batch.append(item)
+        for start in range(0, len(batch), self.batch_size):
+            self._write(batch[start:start + self.batch_size])
+        return len(batch)
+
+    def close(self):
+        """Stop the flush thread and write what is left (worker shutdown)"""
+        if self._closed:
+            return
+        self._closed = True
+        self._stop.set()
+        try:
+            # Wake the flush thread if it is waiting for a first row
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        thread = self._thread
+        if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout=self.flush_interval * 2 + 5)
+        flushed = self.flush()
+        if flushed:
+            logger.info(f"Flushed {flushed} buffered analytics rows on shutdown")
+        with self._write_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Buffer statistics for monitoring"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['queued'] = self._queue.qsize()
+        stats['max_size'] = self.max_size
+        stats['batch_size'] = self.batch_size
+        stats['flush_interval'] = self.flush_interval
+        return stats
@@ -5,22 +5,70 @@ P2 Implementation: Stripe Integration
 """
 
 import os
+import atexit
 import logging
 import secrets
 import hashlib
+import json
+import sqlite3
+import time
 import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from flask import Flask, request, jsonify, session, send_from_directory
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
-import sqlite3
 import jwt
 import stripe
 
+from db_pool import SQLiteConnectionPool, DEFAULT_DB_PATH
+from analytics_buffer import AnalyticsBuffer
+from notification_bus import NotificationBus
+from services.analytics_rollup import (
+    init_rollup_tables, run_rollup, window_counts, window_total
+)
+from services.notification_counts import (
+    init_notification_counters, rebuild_notification_counters, get_unread_count
+)
+from services.notification_broadcast import (
+    AUDIENCES as BROADCAST_AUDIENCES, init_broadcast_tables, create_broadcast, run_broadcast,
+    pending_broadcasts, get_broadcast
+)
+from services.exports import (
+    EXPORTS, FORMATS as EXPORT_FORMATS, ENCODERS as EXPORT_ENCODERS, build_export_query,
+    iter_json_array, export_headers
+)
+from services.resource_versions import init_resource_versions, get_validators
+from services.mawaqit_directory import MawaqitDirectory, MAWAQIT_SEARCH_URL, init_mawaqit_uuids
+from services.mosque_locations import MosqueLocationIndex, parse_point, validate_point
+from services.prayer_times import PrayerTimeService
+from cache_service import (
+    cache, search_cache_key, get_cached_search_results, cache_search_results,
+    invalidate_campaigns_cache
+)
+from services.search_index import (
+    init_search_index, rebuild_search_index, build_match_query, fts_table,
+    encode_cursor, decode_cursor, MAX_PER_PAGE as SEARCH_MAX_PER_PAGE,
+    COUNT_ESTIMATE_CAP as SEARCH_COUNT_ESTIMATE_CAP
+)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# SQLite VM instructions between search time budget checks
+SEARCH_PROGRESS_INTERVAL = 1000
+
+# Analytics buffers of every app in this process, flushed by one exit handler
+_analytics_buffers = weakref.WeakSet()
+
+
+@atexit.register
+def _close_analytics_buffers():
+    for buffer in list(_analytics_buffers):
+        buffer.close()
+
 def create_app():
     """Create Flask application with payment processing"""
     app = Flask(__name__)
@@ -43,6 +91,28 @@ def create_app():
     app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
     app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
     
+    # Search configuration: 'fts' uses the FTS5 index when available, 'like' forces table scans
+    app.config['SEARCH_BACKEND'] = os.environ.get('SEARCH_BACKEND', 'fts')
+    # Per-type search queries run in parallel on this many workers (1 = sequential),
+    # each type getting SEARCH_TYPE_BUDGET_MS before it is interrupted (0 = no limit)
+    app.config['SEARCH_FANOUT_WORKERS'] = int(os.environ.get('SEARCH_FANOUT_WORKERS', 4))
+    app.config['SEARCH_TYPE_BUDGET_MS'] = int(os.environ.get('SEARCH_TYPE_BUDGET_MS', 2000))
+    # Recipients inserted per transaction when delivering a notification broadcast
+    app.config['NOTIFICATION_BROADCAST_BATCH'] = int(os.environ.get('NOTIFICATION_BROADCAST_BATCH', 5000))
+    # Notification streams send a comment line after this many idle seconds and
+    # end after NOTIFICATION_STREAM_MAX_SECONDS; EventSource reconnects with Last-Event-ID
+    app.config['NOTIFICATION_STREAM_HEARTBEAT'] = float(os.environ.get('NOTIFICATION_STREAM_HEARTBEAT', 15))
+    app.config['NOTIFICATION_STREAM_MAX_SECONDS'] = float(os.environ.get('NOTIFICATION_STREAM_MAX_SECONDS', 300))
+    # Browsers and CDNs may reuse public list responses for PUBLIC_CACHE_MAX_AGE seconds and
+    # serve them stale for PUBLIC_CACHE_STALE_SECONDS more while revalidating with the ETag
+    app.config['PUBLIC_CACHE_MAX_AGE'] = int(os.environ.get('PUBLIC_CACHE_MAX_AGE', 60))
+    app.config['PUBLIC_CACHE_STALE_SECONDS'] = int(os.environ.get('PUBLIC_CACHE_STALE_SECONDS', 300))
+    # Nearby mosque queries (/api/mosques/nearby, /api/search?near=): radius in km when
+    # none is given, the largest radius accepted and the most mosques returned
+    app.config['NEARBY_DEFAULT_RADIUS_KM'] = float(os.environ.get('NEARBY_DEFAULT_RADIUS_KM', 10))
+    app.config['NEARBY_MAX_RADIUS_KM'] = float(os.environ.get('NEARBY_MAX_RADIUS_KM', 100))
+    app.config['NEARBY_MAX_LIMIT'] = int(os.environ.get('NEARBY_MAX_LIMIT', 100))
+    
     # Create upload directory if it doesn't exist
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
     
@@ -64,12 +134,76 @@ def create_app():
         methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS']
     )
     
+    # Database configuration
+    DB_PATH = os.environ.get('SQLITE_DB_PATH', DEFAULT_DB_PATH)
+    db_pool = SQLiteConnectionPool(
+        DB_PATH,
+        max_idle=int(os.environ.get('SQLITE_POOL_MAX_IDLE', 8)),
+        cached_statements=int(os.environ.get('SQLITE_STATEMENT_CACHE', 256))
+    )
+    app.extensions['db_pool'] = db_pool
+    
+    # Shared by all requests so concurrent searches cannot open unbounded connections
+    search_executor = ThreadPoolExecutor(
+        max_workers=max(app.config['SEARCH_FANOUT_WORKERS'], 1),
+        thread_name_prefix='search'
+    )
+    app.extensions['search_executor'] = search_executor
+    
+    # Broadcasts are delivered one at a time off the request thread
+    broadcast_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='broadcast')
+    app.extensions['broadcast_executor'] = broadcast_executor
+    
+    # Analytics rollups are refreshed by the buffer's writer at most this often
+    ANALYTICS_ROLLUP_INTERVAL = float(os.environ.get('ANALYTICS_ROLLUP_INTERVAL', 300))
+    last_rollup = {'at': 0.0}
+    
+    def maybe_run_rollup(conn):
+        """Fold new raw analytics rows into the rollups if the interval has passed"""
+        if time.monotonic() - last_rollup['at'] < ANALYTICS_ROLLUP_INTERVAL:
+            return
+        last_rollup['at'] = time.monotonic()
+        run_rollup(conn)
+    
+    # Tracking endpoints queue rows here; a background thread batches the INSERTs
+    analytics_buffer = AnalyticsBuffer(
+        db_pool,
+        max_size=int(os.environ.get('ANALYTICS_BUFFER_SIZE', 10000)),
+        batch_size=int(os.environ.get('ANALYTICS_BATCH_SIZE', 500)),
+        flush_interval=float(os.environ.get('ANALYTICS_FLUSH_INTERVAL', 1.0)),
+        block_timeout=float(os.environ.get('ANALYTICS_BLOCK_TIMEOUT', 0.05)),
+        after_write=maybe_run_rollup
+    )
+    app.extensions['analytics_buffer'] = analytics_buffer
+    _analytics_buffers.add(analytics_buffer)
+    
+    # Wakes open notification streams; goes through Redis pub/sub when configured
+    # so a notification written by one worker reaches streams held by another
+    notification_bus = NotificationBus(cache.redis_client if cache.is_available() else None)
+    app.extensions['notification_bus'] = notification_bus
+    
+    # Mawaqit mosque UUIDs, so the prayer time fallback skips the search request
+    mawaqit_directory = MawaqitDirectory(MAWAQIT_SEARCH_URL, db_pool.connection)
+    app.extensions['mawaqit_directory'] = mawaqit_directory
+    
+    # Prayer times with the Aladhan/Mawaqit fallback; it resolves UUIDs through
+    # the directory above, so pins and refresh-mawaqit-uuids apply to it
+    prayer_time_service = PrayerTimeService(directory=mawaqit_directory)
+    app.extensions['prayer_time_service'] = prayer_time_service
+    
+    # Mosque coordinates in an in-memory grid, rebuilt when the mosques version moves
+    mosque_locations = MosqueLocationIndex(db_pool.connection)
+    app.extensions['mosque_locations'] = mosque_locations
+    
+    @app.teardown_appcontext
+    def release_db_connection(exception=None):
+        """Return the request's pooled connection, even if a handler forgot to close it"""
+        db_pool.release_thread()
+    
     # Database helper functions
     def get_db_connection():
-        """Get database connection"""
-        conn = sqlite3.connect('instance/vgm_website.db')
-        conn.row_factory = sqlite3.Row
-        return conn
+        """Get pooled database connection (close() returns it to the pool)"""
+        return db_pool.connection()
     
     def hash_password(password):
         """Hash password using SHA-256"""
@@ -121,11 +255,26 @@ def create_app():
             ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (user_id, mosque_id, title, message, notification_type, priority, action_url, metadata, expires_at))
         
+        # notification_counters is updated by trigger in this transaction
         notification_id = cursor.lastrowid
         conn.commit()
         conn.close()
+        notification_bus.publish([user_id])
         return notification_id
     
+    def deliver_broadcast(broadcast_id):
+        """Insert a broadcast's notifications; runs on the broadcast executor"""
+        conn = get_db_connection()
+        try:
+            return run_broadcast(
+                conn, broadcast_id, app.config['NOTIFICATION_BROADCAST_BATCH'],
+                on_batch=notification_bus.publish
+            )
+        except Exception as e:
+            logger.error(f"Error delivering broadcast {broadcast_id}: {e}")
+        finally:
+            conn.close()
+    
     def get_user_notifications(user_id, limit=50, offset=0, unread_only=False):
         """Get notifications for a user"""
         conn = get_db_connection()
@@ -159,6 +308,7 @@ def create_app():
         ''', (notification_id, user_id))
         conn.commit()
         conn.close()
+        notification_bus.publish([user_id])
     
     def mark_all_notifications_read(user_id):
         """Mark all notifications as read for a user"""
@@ -170,95 +320,56 @@ def create_app():
         ''', (user_id,))
         conn.commit()
         conn.close()
+        notification_bus.publish([user_id])
     
     def get_notification_count(user_id):
-        """Get unread notification count for a user"""
+        """Get unread notification count and its version for a user"""
         conn = get_db_connection()
-        count = conn.execute('''
-            SELECT COUNT(*) FROM notifications 
-            WHERE user_id = ? AND is_read = 0
-        ''', (user_id,)).fetchone()[0]
+        count, version = get_unread_count(conn, user_id)
         conn.close()
-        return count
+        return count, version
     
     def track_analytics_event(event_type, user_id=None, mosque_id=None, event_data=None, ip_address=None, user_agent=None):
-        """Track an analytics event"""
-        conn = get_db_connection()
-        conn.execute('''
-            INSERT INTO analytics_events (event_type, user_id, mosque_id, event_data, ip_address, user_agent)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (event_type, user_id, mosque_id, event_data, ip_address, user_agent))
-        conn.commit()
-        conn.close()
+        """Queue an analytics event; returns False if the buffer is full"""
+        return analytics_buffer.submit(
+            'analytics_events', (event_type, user_id, mosque_id, event_data, ip_address, user_agent)
+        )
     
     def track_page_view(page_path, user_id=None, session_id=None, ip_address=None, user_agent=None, referrer=None):
-        """Track a page view"""
-        conn = get_db_connection()
-        conn.execute('''
-            INSERT INTO page_views (page_path, user_id, session_id, ip_address, user_agent, referrer)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (page_path, user_id, session_id, ip_address, user_agent, referrer))
-        conn.commit()
-        conn.close()
+        """Queue a page view; returns False if the buffer is full"""
+        return analytics_buffer.submit(
+            'page_views', (page_path, user_id, session_id, ip_address, user_agent, referrer)
+        )
     
     def track_user_activity(user_id, activity_type, activity_data=None, ip_address=None):
-        """Track user activity"""
-        conn = get_db_connection()
-        conn.execute('''
-            INSERT INTO user_activity (user_id, activity_type, activity_data, ip_address)
-            VALUES (?, ?, ?, ?)
-        ''', (user_id, activity_type, activity_data, ip_address))
-        conn.commit()
-        conn.close()
+        """Queue user activity; returns False if the buffer is full"""
+        return analytics_buffer.submit(
+            'user_activity', (user_id, activity_type, activity_data, ip_address)
+        )
     
     def get_analytics_summary(days=30):
-        """Get analytics summary for the last N days"""
+        """Get analytics summary for the last N days (from rollups plus the raw tail)"""
         conn = get_db_connection()
         
         # Page views
-        page_views = conn.execute('''
-            SELECT page_path, COUNT(*) as views
-            FROM page_views
-            WHERE created_at >= datetime('now', '-{} days')
-            GROUP BY page_path
-            ORDER BY views DESC
-            LIMIT 10
-        '''.format(days)).fetchall()
+        page_views = window_counts(conn, 'page_views', days)[:10]
         
         # Event types
-        events = conn.execute('''
-            SELECT event_type, COUNT(*) as count
-            FROM analytics_events
-            WHERE created_at >= datetime('now', '-{} days')
-            GROUP BY event_type
-            ORDER BY count DESC
-        '''.format(days)).fetchall()
+        events = window_counts(conn, 'analytics_events', days)
         
         # User activity
-        user_activity = conn.execute('''
-            SELECT activity_type, COUNT(*) as count
-            FROM user_activity
-            WHERE created_at >= datetime('now', '-{} days')
-            GROUP BY activity_type
-            ORDER BY count DESC
-        '''.format(days)).fetchall()
+        user_activity = window_counts(conn, 'user_activity', days)
         
         # Daily stats
-        daily_stats = conn.execute('''
-            SELECT DATE(created_at) as date, COUNT(*) as page_views
-            FROM page_views
-            WHERE created_at >= datetime('now', '-{} days')
-            GROUP BY DATE(created_at)
-            ORDER BY date DESC
-        '''.format(days)).fetchall()
+        daily_stats = window_counts(conn, 'page_views', days, group_by='day')
         
         conn.close()
         
         return {
-            'page_views': [dict(row) for row in page_views],
-            'events': [dict(row) for row in events],
-            'user_activity': [dict(row) for row in user_activity],
-            'daily_stats': [dict(row) for row in daily_stats]
+            'page_views': [{'page_path': row['key'], 'views': row['count']} for row in page_views],
+            'events': [{'event_type': row['key'], 'count': row['count']} for row in events],
+            'user_activity': [{'activity_type': row['key'], 'count': row['count']} for row in user_activity],
+            'daily_stats': [{'date': row['key'], 'page_views': row['count']} for row in daily_stats]
         }
     
     def init_database():
@@ -509,6 +620,33 @@ def create_app():
             )
         ''')
         
+        # Indexes for the filters and sort orders used by the API; keep in sync
+        # with the Alembic migration and tests/test_query_plans.py
+        for statement in (
+            'CREATE INDEX IF NOT EXISTS idx_mosques_active_name ON mosques (is_active, name)',
+            'CREATE INDEX IF NOT EXISTS idx_events_active_date ON events (is_active, event_date, event_time)',
+            'CREATE INDEX IF NOT EXISTS idx_events_mosque_date ON events (mosque_id, event_date)',
+            'CREATE INDEX IF NOT EXISTS idx_news_status_published ON news (status, published_at)',
+            'CREATE INDEX IF NOT EXISTS idx_news_author ON news (author_id)',
+            'CREATE INDEX IF NOT EXISTS idx_users_mosque ON users (mosque_id)',
+            'CREATE INDEX IF NOT EXISTS idx_user_sessions_user ON user_sessions (user_id)',
+            'CREATE INDEX IF NOT EXISTS idx_donations_created ON donations (created_at)',
+            'CREATE INDEX IF NOT EXISTS idx_donations_mosque_created ON donations (mosque_id, created_at)',
+            'CREATE INDEX IF NOT EXISTS idx_donations_campaign ON donations (campaign_id)',
+            'CREATE INDEX IF NOT EXISTS idx_campaigns_status_created ON campaigns (status, created_at)',
+            'CREATE INDEX IF NOT EXISTS idx_campaigns_mosque ON campaigns (mosque_id)',
+            'CREATE INDEX IF NOT EXISTS idx_media_files_public_created ON media_files (is_public, created_at)',
+            'CREATE INDEX IF NOT EXISTS idx_media_files_uploaded_by ON media_files (uploaded_by)',
+            'CREATE INDEX IF NOT EXISTS idx_notifications_user_created ON notifications (user_id, created_at)',
+            'CREATE INDEX IF NOT EXISTS idx_notifications_user_unread ON notifications (user_id, is_read)',
+            'CREATE INDEX IF NOT EXISTS idx_analytics_events_created ON analytics_events (created_at)',
+            'CREATE INDEX IF NOT EXISTS idx_analytics_events_mosque_created ON analytics_events (mosque_id, created_at)',
+            'CREATE INDEX IF NOT EXISTS idx_page_views_created ON page_views (created_at)',
+            'CREATE INDEX IF NOT EXISTS idx_user_activity_user_created ON user_activity (user_id, created_at)',
+            'CREATE INDEX IF NOT EXISTS idx_user_activity_created ON user_activity (created_at)',
+        ):
+            conn.execute(statement)
+        
         # Insert sample data if tables are empty
         if conn.execute('SELECT COUNT(*) FROM mosques').fetchone()[0] == 0:
             # Sample mosques
@@ -572,13 +710,71 @@ def create_app():
             ''', news_data)
         
         conn.commit()
+        
+        # Full-text search index (FTS5 + sync triggers)
+        app.config['SEARCH_FTS_AVAILABLE'] = init_search_index(conn)
+        init_rollup_tables(conn)
+        init_notification_counters(conn)
+        init_broadcast_tables(conn)
+        init_resource_versions(conn)
+        init_mawaqit_uuids(conn)
+        
         conn.close()
         logger.info("Database initialized successfully with payment processing")
     
     # Initialize database
-    os.makedirs('instance', exist_ok=True)
     init_database()
     
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index_command():
+        """Rebuild the FTS5 search index from the content tables"""
+        conn = get_db_connection()
+        try:
+            counts = rebuild_search_index(conn)
+        finally:
+            conn.close()
+        for content_type, count in counts.items():
+            print(f"{content_type}: {count} rows indexed")
+    
+    @app.cli.command('rollup-analytics')
+    def rollup_analytics_command():
+        """Fold new page views, events and activity into the analytics rollups"""
+        conn = get_db_connection()
+        try:
+            folded = run_rollup(conn)
+        finally:
+            conn.close()
+        for source, count in folded.items():
+            print(f"{source}: {count} rows rolled up")
+    
+    @app.cli.command('rebuild-notification-counters')
+    def rebuild_notification_counters_command():
+        """Recompute the unread notification counters from the notifications table"""
+        conn = get_db_connection()
+        try:
+            counts = rebuild_notification_counters(conn)
+        finally:
+            conn.close()
+        print(f"{counts['users']} notification counters rebuilt")
+    
+    @app.cli.command('run-broadcasts')
+    def run_broadcasts_command():
+        """Deliver notification broadcasts that are queued or were interrupted"""
+        conn = get_db_connection()
+        try:
+            broadcast_ids = pending_broadcasts(conn)
+        finally:
+            conn.close()
+        for broadcast_id in broadcast_ids:
+            delivered = deliver_broadcast(broadcast_id)
+            print(f"broadcast {broadcast_id}: {delivered or 0} notifications delivered")
+    
+    @app.cli.command('refresh-mawaqit-uuids')
+    def refresh_mawaqit_uuids_command():
+        """Resolve the Mawaqit UUID of every active mosque and known city (pins are kept)"""
+        summary = mawaqit_directory.refresh_all(cities=['Gent'])
+        print(f"{summary['resolved']} Mawaqit UUIDs resolved, {summary['failed']} not found")
+    
     # Authentication middleware
     def require_auth(f):
         """Decorator to require authentication"""
@@ -611,6 +807,43 @@ def create_app():
             return decorated_function
         return decorator
     
+    def conditional(resource):
+        """Decorator adding ETag/Last-Modified validators from the resource's version.
+
+        The version is read before the view runs, so a write racing with the
+        request can only make the ETag older than the payload, never newer.
+        Clients holding the current version get a 304 without the view running.
+        """
+        def decorator(f):
+            def decorated_function(*args, **kwargs):
+                conn = get_db_connection()
+                etag, last_modified = get_validators(conn, resource)
+                conn.close()
+                
+                if request.if_none_match:
+                    # If-Modified-Since is ignored when If-None-Match is present
+                    not_modified = request.if_none_match.contains(etag)
+                else:
+                    not_modified = (request.if_modified_since is not None
+                                    and last_modified <= request.if_modified_since)
+                
+                if not_modified:
+                    response = app.response_class(status=304)
+                else:
+                    response = app.make_response(f(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                
+                response.set_etag(etag)
+                response.last_modified = last_modified
+                response.cache_control.public = True
+                response.cache_control.max_age = app.config['PUBLIC_CACHE_MAX_AGE']
+                response.cache_control.stale_while_revalidate = app.config['PUBLIC_CACHE_STALE_SECONDS']
+                return response
+            decorated_function.__name__ = f.__name__
+            return decorated_function
+        return decorator
+    
     # API Routes
     
     @app.route('/health')
@@ -618,6 +851,17 @@ def create_app():
         """Health check endpoint"""
         return jsonify({'status': 'ok', 'timestamp': datetime.now().isoformat()})
     
+    @app.route('/health/db')
+    def health_db():
+        """Database connection pool, analytics buffer and notification bus statistics"""
+        return jsonify({
+            'status': 'ok',
+            'pool': db_pool.get_stats(),
+            'analytics_buffer': analytics_buffer.get_stats(),
+            'notification_bus': notification_bus.get_stats(),
+            'mosque_locations': mosque_locations.get_stats()
+        })
+    
     # Payment endpoints
     @app.route('/api/payments/create-payment-intent', methods=['POST'])
     def create_payment_intent():
@@ -716,6 +960,9 @@ def create_app():
             conn.commit()
             conn.close()
             
+            if metadata.get('campaign_id'):
+                invalidate_campaigns_cache()
+            
             return jsonify({
                 'donation_id': donation_id,
                 'status': 'completed',
@@ -731,6 +978,7 @@ def create_app():
             return jsonify({'error': 'Failed to confirm payment'}), 500
     
     @app.route('/api/campaigns', methods=['GET'])
+    @conditional('campaigns')
     def get_campaigns():
         """Get all active campaigns"""
         try:
@@ -754,6 +1002,7 @@ def create_app():
             return jsonify({'error': str(e)}), 500
     
     @app.route('/api/campaigns/<int:campaign_id>', methods=['GET'])
+    @conditional('campaigns')
     def get_campaign(campaign_id):
         """Get specific campaign by ID"""
         try:
@@ -783,21 +1032,72 @@ def create_app():
     def get_donations():
         """Get donations (admin only)"""
         try:
-            conn = get_db_connection()
-            donations = conn.execute('''
+            # The body is read after request teardown, which releases the
+            # thread's connection; stream from one teardown cannot recycle
+            conn = db_pool.detached_connection()
+            cursor = conn.execute('''
                 SELECT d.*, m.name as mosque_name, c.title as campaign_title
                 FROM donations d
                 LEFT JOIN mosques m ON d.mosque_id = m.id
                 LEFT JOIN campaigns c ON d.campaign_id = c.id
                 ORDER BY d.created_at DESC
-            ''').fetchall()
-            conn.close()
+            ''')
             
-            return jsonify([dict(donation) for donation in donations])
+            # Same JSON array as before, encoded while the rows are read
+            response = app.response_class(iter_json_array(cursor), mimetype='application/json')
+            response.call_on_close(cursor.close)
+            response.call_on_close(conn.close)
+            return response
         except Exception as e:
             logger.error(f"Error fetching donations: {e}")
             return jsonify({'error': str(e)}), 500
     
+    @app.route('/api/exports/<dataset>', methods=['GET'])
+    @require_auth
+    @require_role('admin')
+    def export_dataset(dataset):
+        """Stream donations, page views or users as CSV or NDJSON (admin only)"""
+        try:
+            if dataset not in EXPORTS:
+                return jsonify({'error': f"dataset must be one of: {', '.join(EXPORTS)}"}), 400
+            
+            export_format = request.args.get('format', 'csv')
+            if export_format not in EXPORT_FORMATS:
+                return jsonify({'error': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+            
+            filters = {
+                'date_from': request.args.get('date_from'),
+                'date_to': request.args.get('date_to'),
+                'mosque_id': request.args.get('mosque_id', type=int),
+            }
+            for key in ('date_from', 'date_to'):
+                if filters[key]:
+                    try:
+                        datetime.strptime(filters[key], '%Y-%m-%d')
+                    except ValueError:
+                        return jsonify({'error': f'{key} must be a YYYY-MM-DD date'}), 400
+            
+            try:
+                sql, params = build_export_query(dataset, **filters)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            
+            conn = db_pool.detached_connection()
+            try:
+                cursor = conn.execute(sql, params)
+            except sqlite3.Error:
+                conn.close()
+                raise
+            response = app.response_class(EXPORT_ENCODERS[export_format](cursor))
+            response.headers.update(export_headers(dataset, export_format, filters))
+            response.call_on_close(cursor.close)
+            response.call_on_close(conn.close)
+            return response
+            
+        except Exception as e:
+            logger.error(f"Error exporting {dataset}: {e}")
+            return jsonify({'error': str(e)}), 500
+    
     # File upload endpoints
     @app.route('/api/upload', methods=['POST'])
     @require_auth
@@ -901,6 +1201,7 @@ def create_app():
             return jsonify({'error': 'Failed to retrieve file'}), 500
     
     @app.route('/api/files', methods=['GET'])
+    @conditional('files')
     def get_files():
         """Get all public files"""
         try:
@@ -965,7 +1266,7 @@ def create_app():
             unread_only = request.args.get('unread_only', 'false').lower() == 'true'
             
             notifications = get_user_notifications(request.user_id, limit, offset, unread_only)
-            unread_count = get_notification_count(request.user_id)
+            unread_count, _ = get_notification_count(request.user_id)
             
             return jsonify({
                 'notifications': notifications,
@@ -1006,13 +1307,109 @@ def create_app():
     def get_notification_count_endpoint():
         """Get unread notification count for the current user"""
         try:
-            count = get_notification_count(request.user_id)
-            return jsonify({'unread_count': count})
+            count, version = get_notification_count(request.user_id)
+            # The version changes with every write to the counter, so polls
+            # that see no change can be answered without a body
+            etag = f"{request.user_id}-{version}"
+            if request.if_none_match.contains(etag):
+                response = app.response_class(status=304)
+            else:
+                response = jsonify({'unread_count': count})
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
             
         except Exception as e:
             logger.error(f"Error getting notification count: {e}")
             return jsonify({'error': str(e)}), 500
     
+    @app.route('/api/notifications/stream', methods=['GET'])
+    def notification_stream():
+        """Server-Sent Events stream of new notifications and unread count changes"""
+        # EventSource cannot send an Authorization header, so the token may also be a query parameter
+        token = request.headers.get('Authorization') or request.args.get('token', '')
+        if token.startswith('Bearer '):
+            token = token[7:]
+        payload = verify_jwt_token(token) if token else None
+        if not payload:
+            return jsonify({'error': 'Invalid or expired token'}), 401
+        user_id = payload['user_id']
+        
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        try:
+            last_id = int(last_event_id) if last_event_id else None
+        except ValueError:
+            return jsonify({'error': 'Invalid Last-Event-ID'}), 400
+        
+        if last_id is None:
+            # New stream: only notifications created from now on
+            conn = get_db_connection()
+            last_id = conn.execute(
+                'SELECT COALESCE(MAX(id), 0) FROM notifications WHERE user_id = ?', (user_id,)
+            ).fetchone()[0]
+            conn.close()
+        
+        heartbeat = app.config['NOTIFICATION_STREAM_HEARTBEAT']
+        max_seconds = app.config['NOTIFICATION_STREAM_MAX_SECONDS']
+        page_size = 100
+        
+        def read_changes(after_id):
+            """Notifications after ``after_id`` and the current unread count"""
+            conn = get_db_connection()
+            try:
+                rows = conn.execute('''
+                    SELECT n.*, m.name as mosque_name
+                    FROM notifications n
+                    LEFT JOIN mosques m ON n.mosque_id = m.id
+                    WHERE n.user_id = ? AND n.id > ?
+                    ORDER BY n.id LIMIT ?
+                ''', (user_id, after_id, page_size)).fetchall()
+                count, version = get_unread_count(conn, user_id)
+            finally:
+                conn.close()
+            return [dict(row) for row in rows], count, version
+        
+        def event(name, data, event_id=None):
+            lines = [f'id: {event_id}'] if event_id is not None else []
+            lines += [f'event: {name}', f'data: {json.dumps(data, default=str)}']
+            return '\n'.join(lines) + '\n\n'
+        
+        def generate():
+            # Subscribing before the first read means no change can fall in between;
+            # no database connection is held while the stream is idle
+            subscription = notification_bus.subscribe(user_id)
+            try:
+                yield f'retry: {int(heartbeat * 1000)}\n\n'
+                after_id, sent_version = last_id, None
+                deadline = time.monotonic() + max_seconds
+                woken = True
+                while True:
+                    if woken:
+                        while True:
+                            rows, count, version = read_changes(after_id)
+                            for row in rows:
+                                yield event('notification', row, row['id'])
+                                after_id = row['id']
+                            if len(rows) < page_size:
+                                break
+                        if version != sent_version:
+                            yield event('unread_count', {'unread_count': count})
+                            sent_version = version
+                    else:
+                        yield ': heartbeat\n\n'
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    woken = subscription.wait(min(heartbeat, remaining))
+            finally:
+                notification_bus.unsubscribe(subscription)
+        
+        response = app.response_class(generate(), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        # Stop nginx-style proxies from buffering the stream
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+    
     @app.route('/api/notifications/preferences', methods=['GET'])
     @require_auth
     def get_notification_preferences():
@@ -1062,7 +1459,7 @@ def create_app():
     @app.route('/api/admin/notifications', methods=['POST'])
     @require_auth
     @require_role('admin')
-    def create_notification():
+    def create_notification_endpoint():
         """Create a notification (admin only)"""
         try:
             data = request.get_json()
@@ -1093,6 +1490,111 @@ def create_app():
             logger.error(f"Error creating notification: {e}")
             return jsonify({'error': str(e)}), 500
     
+    @app.route('/api/admin/notifications/broadcast', methods=['POST'])
+    @require_auth
+    @require_role('admin')
+    def create_broadcast_endpoint():
+        """Notify every user in an audience (admin only); delivery runs in the background"""
+        try:
+            data = request.get_json() or {}
+            audience = data.get('audience', 'all')
+            audience_value = data.get('mosque_id') if audience == 'mosque' else data.get('role')
+            
+            if not data.get('title') or not data.get('message'):
+                return jsonify({'error': 'title and message are required'}), 400
+            if audience not in BROADCAST_AUDIENCES:
+                return jsonify({'error': f"audience must be one of: {', '.join(BROADCAST_AUDIENCES)}"}), 400
+            
+            notification = {
+                'mosque_id': data.get('mosque_id'),
+                'title': data['title'],
+                'message': data['message'],
+                'notification_type': data.get('notification_type', 'general'),
+                'priority': data.get('priority', 'normal'),
+                'action_url': data.get('action_url'),
+                'metadata': data.get('metadata'),
+                'expires_at': data.get('expires_at'),
+            }
+            conn = get_db_connection()
+            try:
+                broadcast_id = create_broadcast(conn, audience, audience_value, notification, request.user_id)
+                broadcast = get_broadcast(conn, broadcast_id)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            finally:
+                conn.close()
+            
+            broadcast_executor.submit(deliver_broadcast, broadcast_id)
+            
+            response = jsonify({
+                'broadcast_id': broadcast_id,
+                'total_recipients': broadcast['total_recipients'],
+                'status': broadcast['status'],
+                'status_url': f'/api/admin/notifications/broadcasts/{broadcast_id}'
+            })
+            response.status_code = 202
+            response.headers['Location'] = f'/api/admin/notifications/broadcasts/{broadcast_id}'
+            return response
+            
+        except Exception as e:
+            logger.error(f"Error creating broadcast: {e}")
+            return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/admin/notifications/broadcasts/<int:broadcast_id>', methods=['GET'])
+    @require_auth
+    @require_role('admin')
+    def get_broadcast_endpoint(broadcast_id):
+        """Delivery progress of a broadcast (admin only)"""
+        try:
+            conn = get_db_connection()
+            broadcast = get_broadcast(conn, broadcast_id)
+            conn.close()
+            
+            if not broadcast:
+                return jsonify({'error': 'Broadcast not found'}), 404
+            return jsonify(broadcast)
+            
+        except Exception as e:
+            logger.error(f"Error fetching broadcast {broadcast_id}: {e}")
+            return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/admin/mawaqit-uuids', methods=['GET'])
+    @require_auth
+    @require_role('admin')
+    def get_mawaqit_uuids():
+        """Known Mawaqit UUIDs per city and mosque (admin only)"""
+        try:
+            return jsonify(mawaqit_directory.entries())
+        except Exception as e:
+            logger.error(f"Error fetching Mawaqit UUIDs: {e}")
+            return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/admin/mosques/<int:mosque_id>/mawaqit-uuid', methods=['PUT', 'DELETE'])
+    @require_auth
+    @require_role('admin')
+    def pin_mawaqit_uuid(mosque_id):
+        """Pin (PUT) or unpin (DELETE) the Mawaqit UUID used for a mosque (admin only)"""
+        try:
+            conn = get_db_connection()
+            mosque = conn.execute('SELECT id FROM mosques WHERE id = ?', (mosque_id,)).fetchone()
+            conn.close()
+            if not mosque:
+                return jsonify({'error': 'Mosque not found'}), 404
+            
+            if request.method == 'DELETE':
+                mawaqit_directory.unpin(mosque_id)
+                return jsonify({'mosque_id': mosque_id, 'pinned': False})
+            
+            mawaqit_uuid = ((request.get_json() or {}).get('uuid') or '').strip()
+            if not mawaqit_uuid:
+                return jsonify({'error': 'uuid is required'}), 400
+            mawaqit_directory.pin(mosque_id, mawaqit_uuid)
+            return jsonify({'mosque_id': mosque_id, 'uuid': mawaqit_uuid, 'pinned': True})
+            
+        except Exception as e:
+            logger.error(f"Error pinning Mawaqit UUID for mosque {mosque_id}: {e}")
+            return jsonify({'error': str(e)}), 500
+    
     # Analytics endpoints
     @app.route('/api/analytics/track', methods=['POST'])
     def track_event():
@@ -1110,9 +1612,12 @@ def create_app():
             ip_address = request.remote_addr
             user_agent = request.headers.get('User-Agent')
             
-            track_analytics_event(event_type, user_id, mosque_id, event_data, ip_address, user_agent)
+            if not track_analytics_event(event_type, user_id, mosque_id, event_data, ip_address, user_agent):
+                response = jsonify({'error': 'Analytics buffer full, try again later'})
+                response.headers['Retry-After'] = '1'
+                return response, 503
             
-            return jsonify({'message': 'Event tracked successfully'})
+            return jsonify({'message': 'Event tracked successfully'}), 202
             
         except Exception as e:
             logger.error(f"Error tracking event: {e}")
@@ -1134,9 +1639,12 @@ def create_app():
             user_agent = request.headers.get('User-Agent')
             referrer = request.headers.get('Referer')
             
-            track_page_view(page_path, user_id, session_id, ip_address, user_agent, referrer)
+            if not track_page_view(page_path, user_id, session_id, ip_address, user_agent, referrer):
+                response = jsonify({'error': 'Analytics buffer full, try again later'})
+                response.headers['Retry-After'] = '1'
+                return response, 503
             
-            return jsonify({'message': 'Page view tracked successfully'})
+            return jsonify({'message': 'Page view tracked successfully'}), 202
             
         except Exception as e:
             logger.error(f"Error tracking page view: {e}")
@@ -1174,10 +1682,7 @@ def create_app():
                 total_mosques = conn.execute('SELECT COUNT(*) FROM mosques WHERE is_active = 1').fetchone()[0]
                 total_events = conn.execute('SELECT COUNT(*) FROM events WHERE is_active = 1').fetchone()[0]
                 total_donations = conn.execute('SELECT COUNT(*) FROM donations').fetchone()[0]
-                total_page_views = conn.execute('''
-                    SELECT COUNT(*) FROM page_views 
-                    WHERE created_at >= datetime('now', '-{} days')
-                '''.format(days)).fetchone()[0]
+                total_page_views = window_total(conn, 'page_views', days)
                 
                 report = {
                     'total_users': total_users,
@@ -1288,6 +1793,7 @@ def create_app():
     
     # Existing API endpoints (unchanged)
     @app.route('/api/mosques', methods=['GET'])
+    @conditional('mosques')
     def get_mosques():
         """Get all active mosques"""
         try:
@@ -1302,7 +1808,47 @@ def create_app():
             logger.error(f"Error fetching mosques: {e}")
             return jsonify({'error': str(e)}), 500
     
+    @app.route('/api/mosques/nearby', methods=['GET'])
+    @conditional('mosques')
+    def get_nearby_mosques():
+        """Active mosques within ``radius`` km of ``lat``/``lng``, nearest first"""
+        lat = request.args.get('lat', type=float)
+        lng = request.args.get('lng', type=float)
+        radius = request.args.get('radius', default=app.config['NEARBY_DEFAULT_RADIUS_KM'], type=float)
+        limit = request.args.get('limit', default=20, type=int) or 20
+        limit = min(max(limit, 1), app.config['NEARBY_MAX_LIMIT'])
+        
+        if lat is None or lng is None:
+            return jsonify({'error': 'lat and lng are required'}), 400
+        try:
+            validate_point(lat, lng)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if radius is None or not 0 < radius <= app.config['NEARBY_MAX_RADIUS_KM']:
+            return jsonify({'error': f"radius must be between 0 and {app.config['NEARBY_MAX_RADIUS_KM']} km"}), 400
+        
+        try:
+            nearest = mosque_locations.nearby(lat, lng, radius, limit)
+            
+            conn = get_db_connection()
+            placeholders = ', '.join('?' for _ in nearest)
+            rows = conn.execute(
+                f'SELECT * FROM mosques WHERE id IN ({placeholders})', [mosque_id for mosque_id, _ in nearest]
+            ).fetchall() if nearest else []
+            conn.close()
+            
+            by_id = {row['id']: dict(row) for row in rows}
+            mosques = [
+                dict(by_id[mosque_id], distance_km=round(distance, 3))
+                for mosque_id, distance in nearest if mosque_id in by_id
+            ]
+            return jsonify({'mosques': mosques, 'count': len(mosques), 'radius_km': radius})
+        except Exception as e:
+            logger.error(f"Error fetching nearby mosques: {e}")
+            return jsonify({'error': 'Failed to fetch nearby mosques'}), 500
+    
     @app.route('/api/events', methods=['GET'])
+    @conditional('events')
     def get_events():
         """Get all active events"""
         try:
@@ -1322,6 +1868,7 @@ def create_app():
             return jsonify({'error': str(e)}), 500
     
     @app.route('/api/news', methods=['GET'])
+    @conditional('news')
     def get_news():
         """Get all published news"""
         try:
@@ -1344,7 +1891,6 @@ def create_app():
     @app.route('/api/search', methods=['GET'])
     def advanced_search():
         """Advanced search across all content types"""
-        conn = None
         try:
             query = request.args.get('q', '').strip()
             selected_types = request.args.getlist('type')
@@ -1354,15 +1900,71 @@ def create_app():
             capacity_min = request.args.get('capacity_min', type=int)
             capacity_max = request.args.get('capacity_max', type=int)
             sort = request.args.get('sort', 'relevance')
-            page = request.args.get('page', default=1, type=int)
-            per_page = request.args.get('per_page', default=20, type=int)
+            page = max(request.args.get('page', default=1, type=int) or 1, 1)
+            per_page = request.args.get('per_page', default=20, type=int) or 20
+            per_page = min(max(per_page, 1), SEARCH_MAX_PER_PAGE)
+            count_mode = request.args.get('count', 'estimate')
+            cursor_token = request.args.get('cursor')
+            near = request.args.get('near', '').strip()
+            radius = request.args.get('radius', default=app.config['NEARBY_DEFAULT_RADIUS_KM'], type=float)
 
-            valid_types = {'mosques', 'events', 'news', 'campaigns'}
+            if count_mode not in ('exact', 'estimate', 'none'):
+                return jsonify({'error': 'count must be exact, estimate or none'}), 400
+
+            # near=lat,lng limits mosques (and events/campaigns by their mosque)
+            # to the radius, using the in-memory location index
+            near_distances = None
+            if near:
+                try:
+                    near_lat, near_lng = parse_point(near)
+                except ValueError as e:
+                    return jsonify({'error': f'Invalid near: {e}'}), 400
+                if radius is None or not 0 < radius <= app.config['NEARBY_MAX_RADIUS_KM']:
+                    return jsonify({'error': f"radius must be between 0 and {app.config['NEARBY_MAX_RADIUS_KM']} km"}), 400
+                near_distances = dict(mosque_locations.nearby(near_lat, near_lng, radius))
+
+            valid_types = ['mosques', 'events', 'news', 'campaigns']
             if selected_types:
-                selected_types = [ctype for ctype in selected_types if ctype in valid_types]
+                selected_types = [ctype for ctype in valid_types if ctype in selected_types]
             if not selected_types:
                 selected_types = list(valid_types)
 
+            # A cursor continues only the content types that had more rows
+            positions = {}
+            if cursor_token:
+                try:
+                    positions = decode_cursor(cursor_token, sort)
+                except ValueError as e:
+                    return jsonify({'error': f'Invalid cursor: {e}'}), 400
+                selected_types = [ctype for ctype in selected_types if ctype in positions]
+                # Keyset positions replace the offset, so page is ignored (and
+                # must not split cache entries)
+                page = 1
+
+            # Identical searches within the TTL are served from Redis
+            cache_key = search_cache_key({
+                'q': query.lower(),
+                'types': selected_types,
+                'date_from': date_from,
+                'date_to': date_to,
+                'location': location.lower(),
+                'capacity_min': capacity_min,
+                'capacity_max': capacity_max,
+                'sort': sort,
+                'page': page,
+                'per_page': per_page,
+                'count': count_mode,
+                'cursor': cursor_token,
+                'near': near,
+                'radius': radius if near else None,
+                'backend': app.config['SEARCH_BACKEND']
+            }, selected_types)
+            cached_results = get_cached_search_results(cache_key) if cache_key else None
+            if cached_results is not None:
+                response = jsonify(cached_results)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
             results = {
                 'mosques': [],
                 'events': [],
@@ -1371,197 +1973,346 @@ def create_app():
                 'total_results': 0,
                 'page': page,
                 'per_page': per_page,
-                'total_pages': 0
+                'total_pages': 0,
+                'counts': {},
+                'counts_exact': count_mode != 'none',
+                'has_more': {},
+                'next_cursor': None,
+                'timed_out': []
             }
 
-            conn = get_db_connection()
-
             def build_like_conditions(columns, value):
                 like_value = f"%{value.lower()}%"
                 placeholders = [f"LOWER(COALESCE({col}, '')) LIKE ?" for col in columns]
                 return "(" + " OR ".join(placeholders) + ")", [like_value] * len(columns)
 
+            match_query = None
+            if app.config['SEARCH_BACKEND'] == 'fts' and app.config.get('SEARCH_FTS_AVAILABLE'):
+                match_query = build_match_query(query)
+
+            def build_near_condition(mosque_id_column):
+                """Mosque ids from the location index; they come from the table, so inlining is safe"""
+                if not near_distances:
+                    return "0"
+                return f"{mosque_id_column} IN ({', '.join(str(int(i)) for i in near_distances)})"
+
+            def build_text_conditions(content_type, id_column, columns, value):
+                """Full-text condition via the FTS5 index, LIKE scan as fallback"""
+                if match_query is None:
+                    return build_like_conditions(columns, value)
+                table = fts_table(content_type)
+                return f"{id_column} IN (SELECT rowid FROM {table} WHERE {table} MATCH ?)", [match_query]
+
+            # Per content type: select list, FROM clause, WHERE conditions and a
+            # total ORDER BY (ending in the primary key) usable as a keyset
+            specs = {}
+
             # Search mosques
             if 'mosques' in selected_types:
-                mosque_query_parts = ["SELECT * FROM mosques WHERE is_active = 1"]
+                mosque_conditions = ["is_active = 1"]
                 mosque_params = []
 
                 if query:
-                    condition, params = build_like_conditions(
+                    condition, params = build_text_conditions(
+                        'mosques', 'id',
                         ['name', 'description', 'address', 'imam_name', 'email', 'phone'],
                         query
                     )
-                    mosque_query_parts.append("AND " + condition)
+                    mosque_conditions.append(condition)
                     mosque_params.extend(params)
 
                 if location:
                     condition, params = build_like_conditions(['address'], location)
-                    mosque_query_parts.append("AND " + condition)
+                    mosque_conditions.append(condition)
                     mosque_params.extend(params)
 
+                if near_distances is not None:
+                    mosque_conditions.append(build_near_condition('id'))
+
                 if capacity_min is not None:
-                    mosque_query_parts.append("AND capacity >= ?")
+                    mosque_conditions.append("capacity >= ?")
                     mosque_params.append(capacity_min)
 
                 if capacity_max is not None:
-                    mosque_query_parts.append("AND capacity <= ?")
+                    mosque_conditions.append("capacity <= ?")
                     mosque_params.append(capacity_max)
 
-                if sort in ('recent', 'newest'):
-                    order_clause = " ORDER BY created_at DESC"
+                if sort == 'distance' and near_distances:
+                    ranks = sorted(near_distances, key=lambda i: (near_distances[i], i))
+                    rank_expr = "CASE id " + " ".join(
+                        f"WHEN {int(mosque_id)} THEN {rank}" for rank, mosque_id in enumerate(ranks)
+                    ) + " END"
+                    order = [(rank_expr, 'ASC'), ('id', 'ASC')]
+                elif sort in ('recent', 'newest'):
+                    order = [("COALESCE(created_at, '')", 'DESC'), ('id', 'DESC')]
                 elif sort == 'oldest':
-                    order_clause = " ORDER BY created_at ASC"
+                    order = [("COALESCE(created_at, '')", 'ASC'), ('id', 'ASC')]
                 elif sort == 'name_desc':
-                    order_clause = " ORDER BY name COLLATE NOCASE DESC"
+                    order = [('name COLLATE NOCASE', 'DESC'), ('id', 'DESC')]
                 else:
-                    order_clause = " ORDER BY name COLLATE NOCASE ASC"
+                    order = [('name COLLATE NOCASE', 'ASC'), ('id', 'ASC')]
 
-                mosque_query = " ".join(mosque_query_parts) + order_clause
-                mosques = conn.execute(mosque_query, mosque_params).fetchall()
-                results['mosques'] = [dict(mosque) for mosque in mosques]
+                specs['mosques'] = {
+                    'select': "SELECT *",
+                    'from': "FROM mosques",
+                    'conditions': mosque_conditions,
+                    'params': mosque_params,
+                    'order': order
+                }
 
             # Search events
             if 'events' in selected_types:
-                event_query_parts = [
-                    "SELECT e.*, m.name AS mosque_name, m.address AS mosque_address"
-                    " FROM events e"
-                    " LEFT JOIN mosques m ON e.mosque_id = m.id"
-                    " WHERE e.is_active = 1"
-                ]
+                event_conditions = ["e.is_active = 1"]
                 event_params = []
 
                 if query:
-                    condition, params = build_like_conditions(
+                    condition, params = build_text_conditions(
+                        'events', 'e.id',
                         ['e.title', 'e.description', 'm.name', 'm.address'],
                         query
                     )
-                    event_query_parts.append("AND " + condition)
+                    event_conditions.append(condition)
                     event_params.extend(params)
 
                 if location:
                     condition, params = build_like_conditions(['m.address'], location)
-                    event_query_parts.append("AND " + condition)
+                    event_conditions.append(condition)
                     event_params.extend(params)
 
+                if near_distances is not None:
+                    event_conditions.append(build_near_condition('e.mosque_id'))
+
                 if date_from:
-                    event_query_parts.append("AND DATE(e.event_date) >= DATE(?)")
+                    event_conditions.append("DATE(e.event_date) >= DATE(?)")
                     event_params.append(date_from)
 
                 if date_to:
-                    event_query_parts.append("AND DATE(e.event_date) <= DATE(?)")
+                    event_conditions.append("DATE(e.event_date) <= DATE(?)")
                     event_params.append(date_to)
 
-                if sort in ('recent', 'newest'):
-                    order_clause = " ORDER BY e.event_date DESC, e.event_time DESC"
-                elif sort == 'oldest':
-                    order_clause = " ORDER BY e.event_date ASC, e.event_time ASC"
-                else:
-                    order_clause = " ORDER BY e.event_date ASC, e.event_time ASC"
-
-                event_query = " ".join(event_query_parts) + order_clause
-                events = conn.execute(event_query, event_params).fetchall()
-                results['events'] = [dict(event) for event in events]
+                direction = 'DESC' if sort in ('recent', 'newest') else 'ASC'
+                specs['events'] = {
+                    'select': "SELECT e.*, m.name AS mosque_name, m.address AS mosque_address",
+                    'from': "FROM events e LEFT JOIN mosques m ON e.mosque_id = m.id",
+                    'conditions': event_conditions,
+                    'params': event_params,
+                    'order': [('e.event_date', direction), ('e.event_time', direction), ('e.id', direction)]
+                }
 
             # Search news
             if 'news' in selected_types:
-                news_query_parts = [
-                    "SELECT n.*, u.first_name, u.last_name"
-                    " FROM news n"
-                    " LEFT JOIN users u ON n.author_id = u.id"
-                    " WHERE n.status = 'published'"
-                ]
+                news_conditions = ["n.status = 'published'"]
                 news_params = []
 
                 if query:
-                    condition, params = build_like_conditions(
+                    condition, params = build_text_conditions(
+                        'news', 'n.id',
                         ['n.title', 'n.excerpt', 'n.content', 'u.first_name', 'u.last_name'],
                         query
                     )
-                    news_query_parts.append("AND " + condition)
+                    news_conditions.append(condition)
                     news_params.extend(params)
 
                 if date_from:
-                    news_query_parts.append("AND DATE(n.published_at) >= DATE(?)")
+                    news_conditions.append("DATE(n.published_at) >= DATE(?)")
                     news_params.append(date_from)
 
                 if date_to:
-                    news_query_parts.append("AND DATE(n.published_at) <= DATE(?)")
+                    news_conditions.append("DATE(n.published_at) <= DATE(?)")
                     news_params.append(date_to)
 
-                if sort in ('recent', 'newest'):
-                    order_clause = " ORDER BY n.published_at DESC"
-                elif sort == 'oldest':
-                    order_clause = " ORDER BY n.published_at ASC"
+                if sort == 'oldest':
+                    order = [("COALESCE(n.published_at, '')", 'ASC'), ('n.id', 'ASC')]
                 elif sort == 'name_desc':
-                    order_clause = " ORDER BY n.title COLLATE NOCASE DESC"
+                    order = [('n.title COLLATE NOCASE', 'DESC'), ('n.id', 'DESC')]
                 elif sort == 'name':
-                    order_clause = " ORDER BY n.title COLLATE NOCASE ASC"
+                    order = [('n.title COLLATE NOCASE', 'ASC'), ('n.id', 'ASC')]
                 else:
-                    order_clause = " ORDER BY n.published_at DESC"
+                    order = [("COALESCE(n.published_at, '')", 'DESC'), ('n.id', 'DESC')]
 
-                news_query = " ".join(news_query_parts) + order_clause
-                news = conn.execute(news_query, news_params).fetchall()
-                results['news'] = [dict(article) for article in news]
+                specs['news'] = {
+                    'select': "SELECT n.*, u.first_name, u.last_name",
+                    'from': "FROM news n LEFT JOIN users u ON n.author_id = u.id",
+                    'conditions': news_conditions,
+                    'params': news_params,
+                    'order': order
+                }
 
             # Search campaigns
             if 'campaigns' in selected_types:
-                campaign_query_parts = [
-                    "SELECT c.*, m.name AS mosque_name, m.address AS mosque_address"
-                    " FROM campaigns c"
-                    " LEFT JOIN mosques m ON c.mosque_id = m.id"
-                    " WHERE c.status = 'active'"
-                ]
+                campaign_conditions = ["c.status = 'active'"]
                 campaign_params = []
 
                 if query:
-                    condition, params = build_like_conditions(
+                    condition, params = build_text_conditions(
+                        'campaigns', 'c.id',
                         ['c.title', 'c.description', 'm.name', 'm.address'],
                         query
                     )
-                    campaign_query_parts.append("AND " + condition)
+                    campaign_conditions.append(condition)
                     campaign_params.extend(params)
 
                 if location:
                     condition, params = build_like_conditions(['m.address'], location)
-                    campaign_query_parts.append("AND " + condition)
+                    campaign_conditions.append(condition)
                     campaign_params.extend(params)
 
+                if near_distances is not None:
+                    campaign_conditions.append(build_near_condition('c.mosque_id'))
+
                 if date_from:
-                    campaign_query_parts.append("AND DATE(c.start_date) >= DATE(?)")
+                    campaign_conditions.append("DATE(c.start_date) >= DATE(?)")
                     campaign_params.append(date_from)
 
                 if date_to:
-                    campaign_query_parts.append("AND DATE(c.end_date) <= DATE(?)")
+                    campaign_conditions.append("DATE(c.end_date) <= DATE(?)")
                     campaign_params.append(date_to)
 
-                if sort in ('recent', 'newest'):
-                    order_clause = " ORDER BY c.start_date DESC"
-                elif sort == 'oldest':
-                    order_clause = " ORDER BY c.start_date ASC"
+                direction = 'DESC' if sort in ('recent', 'newest') else 'ASC'
+                specs['campaigns'] = {
+                    'select': "SELECT c.*, m.name AS mosque_name, m.address AS mosque_address",
+                    'from': "FROM campaigns c LEFT JOIN mosques m ON c.mosque_id = m.id",
+                    'conditions': campaign_conditions,
+                    'params': campaign_params,
+                    'order': [("COALESCE(c.start_date, '')", direction), ('c.id', direction)]
+                }
+
+            def fetch_page(conn, spec, position, outcome):
+                """Fetch one page (plus one look-ahead row) after the keyset position.
+
+                Rows are added to ``outcome`` as they are read, so an interrupted
+                query keeps what it already returned.
+                """
+                conditions = list(spec['conditions'])
+                params = list(spec['params'])
+                order = spec['order']
+                offset = 0
+
+                if position is not None:
+                    operator = '<' if order[0][1] == 'DESC' else '>'
+                    keys = ", ".join(expr for expr, _ in order)
+                    placeholders = ", ".join("?" for _ in order)
+                    conditions.append(f"({keys}) {operator} ({placeholders})")
+                    params.extend(position)
                 else:
-                    order_clause = " ORDER BY c.start_date ASC"
+                    offset = (page - 1) * per_page
 
-                campaign_query = " ".join(campaign_query_parts) + order_clause
-                campaigns = conn.execute(campaign_query, campaign_params).fetchall()
-                results['campaigns'] = [dict(campaign) for campaign in campaigns]
+                key_columns = ", ".join(f"{expr} AS _sort_key_{i}" for i, (expr, _) in enumerate(order))
+                order_clause = ", ".join(f"{expr} {direction}" for expr, direction in order)
+                sql = (
+                    f"{spec['select']}, {key_columns} {spec['from']}"
+                    f" WHERE {' AND '.join(conditions)}"
+                    f" ORDER BY {order_clause} LIMIT ? OFFSET ?"
+                )
+                for row in conn.execute(sql, params + [per_page + 1, offset]):
+                    if len(outcome['rows']) == per_page:
+                        outcome['has_more'] = True
+                        break
+                    row = dict(row)
+                    outcome['last_key'] = [row.pop(f"_sort_key_{i}") for i in range(len(order))]
+                    outcome['rows'].append(row)
 
-            total_results = (
-                len(results['mosques']) +
-                len(results['events']) +
-                len(results['news']) +
-                len(results['campaigns'])
-            )
+            def count_matches(conn, spec):
+                """Exact COUNT(*) or a count capped at SEARCH_COUNT_ESTIMATE_CAP"""
+                where = " AND ".join(spec['conditions'])
+                if count_mode == 'exact':
+                    sql = f"SELECT COUNT(*) {spec['from']} WHERE {where}"
+                    return conn.execute(sql, spec['params']).fetchone()[0], True
+                sql = f"SELECT COUNT(*) FROM (SELECT 1 {spec['from']} WHERE {where} LIMIT ?)"
+                count = conn.execute(sql, spec['params'] + [SEARCH_COUNT_ESTIMATE_CAP + 1]).fetchone()[0]
+                return min(count, SEARCH_COUNT_ESTIMATE_CAP), count <= SEARCH_COUNT_ESTIMATE_CAP
+
+            for content_type, spec in specs.items():
+                position = positions.get(content_type)
+                if position is not None and len(position) != len(spec['order']):
+                    return jsonify({'error': 'Invalid cursor: Cursor does not match sort order'}), 400
+
+            budget = app.config['SEARCH_TYPE_BUDGET_MS'] / 1000.0
+
+            def run_type(content_type, started):
+                """Page and count one content type on the calling thread's connection.
+
+                Once the budget measured from ``started`` is spent, SQLite is
+                interrupted and whatever was already fetched is returned.
+                """
+                spec = specs[content_type]
+                outcome = {'rows': [], 'has_more': False, 'last_key': None, 'count': None, 'timed_out': False}
+                deadline = (started or time.monotonic()) + budget
+                type_conn = get_db_connection()
+                if budget > 0:
+                    type_conn.set_progress_handler(lambda: time.monotonic() > deadline, SEARCH_PROGRESS_INTERVAL)
+                page_done = False
+                try:
+                    fetch_page(type_conn, spec, positions.get(content_type), outcome)
+                    page_done = True
+                    if count_mode != 'none':
+                        outcome['count'] = count_matches(type_conn, spec)
+                except sqlite3.OperationalError:
+                    if budget <= 0 or time.monotonic() <= deadline:
+                        raise
+                    outcome['timed_out'] = True
+                    if not page_done and outcome['rows']:
+                        # Unknown whether more rows follow; the cursor resumes after the last one
+                        outcome['has_more'] = True
+                finally:
+                    if budget > 0:
+                        type_conn.set_progress_handler(None, 0)
+                    type_conn.close()
+                return outcome
+
+            # Fan out over separate read connections (WAL allows concurrent readers);
+            # results are merged in content type order, not completion order
+            if app.config['SEARCH_FANOUT_WORKERS'] > 1 and len(specs) > 1:
+                started = time.monotonic()
+                futures = {ctype: search_executor.submit(run_type, ctype, started) for ctype in specs}
+                outcomes = {ctype: future.result() for ctype, future in futures.items()}
+            else:
+                outcomes = {ctype: run_type(ctype, None) for ctype in specs}
+
+            next_positions = {}
+            for content_type in specs:
+                outcome = outcomes[content_type]
+                results[content_type] = outcome['rows']
+                results['has_more'][content_type] = outcome['has_more']
+                if outcome['has_more']:
+                    next_positions[content_type] = outcome['last_key']
+                if outcome['timed_out']:
+                    results['timed_out'].append(content_type)
+
+                if count_mode != 'none':
+                    if outcome['count'] is not None:
+                        count, exact = outcome['count']
+                    else:
+                        # Timed out before counting: the rows seen are a lower bound
+                        count, exact = len(outcome['rows']), False
+                    results['counts'][content_type] = count
+                    if not exact:
+                        results['counts_exact'] = False
+
+            if next_positions:
+                results['next_cursor'] = encode_cursor(sort, next_positions)
+
+            if near_distances:
+                for mosque in results['mosques']:
+                    mosque['distance_km'] = round(near_distances[mosque['id']], 3)
+
+            if count_mode != 'none':
+                total_results = sum(results['counts'].values())
+                largest = max(results['counts'].values(), default=0)
+                results['total_pages'] = (largest + per_page - 1) // per_page
+            else:
+                total_results = sum(len(results[ctype]) for ctype in specs)
             results['total_results'] = total_results
-            results['total_pages'] = (total_results + per_page - 1) // per_page if per_page else 0
 
-            return jsonify(results)
+            if cache_key and not results['timed_out']:
+                cache_search_results(cache_key, results)
+            response = jsonify(results)
+            response.headers['X-Cache'] = 'MISS' if cache_key else 'BYPASS'
+            return response
 
         except Exception as e:
             logger.error(f"Error in advanced search: {e}")
             return jsonify({'error': str(e)}), 500
-        finally:
-            if conn is not None:
-                conn.close()
     
     return app
 
@@ -38,6 +38,10 @@ from sentry_sdk.integrations.flask import FlaskIntegration
 from sentry_sdk.integrations.sqlalchemy import SqlalchemyIntegration
 
 # Import caching service
+import click
+
+from services.prayer_calculation import calculate_day as calculate_prayer_day, ramadan_window
+from services.prayer_generation import active_mosques, generate_prayer_times
 from cache_service import (
     cache, cache_mosques_list, get_cached_mosques_list, 
     cache_mosque_detail, get_cached_mosque_detail,
@@ -120,6 +124,15 @@ def create_app():
     app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
     app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
     
+    # Prayer time calculation, with Aladhan's numbering: method 13 = Diyanet,
+    # school 1 = Hanafi asr, high latitude rule 3 = angle based
+    app.config['PRAYER_CALCULATION_METHOD'] = int(os.environ.get('PRAYER_CALCULATION_METHOD', 13))
+    app.config['PRAYER_ASR_SCHOOL'] = int(os.environ.get('PRAYER_ASR_SCHOOL', 1))
+    app.config['PRAYER_HIGH_LATITUDE_RULE'] = int(os.environ.get('PRAYER_HIGH_LATITUDE_RULE', 3))
+    app.config['PRAYER_TIMEZONE'] = os.environ.get('PRAYER_TIMEZONE', 'Europe/Brussels')
+    # Days from today whose cache keys generate-prayer-times fills
+    app.config['PRAYER_CACHE_WARM_DAYS'] = int(os.environ.get('PRAYER_CACHE_WARM_DAYS', 7))
+    
     # Create upload directory if it doesn't exist
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
     
@@ -726,7 +739,10 @@ def create_app():
                     new_prayer_time = PrayerTime(
                         mosque_id=mosque_id,
                         date=datetime.strptime(date, '%Y-%m-%d').date(),
-                        **prayer_times
+                        **{
+                            prayer: datetime.strptime(value, '%H:%M').time()
+                            for prayer, value in prayer_times.items()
+                        }
                     )
                     db.session.add(new_prayer_time)
                     db.session.commit()
@@ -745,6 +761,41 @@ def create_app():
             log_error(e, {'endpoint': 'get_prayer_times'})
             return jsonify({'error': str(e)}), 500
     
+    def prayer_parameters() -> dict:
+        """Calculation settings shared by the endpoint and generate-prayer-times"""
+        return {
+            'method': app.config['PRAYER_CALCULATION_METHOD'],
+            'school': app.config['PRAYER_ASR_SCHOOL'],
+            'high_latitude_rule': app.config['PRAYER_HIGH_LATITUDE_RULE'],
+            'timezone': app.config['PRAYER_TIMEZONE']
+        }
+    
+    @app.cli.command('generate-prayer-times')
+    @click.option('--year', type=int, help='Calendar year to generate (default: the next 365 days)')
+    @click.option('--ramadan', is_flag=True, help='Only the Ramadan window of --year (or of this year)')
+    @click.option('--mosque-id', type=int, help='Only this mosque')
+    def generate_prayer_times_command(year, ramadan, mosque_id):
+        """Calculate and store prayer times in bulk for every active mosque"""
+        today = datetime.now().date()
+        if ramadan:
+            start_date, end_date = ramadan_window(year or today.year)
+        elif year:
+            start_date, end_date = datetime(year, 1, 1).date(), datetime(year, 12, 31).date()
+        else:
+            start_date, end_date = today, today + timedelta(days=364)
+        
+        mosques = active_mosques()
+        if mosque_id:
+            mosques = [mosque for mosque in mosques if mosque.id == mosque_id]
+        
+        summary = generate_prayer_times(
+            mosques, start_date, end_date,
+            warm_days=app.config['PRAYER_CACHE_WARM_DAYS'],
+            **prayer_parameters()
+        )
+        print(f"Prayer times {start_date} - {end_date}: {summary['rows']} rows for "
+              f"{summary['mosques']} mosques, {summary['cached']} cache keys warmed")
+    
     def calculate_prayer_times(mosque_id: int, date: str) -> dict:
         """Calculate prayer times for a mosque and date"""
         try:
@@ -753,21 +804,16 @@ def create_app():
             if not mosque or not mosque.latitude or not mosque.longitude:
                 return None
             
-            # Simple prayer time calculation (in production, use a proper library)
-            # This is a simplified version - in production, use libraries like 'praytimes'
-            latitude = float(mosque.latitude)
-            longitude = float(mosque.longitude)
-            
-            # Basic calculation (this should be replaced with proper Islamic prayer time calculation)
-            prayer_times = {
-                'fajr': '05:30',
-                'dhuhr': '12:30',
-                'asr': '15:30',
-                'maghrib': '18:30',
-                'isha': '20:00'
-            }
+            # Computed locally from the mosque's coordinates, no external API
+            times = calculate_prayer_day(
+                datetime.strptime(date, '%Y-%m-%d').date(),
+                float(mosque.latitude),
+                float(mosque.longitude),
+                **prayer_parameters()
+            )
             
-            return prayer_times
+            # Same columns as PrayerTime
+            return {prayer: times[prayer] for prayer in ('fajr', 'dhuhr', 'asr', 'maghrib', 'isha')}
             
         except Exception as e:
             log_error(e, {'function': 'calculate_prayer_times'})
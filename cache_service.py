@@ -6,6 +6,7 @@ Provides caching for sessions, prayer times, mosque lists, and other frequently
 import redis
 import json
 import os
+import hashlib
 from typing import Any, Optional, Dict, List
 from datetime import timedelta
 from functools import wraps
@@ -87,6 +88,43 @@ class CacheService:
             logger.error(f"Cache delete pattern error for {pattern}: {e}")
             return 0
     
+    def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """Get several values in one round trip"""
+        if not self.is_available() or not keys:
+            return [None] * len(keys)
+        
+        try:
+            return [json.loads(value) if value else None for value in self.redis_client.mget(keys)]
+        except Exception as e:
+            logger.error(f"Cache get_many error for keys {keys}: {e}")
+            return [None] * len(keys)
+    
+    def set_many(self, values: Dict[str, Any], ttl_seconds: int = 3600) -> bool:
+        """Set several values with the same TTL in one round trip"""
+        if not self.is_available() or not values:
+            return False
+        
+        try:
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for key, value in values.items():
+                pipeline.setex(key, ttl_seconds, json.dumps(value, default=str))
+            pipeline.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Cache set_many error for {len(values)} keys: {e}")
+            return False
+    
+    def incr(self, key: str) -> Optional[int]:
+        """Atomically increment an integer counter"""
+        if not self.is_available():
+            return None
+        
+        try:
+            return self.redis_client.incr(key)
+        except Exception as e:
+            logger.error(f"Cache incr error for key {key}: {e}")
+            return None
+    
     def get_or_set(self, key: str, func, ttl_seconds: int = 3600) -> Any:
         """Get from cache or set using function"""
         cached = self.get(key)
@@ -137,6 +175,20 @@ class CacheKeys:
     USER_SESSION = "user_session:{session_id}"
     ANALYTICS_SUMMARY = "analytics:summary"
     SEARCH_RESULTS = "search:{query}:{type}"
+    SEARCH_VERSION = "search:version:{type}"
+
+# Search result caching
+SEARCH_CACHE_TTL = int(os.environ.get('SEARCH_CACHE_TTL', 60))
+
+# Content types whose cached search results depend on each table: events and
+# campaigns embed the mosque name/address, news embeds the author name
+SEARCH_DEPENDENCIES = {
+    'mosques': ('mosques', 'events', 'campaigns'),
+    'events': ('events',),
+    'news': ('news',),
+    'campaigns': ('campaigns',),
+    'users': ('news',),
+}
 
 # Specific caching functions
 def cache_mosques_list(mosques: List[Dict]) -> bool:
@@ -162,6 +214,13 @@ def cache_prayer_times(mosque_id: int, date: str, prayer_times: Dict) -> bool:
     key = CacheKeys.PRAYER_TIMES.format(mosque_id=mosque_id, date=date)
     return cache.set(key, prayer_times, 86400)  # 24 hours
 
+def cache_prayer_times_many(mosque_id: int, prayer_times_by_date: Dict[str, Dict], ttl_seconds: int = 86400) -> bool:
+    """Cache prayer times for several dates of one mosque"""
+    return cache.set_many({
+        CacheKeys.PRAYER_TIMES.format(mosque_id=mosque_id, date=date): prayer_times
+        for date, prayer_times in prayer_times_by_date.items()
+    }, ttl_seconds)
+
 def get_cached_prayer_times(mosque_id: int, date: str) -> Optional[Dict]:
     """Get cached prayer times"""
     key = CacheKeys.PRAYER_TIMES.format(mosque_id=mosque_id, date=date)
@@ -177,6 +236,43 @@ def get_cached_user_session(session_id: str) -> Optional[Dict]:
     key = CacheKeys.USER_SESSION.format(session_id=session_id)
     return cache.get(key)
 
+def search_cache_key(params: Dict[str, Any], content_types: List[str]) -> Optional[str]:
+    """Build the search cache key for a normalized parameter set.
+    
+    The query part is a hash of the parameters, the type part pins the current
+    version of every content type involved, so bumping a version invalidates
+    exactly the entries that include that type.
+    """
+    if not cache.is_available() or SEARCH_CACHE_TTL <= 0:
+        return None
+    
+    content_types = sorted(content_types)
+    version_keys = [CacheKeys.SEARCH_VERSION.format(type=ctype) for ctype in content_types]
+    versions = cache.get_many(version_keys)
+    type_part = ','.join(f"{ctype}.{version or 0}" for ctype, version in zip(content_types, versions))
+    
+    canonical = json.dumps(params, sort_keys=True, separators=(',', ':'), default=str)
+    query_part = hashlib.sha1(canonical.encode()).hexdigest()
+    return CacheKeys.SEARCH_RESULTS.format(query=query_part, type=type_part)
+
+def get_cached_search_results(key: Optional[str]) -> Optional[Dict]:
+    """Get cached search results"""
+    return cache.get(key) if key else None
+
+def cache_search_results(key: Optional[str], results: Dict, ttl_seconds: int = None) -> bool:
+    """Cache search results for a short period"""
+    if not key:
+        return False
+    return cache.set(key, results, ttl_seconds or SEARCH_CACHE_TTL)
+
+def invalidate_search_cache(*tables: str):
+    """Invalidate cached searches that include data from the given tables"""
+    content_types = set()
+    for table in tables:
+        content_types.update(SEARCH_DEPENDENCIES.get(table, ()))
+    for ctype in sorted(content_types):
+        cache.incr(CacheKeys.SEARCH_VERSION.format(type=ctype))
+
 def invalidate_mosque_cache(mosque_id: int = None):
     """Invalidate mosque-related cache"""
     if mosque_id:
@@ -190,15 +286,22 @@ def invalidate_mosque_cache(mosque_id: int = None):
         cache.delete_pattern("mosque:detail:*")
         cache.delete_pattern("events:mosque:*")
         cache.delete_pattern("prayer_times:*")
+    invalidate_search_cache('mosques')
 
 def invalidate_events_cache():
     """Invalidate events cache"""
     cache.delete(CacheKeys.EVENTS_LIST)
     cache.delete_pattern("events:mosque:*")
+    invalidate_search_cache('events')
 
 def invalidate_news_cache():
     """Invalidate news cache"""
     cache.delete(CacheKeys.NEWS_LIST)
+    invalidate_search_cache('news')
+
+def invalidate_campaigns_cache():
+    """Invalidate campaign cache"""
+    invalidate_search_cache('campaigns')
 
 def invalidate_analytics_cache():
     """Invalidate analytics cache"""
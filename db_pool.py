@@ -0,0 +1,266 @@
+"""
+SQLite connection manager for VGM Website
+Reuses connections per thread/request, applies WAL and PRAGMA tuning, and exposes pool statistics
+"""
+
+import os
+import sqlite3
+import threading
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = 'instance/vgm_website.db'
+
+# PRAGMAs applied to every new connection. journal_mode is persistent in the
+# database file, the others are per connection.
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',      # Safe with WAL, avoids an fsync per commit
+    'mmap_size': 268435456,       # 256MB memory-mapped I/O
+    'cache_size': -16000,         # 16MB page cache (negative = KiB)
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,         # Wait up to 5s for writers instead of failing
+}
+
+
+class PooledConnection:
+    """Proxy around a pooled sqlite3 connection.
+
+    Behaves like ``sqlite3.Connection`` except that ``close()`` hands the
+    connection back to the pool instead of closing it, so existing
+    ``conn = get_db_connection() ... conn.close()`` call sites keep working.
+    """
+
+    def __init__(self, pool: 'SQLiteConnectionPool', conn: sqlite3.Connection):
+        self._pool = pool
+        self._conn = conn
+        self._released = False
+
+    def close(self):
+        """Return the connection to the pool"""
+        if not self._released:
+            self._released = True
+            self._pool.release(self._conn)
+
+    @property
+    def raw(self) -> sqlite3.Connection:
+        """Underlying sqlite3 connection"""
+        return self._conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._conn.__exit__(exc_type, exc, tb)
+
+
+class DetachedConnection(PooledConnection):
+    """Pooled connection held by no thread; only ``close()`` returns it.
+
+    Request teardown releases the connections a thread holds, so a
+    response body read after teardown (a streamed export) needs one the
+    teardown cannot hand to another request while its cursor is open.
+    """
+
+    def close(self):
+        """Return the connection to the pool"""
+        if not self._released:
+            self._released = True
+            self._pool.release_detached(self._conn)
+
+
+class SQLiteConnectionPool:
+    """Thread-aware pool of tuned SQLite connections.
+
+    A thread that asks for a connection while it already holds one gets the
+    same connection back (per-request reuse); once every holder has released
+    it, the connection goes back to a shared idle stack so the next request,
+    on any thread, skips connect + schema parse + cache warmup.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, max_idle: int = 8,
+                 cached_statements: int = 256, pragmas: Optional[Dict[str, Any]] = None):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self.cached_statements = cached_statements
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._idle: List[sqlite3.Connection] = []
+        self._pid = os.getpid()
+        self._stats = {
+            'connections_created': 0,
+            'connections_reused': 0,
+            'connections_closed': 0,
+            'acquires': 0,
+            'releases': 0,
+            'rollbacks_on_release': 0,
+            'in_use': 0,
+        }
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open and tune a new connection"""
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # check_same_thread is disabled because idle connections migrate
+        # between worker threads; the pool guarantees a single user at a time.
+        conn = sqlite3.connect(
+            self.db_path,
+            cached_statements=self.cached_statements,
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+
+        for name, value in self.pragmas.items():
+            try:
+                conn.execute(f'PRAGMA {name} = {value}')
+            except sqlite3.DatabaseError as e:
+                logger.warning(f"Could not apply PRAGMA {name}={value}: {e}")
+
+        with self._lock:
+            self._stats['connections_created'] += 1
+        return conn
+
+    def _check_fork(self):
+        """Drop inherited connections after a fork (e.g. gunicorn --preload)"""
+        pid = os.getpid()
+        if pid != self._pid:
+            # Never close or reuse SQLite handles that crossed a fork
+            self._pid = pid
+            self._idle = []
+            self._local = threading.local()
+            self._stats['in_use'] = 0
+
+    def acquire(self) -> sqlite3.Connection:
+        """Get the calling thread's connection, checking one out if needed"""
+        with self._lock:
+            self._check_fork()
+            self._stats['acquires'] += 1
+
+            conn = getattr(self._local, 'conn', None)
+            if conn is not None:
+                self._local.depth += 1
+                self._stats['connections_reused'] += 1
+                return conn
+
+            if self._idle:
+                conn = self._idle.pop()
+                self._stats['connections_reused'] += 1
+            else:
+                conn = None
+
+        if conn is None:
+            conn = self._connect()
+
+        with self._lock:
+            self._local.conn = conn
+            self._local.depth = 1
+            self._stats['in_use'] += 1
+        return conn
+
+    def dedicated_connection(self) -> sqlite3.Connection:
+        """Open a tuned connection outside the pool for a long-lived owner.
+
+        Background writers use this so they never share a request thread's
+        connection (and its open transaction).
+        """
+        return self._connect()
+
+    def detached_connection(self) -> DetachedConnection:
+        """Check out a pooled connection that outlives the request (streamed responses)"""
+        with self._lock:
+            self._check_fork()
+            self._stats['acquires'] += 1
+            conn = self._idle.pop() if self._idle else None
+            if conn is not None:
+                self._stats['connections_reused'] += 1
+
+        if conn is None:
+            conn = self._connect()
+
+        with self._lock:
+            self._stats['in_use'] += 1
+        return DetachedConnection(self, conn)
+
+    def connection(self) -> PooledConnection:
+        """Acquire a connection wrapped so that ``close()`` releases it"""
+        return PooledConnection(self, self.acquire())
+
+    def release(self, conn: sqlite3.Connection):
+        """Release one hold on the calling thread's connection"""
+        with self._lock:
+            self._stats['releases'] += 1
+            if getattr(self._local, 'conn', None) is not conn:
+                # Connection from another thread or a previous fork
+                return
+            self._local.depth -= 1
+            if self._local.depth > 0:
+                return
+            self._local.conn = None
+
+        self._return_to_idle(conn)
+
+    def release_detached(self, conn: sqlite3.Connection):
+        """Return a connection from ``detached_connection()``, from any thread"""
+        with self._lock:
+            self._stats['releases'] += 1
+        self._return_to_idle(conn)
+
+    def release_thread(self):
+        """Force-release the calling thread's connection (request teardown)"""
+        with self._lock:
+            conn = getattr(self._local, 'conn', None)
+            if conn is None:
+                return
+            self._local.conn = None
+            self._local.depth = 0
+        self._return_to_idle(conn)
+
+    def _return_to_idle(self, conn: sqlite3.Connection):
+        # Mirror sqlite3 close() semantics: uncommitted work is discarded
+        if conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                pass
+            with self._lock:
+                self._stats['rollbacks_on_release'] += 1
+
+        with self._lock:
+            self._stats['in_use'] = max(0, self._stats['in_use'] - 1)
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+            self._stats['connections_closed'] += 1
+        conn.close()
+
+    def close_all(self):
+        """Close all idle connections"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._stats['connections_closed'] += len(idle)
+        for conn in idle:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Pool statistics for monitoring"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+        stats['db_path'] = self.db_path
+        stats['max_idle'] = self.max_idle
+        stats['cached_statements'] = self.cached_statements
+        acquires = stats['acquires']
+        stats['reuse_ratio'] = round(stats['connections_reused'] / acquires, 4) if acquires else 0.0
+        return stats
@@ -90,6 +90,8 @@ with app.app_context():
             ContactSubmission,
             UserSession,
             IfterEvent,
+            IfterOccurrence,
+            FeedVersion,
             MosqueImage,
             MosqueVideo,
             MosqueNotificationPreference,
@@ -104,6 +106,11 @@ with app.app_context():
         # Create all database tables
         db.create_all()
         logger.info("Database tables created successfully")
+
+        # Events created before the occurrence table existed have no rows yet
+        if IfterEvent.query.first() and not IfterOccurrence.query.first():
+            from services.iftar_occurrences import rebuild_occurrences
+            rebuild_occurrences(db.session)
     except Exception as e:
         logger.error(f"Error during database initialization: {e}", exc_info=True)
         logger.error("Stack trace:", exc_info=True)
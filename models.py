@@ -1,7 +1,7 @@
 from datetime import datetime, date, time
 from flask_login import UserMixin
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Column, Integer, String, Float, Boolean, Date, Time, DateTime, ForeignKey, Text, Numeric
+from sqlalchemy import Column, Integer, String, Float, Boolean, Date, Time, DateTime, ForeignKey, Text, Numeric, event
 from sqlalchemy.orm import relationship
 
 # Initialize SQLAlchemy
@@ -194,6 +194,8 @@ class Event(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (db.Index('idx_events_mosque_date', 'mosque_id', 'event_date'),)
+
 class BoardMember(db.Model):
     """Board members model"""
     __tablename__ = 'board_members'
@@ -349,13 +351,79 @@ class IfterEvent(db.Model):
     end_time = db.Column(db.Time)
     location = db.Column(db.String(200))
     is_family_friendly = db.Column(db.Boolean, default=True)
+    registration_required = db.Column(db.Boolean, default=False)
     capacity = db.Column(db.Integer)
+    # Recurrence: a named pattern ('daily', 'fridays', ...) or an RRULE subset,
+    # expanded by services/iftar_recurrence.py
+    is_recurring = db.Column(db.Boolean, default=False)
+    recurrence_type = db.Column(db.String(200))
+    recurrence_end_date = db.Column(db.Date)
+    recurrence_exdates = db.Column(db.Text)  # comma separated ISO dates to skip
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationship
     mosque = db.relationship('Mosque', backref='ifter_events')
 
+    __table_args__ = (db.Index('idx_ifter_events_mosque_date', 'mosque_id', 'date'),)
+
+class IfterOccurrence(db.Model):
+    """One date of an IfterEvent, kept in sync by services/iftar_occurrences.py"""
+    __tablename__ = 'iftar_occurrences'
+
+    id = db.Column(db.Integer, primary_key=True)
+    event_id = db.Column(db.Integer, db.ForeignKey('ifter_events.id', ondelete='CASCADE'), nullable=False)
+    mosque_id = db.Column(db.Integer, db.ForeignKey('mosques.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    start_time = db.Column(db.Time, nullable=False)
+    is_family_friendly = db.Column(db.Boolean, default=True)
+
+    __table_args__ = (
+        db.Index('idx_iftar_occurrences_date', 'date', 'start_time'),
+        db.Index('idx_iftar_occurrences_mosque_date', 'mosque_id', 'date'),
+        db.Index('idx_iftar_occurrences_event', 'event_id'),
+    )
+
+    event = db.relationship('IfterEvent')
+
+class FeedVersion(db.Model):
+    """Version per public feed, bumped on every write the feed depends on (services/feed_versions.py)"""
+    __tablename__ = 'feed_versions'
+
+    resource = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+@event.listens_for(IfterEvent, 'after_insert')
+@event.listens_for(IfterEvent, 'after_update')
+def _sync_iftar_occurrences(mapper, connection, target):
+    from services.iftar_occurrences import sync_occurrences
+    from services.feed_versions import bump_feed_version
+    sync_occurrences(connection, target)
+    bump_feed_version(connection, 'iftar_map', 'calendar')
+
+@event.listens_for(IfterEvent, 'after_delete')
+def _delete_iftar_occurrences(mapper, connection, target):
+    from services.iftar_occurrences import delete_occurrences
+    from services.feed_versions import bump_feed_version
+    delete_occurrences(connection, target.id)
+    bump_feed_version(connection, 'iftar_map', 'calendar')
+
+@event.listens_for(Mosque, 'after_insert')
+@event.listens_for(Mosque, 'after_update')
+@event.listens_for(Mosque, 'after_delete')
+def _mosque_changed(mapper, connection, target):
+    # The map and calendar feeds show mosque names and coordinates
+    from services.feed_versions import bump_feed_version
+    bump_feed_version(connection, 'iftar_map', 'calendar')
+
+@event.listens_for(Event, 'after_insert')
+@event.listens_for(Event, 'after_update')
+@event.listens_for(Event, 'after_delete')
+def _event_changed(mapper, connection, target):
+    from services.feed_versions import bump_feed_version
+    bump_feed_version(connection, 'calendar')
+
 # Additional models for compatibility with existing routes
 class MosqueImage(db.Model):
     """Legacy MosqueImage model for compatibility"""
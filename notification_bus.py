@@ -0,0 +1,143 @@
+"""
+Notification wake-up bus for VGM Website
+Tells open notification streams that a user's notifications or unread count changed
+"""
+
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHANNEL = 'vgm:notifications'
+
+
+class Subscription:
+    """One open stream's wake-up flag; repeated wake-ups coalesce"""
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self._event = threading.Event()
+
+    def wake(self):
+        self._event.set()
+
+    def wait(self, timeout: float) -> bool:
+        """True if woken within ``timeout`` seconds; clears the flag"""
+        woken = self._event.wait(timeout)
+        self._event.clear()
+        return woken
+
+
+class NotificationBus:
+    """Per-user wake-ups for notification streams.
+
+    Messages only carry user ids; streams read what changed from the database
+    themselves, so a lost or duplicated wake-up never loses or repeats a
+    notification. With a Redis client, ``publish`` goes through Redis pub/sub
+    and a listener thread wakes this process's subscribers, so writes in one
+    worker reach streams held by another. Without Redis only streams in the
+    publishing process are woken.
+    """
+
+    def __init__(self, redis_client=None, channel: str = DEFAULT_CHANNEL):
+        self.redis_client = redis_client
+        self.channel = channel
+
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+        self._pubsub = None
+        self._pid = os.getpid()
+        self._stats = {
+            'published': 0,
+            'delivered': 0,
+            'publish_errors': 0,
+        }
+
+    def subscribe(self, user_id: int) -> Subscription:
+        """Register a stream for ``user_id``"""
+        if self.redis_client is not None:
+            self._ensure_listener()
+        subscription = Subscription(user_id)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def publish(self, user_ids: Iterable[int]):
+        """Wake every stream of the given users, in any worker"""
+        user_ids = [user_id for user_id in set(user_ids) if user_id is not None]
+        if not user_ids:
+            return
+        with self._lock:
+            self._stats['published'] += 1
+
+        if self.redis_client is not None:
+            try:
+                self.redis_client.publish(self.channel, json.dumps(user_ids))
+                return
+            except Exception as e:
+                logger.error(f"Notification bus publish failed, waking local streams only: {e}")
+                with self._lock:
+                    self._stats['publish_errors'] += 1
+        self._wake(user_ids)
+
+    def _wake(self, user_ids: Iterable[int]):
+        with self._lock:
+            subscriptions = [
+                subscription
+                for user_id in user_ids
+                for subscription in self._subscribers.get(user_id, ())
+            ]
+            self._stats['delivered'] += len(subscriptions)
+        for subscription in subscriptions:
+            subscription.wake()
+
+    def _ensure_listener(self):
+        """Start the Redis listener lazily, and again in a forked worker"""
+        with self._lock:
+            pid = os.getpid()
+            if pid != self._pid:
+                self._pid = pid
+                self._listener = None
+                self._pubsub = None
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(self.channel)
+            self._listener = threading.Thread(
+                target=self._listen, args=(self._pubsub,), name='notification-bus', daemon=True
+            )
+            self._listener.start()
+
+    def _listen(self, pubsub):
+        try:
+            for message in pubsub.listen():
+                if message.get('type') != 'message':
+                    continue
+                try:
+                    self._wake(int(user_id) for user_id in json.loads(message['data']))
+                except (TypeError, ValueError) as e:
+                    logger.error(f"Ignoring malformed notification bus message: {e}")
+        except Exception as e:
+            # The next subscribe() starts a new listener
+            logger.error(f"Notification bus listener stopped: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Bus statistics for monitoring"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['users'] = len(self._subscribers)
+            stats['streams'] = sum(len(subscribers) for subscribers in self._subscribers.values())
+        stats['backend'] = 'redis' if self.redis_client is not None else 'local'
+        return stats
@@ -1,15 +1,19 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, jsonify, abort, send_file, stream_with_context
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta
 from werkzeug.utils import secure_filename
 import os
 from app import db
-from models import Event, EventRegistration, EventNotification, User, EventMosqueCollaboration, MosqueNotificationPreference # Added import for MosqueNotificationPreference
+from models import Event, EventRegistration, EventNotification, User, EventMosqueCollaboration, MosqueNotificationPreference, Mosque # Added import for MosqueNotificationPreference
+from services.ics_feeds import CalendarFeeds
 
 
 # Create blueprint with url_prefix
 events = Blueprint('events', __name__, url_prefix='/events')
 
+# Seconds calendar apps may reuse a .ics feed before revalidating
+ICS_FEED_MAX_AGE = int(os.environ.get('ICS_FEED_MAX_AGE', 300))
+
 def allowed_file(filename):
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -59,6 +63,43 @@ def calendar_events():
 
     return jsonify(event_list)
 
+def _calendar_feeds():
+    feeds = current_app.extensions.get('calendar_feeds')
+    if feeds is None:
+        feeds = current_app.extensions['calendar_feeds'] = CalendarFeeds(db)
+    return feeds
+
+def _calendar_response(mosque_id=None):
+    """The .ics feed: 304 from the version alone, the cached file, or a fresh stream"""
+    feeds = _calendar_feeds()
+    etag = feeds.etag(mosque_id)
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        path = feeds.cached(mosque_id, etag)
+        if path:
+            response = send_file(path, mimetype='text/calendar', etag=False, conditional=False)
+        else:
+            response = current_app.response_class(stream_with_context(feeds.stream(mosque_id, etag)),
+                                                  mimetype='text/calendar')
+
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = ICS_FEED_MAX_AGE
+    return response
+
+@events.route('/calendar.ics')
+def calendar_feed():
+    """Subscription feed with the events and iftars of every mosque"""
+    return _calendar_response()
+
+@events.route('/mosques/<int:mosque_id>/calendar.ics')
+def mosque_calendar_feed(mosque_id):
+    """Subscription feed with the events and iftars of one mosque"""
+    if db.session.get(Mosque, mosque_id) is None:
+        abort(404)
+    return _calendar_response(mosque_id)
+
 @events.route('/')
 def event_list():
     # Get all mosques for the filter dropdown
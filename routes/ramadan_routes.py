@@ -1,11 +1,15 @@
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
+import hashlib
 import logging
-from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify
+from flask import Blueprint, current_app, render_template, request, flash, redirect, url_for, jsonify
 from flask_login import current_user
 from flask_babel import _
 from sqlalchemy.orm import joinedload
 from app import db
-from models import User, IfterEvent
+from models import User, IfterEvent, Mosque
+from services.iftar_map_feed import IftarMapFeed
+from services.map_clusters import LAYERS, MAX_ZOOM, MapClusters, parse_bounds
+from services.prayer_calculation import calculate_day
 import os
 
 # Configure logging
@@ -14,67 +18,58 @@ logger = logging.getLogger(__name__)
 
 ramadan = Blueprint('ramadan', __name__)
 
+# Days shown per iftar map period
+MAP_PERIOD_DAYS = {'day': 1, 'week': 7, 'all': 30}
+
+# Seconds browsers may reuse the iftar map feed before revalidating
+MAP_FEED_MAX_AGE = int(os.environ.get('IFTAR_MAP_FEED_MAX_AGE', 60))
+
+def _map_filters():
+    """(period, mosque_id, family_only) from the query string"""
+    period = request.args.get('period', 'all')
+    if period not in MAP_PERIOD_DAYS:
+        period = 'all'
+    return period, request.args.get('mosque_id', type=int), request.args.get('filter') == 'family'
+
+def _map_feed():
+    feed = current_app.extensions.get('iftar_map_feed')
+    if feed is None:
+        feed = current_app.extensions['iftar_map_feed'] = IftarMapFeed(db)
+    return feed
+
+def _map_clusters():
+    clusters = current_app.extensions.get('map_clusters')
+    if clusters is None:
+        clusters = current_app.extensions['map_clusters'] = MapClusters(db)
+    return clusters
+
+def _map_window(period):
+    today = date.today()
+    return today, today + timedelta(days=MAP_PERIOD_DAYS[period] - 1)
+
 @ramadan.route('/iftar-map')
 def iftar_map():
-    """Simplified iftar map route"""
+    """Iftar map page; events are loaded client-side from the GeoJSON feed"""
     try:
-        logger.debug("Starting iftar map route")
-
-        # Get filter parameters
-        family_only = request.args.get('filter') == 'family'
-        selected_mosque = request.args.get('mosque_id', type=int)
-
-        # Get today and calculate period dates
+        period, selected_mosque, family_only = _map_filters()
         today = date.today()
 
-        # Get events with optimized loading
-        logger.debug("Building event query...")
-        query = IfterEvent.query\
-            .options(joinedload(IfterEvent.mosque))\
-            .filter(IfterEvent.date >= today)
+        # Mosques for filtering
+        mosques = Mosque.query.filter_by(is_active=True).order_by(Mosque.name).all()
+
+        # Today's prayer times are calculated locally, no external API call
+        prayer_times = {today: calculate_day(today)}
 
+        feed_args = {'period': period}
         if selected_mosque:
-            query = query.filter(IfterEvent.mosque_id == selected_mosque)
+            feed_args['mosque_id'] = selected_mosque
         if family_only:
-            query = query.filter(IfterEvent.is_family_friendly == True)
-
-        events = query.order_by(IfterEvent.date, IfterEvent.start_time).all()
-        logger.info(f"Retrieved {len(events)} events")
-
-        # Convert events to JSON-serializable format
-        events_json = []
-        for event in events:
-            event_dict = {
-                'id': event.id,
-                'mosque_name': event.mosque.mosque_name if event.mosque else 'Unknown',
-                'date': event.date.strftime('%Y-%m-%d'),
-                'start_time': event.start_time.strftime('%H:%M'),
-                'location': event.location,
-                'is_family_friendly': event.is_family_friendly,
-                'latitude': event.mosque.latitude if event.mosque else None,
-                'longitude': event.mosque.longitude if event.mosque else None
-            }
-            events_json.append(event_dict)
-            logger.debug(f"Processed event: {event_dict}")
-
-        # Get mosques for filtering
-        mosques = User.query.filter_by(
-            user_type='mosque',
-            is_verified=True
-        ).all()
-        logger.debug(f"Found {len(mosques)} verified mosques")
-
-        # Add prayer times data for today
-        # Import here to avoid circular imports
-        from services.prayer_service import get_prayer_times_for_date_range
-        
-        # Get prayer times for today
-        prayer_times = get_prayer_times_for_date_range(today, today)
-        logger.debug(f"Retrieved prayer times for {today}")
+            feed_args['filter'] = 'family'
 
         return render_template('ramadan/iftar_map.html',
-                           events=events,
-                           events_json=events_json,
+                           feed_url=url_for('ramadan.iftar_map_geojson', **feed_args),
+                           clusters_url=url_for('ramadan.map_clusters', layer='iftars', **feed_args),
+                           period=period,
                            family_only=family_only,
                            selected_mosque=selected_mosque,
                            today=today,
@@ -87,6 +82,75 @@ def iftar_map():
         flash(_('Er is een fout opgetreden bij het laden van de iftar kaart.'), 'error')
         return redirect(url_for('ramadan.index'))
 
+@ramadan.route('/api/iftar-map.geojson')
+def iftar_map_geojson():
+    """Iftar occurrences of the selected period as GeoJSON, cached per filter combination"""
+    try:
+        period, mosque_id, family_only = _map_filters()
+        key = (*_map_window(period), mosque_id, family_only)
+
+        feed = _map_feed()
+        etag = feed.etag(key)
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        else:
+            etag, body = feed.get(key, etag)
+            response = current_app.response_class(body, mimetype='application/geo+json')
+
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = MAP_FEED_MAX_AGE
+        return response
+
+    except Exception as e:
+        logger.error(f"Error in iftar map feed: {e}", exc_info=True)
+        return jsonify({'error': 'Failed to load iftar map'}), 500
+
+@ramadan.route('/api/map-clusters')
+def map_clusters():
+    """Marker clusters for a zoom level and viewport (bbox=west,south,east,north).
+
+    layer=iftars clusters the iftars of the map filters, layer=mosques the
+    active mosques.
+    """
+    try:
+        period, mosque_id, family_only = _map_filters()
+        layer = request.args.get('layer', 'iftars')
+        zoom = request.args.get('zoom', type=int)
+        if layer not in LAYERS:
+            return jsonify({'error': f"layer must be one of {', '.join(LAYERS)}"}), 400
+        if zoom is None or not 0 <= zoom <= MAX_ZOOM:
+            return jsonify({'error': f'zoom must be between 0 and {MAX_ZOOM}'}), 400
+        bounds = None
+        if request.args.get('bbox'):
+            try:
+                bounds = parse_bounds(request.args['bbox'])
+            except ValueError as e:
+                return jsonify({'error': f'Invalid bbox: {e}'}), 400
+
+        if layer == 'mosques':
+            key = ('mosques', None, None, None, False)
+        else:
+            key = ('iftars', *_map_window(period), mosque_id, family_only)
+
+        cache = _map_clusters()
+        version = cache.version(key)
+        etag = hashlib.sha1(f"{version}:{zoom}:{bounds}".encode()).hexdigest()[:20]
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        else:
+            clusters = cache.get(key, version).clusters(zoom, bounds)
+            response = jsonify({'layer': layer, 'zoom': zoom, 'clusters': clusters})
+
+        response.set_etag(etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = MAP_FEED_MAX_AGE
+        return response
+
+    except Exception as e:
+        logger.error(f"Error in map clusters: {e}", exc_info=True)
+        return jsonify({'error': 'Failed to load map clusters'}), 500
+
 @ramadan.route('/')
 def index():
     """Main Ramadan page"""
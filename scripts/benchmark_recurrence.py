@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Recurrence expansion benchmark for IfterCalendar
+
+Builds long-running synthetic iftar series and times how long it takes to
+list one month of a calendar with the previous expansion (every instance
+from the series start, then filtered) against the window-clipped engine in
+services/iftar_recurrence.py.
+
+Usage: python scripts/benchmark_recurrence.py [--events 200] [--years 5] [--repeat 5]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, time as dt_time, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ifter_calendar import IfterCalendar  # noqa: E402
+
+
+def legacy_instances(calendar, event):
+    """The expansion IfterCalendar used before: the whole series, every time"""
+    if not event.is_recurring:
+        return [calendar._create_event_instance(event, event.date)]
+    delta = timedelta(days=1 if event.recurrence_type == 'daily' else 7)
+    end_date = event.recurrence_end_date or (event.date + timedelta(days=30))
+    instances = []
+    current_date = event.date
+    while current_date <= end_date:
+        instances.append(calendar._create_event_instance(event, current_date))
+        current_date += delta
+    return instances
+
+
+def legacy_period(calendar, events, start_date, end_date):
+    unique_events = {}
+    for event in events:
+        for instance in legacy_instances(calendar, event):
+            if start_date <= instance['date'] <= end_date:
+                key = f"{instance['id']}_{instance['date']}_{instance['type']}"
+                unique_events.setdefault(key, instance)
+    return sorted(unique_events.values(), key=lambda x: (x['date'], x['start_time']))
+
+
+def engine_period(calendar, events, start_date, end_date):
+    instances = [
+        instance
+        for event in events
+        for instance in calendar.generate_event_instances(event, start_date, end_date)
+    ]
+    return sorted(instances, key=lambda x: (x['date'], x['start_time']))
+
+
+def make_events(count, years, today, rng):
+    mosque = SimpleNamespace(name='Moskee', latitude=51.05, longitude=3.72)
+    return [
+        SimpleNamespace(
+            id=i, mosque_id=1, mosque=mosque,
+            date=today - timedelta(days=rng.randint(0, 365 * years)),
+            start_time=dt_time(19, rng.randint(0, 59)), end_time=None, location='Zaal',
+            is_family_friendly=True, registration_required=False, capacity=100,
+            is_recurring=True, recurrence_type=rng.choice(['daily', 'weekly']),
+            recurrence_end_date=today + timedelta(days=365), recurrence_exdates=None,
+        )
+        for i in range(count)
+    ]
+
+
+def time_call(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--events', type=int, default=200, help='recurring series to expand')
+    parser.add_argument('--years', type=int, default=5, help='how far back series may start')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement')
+    args = parser.parse_args()
+
+    calendar = IfterCalendar(db=None)
+    today = date(2025, 3, 1)
+    events = make_events(args.events, args.years, today, random.Random(42))
+    start_date, end_date = today, today + timedelta(days=29)
+
+    legacy_ms, legacy = time_call(lambda: legacy_period(calendar, events, start_date, end_date), args.repeat)
+    engine_ms, engine = time_call(lambda: engine_period(calendar, events, start_date, end_date), args.repeat)
+    assert [(i['id'], i['date']) for i in legacy] == [(i['id'], i['date']) for i in engine], "result mismatch"
+
+    print(f"events={args.events} years={args.years} repeat={args.repeat} instances={len(engine)}")
+    print(f"{'legacy ms':>10} {'engine ms':>10} {'speedup':>8}")
+    print(f"{legacy_ms:10.2f} {engine_ms:10.2f} {legacy_ms / engine_ms:7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Search latency benchmark for app.py
+
+Seeds a temporary SQLite database with a large synthetic dataset and times
+/api/search with the FTS5 index against the LIKE scan fallback.
+
+Usage: python scripts/benchmark_search.py [--rows 20000] [--repeat 20]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = (
+    'moskee gebed vrijdag iftar ramadan gemeenschap lezing jongeren familie '
+    'gent ledeberg brugse poort sint amandsberg wondelgem educatie koran '
+    'bijeenkomst activiteit vrijwilligers renovatie dialoog buurt cultuur '
+    'solidariteit maaltijd bezoekers open deur dag kinderen vrouwen'
+).split()
+
+
+def sentence(rng, length):
+    return ' '.join(rng.choice(WORDS) for _ in range(length))
+
+
+def seed(conn, rows, rng):
+    """Insert ``rows`` events/news and a proportional number of mosques/campaigns"""
+    mosque_rows = max(10, rows // 100)
+    conn.executemany(
+        'INSERT INTO mosques (name, address, description, imam_name, capacity) VALUES (?, ?, ?, ?, ?)',
+        [
+            (f"Moskee {sentence(rng, 2)} {i}", f"{sentence(rng, 2)}straat {i}, 9000 Gent",
+             sentence(rng, 40), f"Imam {i}", rng.randint(50, 800))
+            for i in range(mosque_rows)
+        ]
+    )
+    conn.executemany(
+        'INSERT INTO events (title, description, event_date, event_time, mosque_id) VALUES (?, ?, ?, ?, ?)',
+        [
+            (sentence(rng, 5), sentence(rng, 60), f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+             '19:00:00', rng.randint(1, mosque_rows))
+            for _ in range(rows)
+        ]
+    )
+    conn.executemany(
+        'INSERT INTO news (title, content, excerpt, author_id) VALUES (?, ?, ?, ?)',
+        [(sentence(rng, 6), sentence(rng, 400), sentence(rng, 20), 1) for _ in range(rows)]
+    )
+    conn.executemany(
+        'INSERT INTO campaigns (title, description, target_amount, mosque_id) VALUES (?, ?, ?, ?)',
+        [(sentence(rng, 4), sentence(rng, 50), 1000.0, rng.randint(1, mosque_rows)) for _ in range(rows // 10)]
+    )
+    # A handful of rows with a rare term so selective queries have hits
+    conn.execute("UPDATE news SET content = content || ' zeldzaamwoord' WHERE id % 997 = 0")
+    conn.commit()
+
+
+def time_query(client, query, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get('/api/search', query_string=query)
+        samples.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.get_data(as_text=True)
+    return statistics.median(samples), response.get_json()['total_results']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000, help='events and news rows to seed')
+    parser.add_argument('--repeat', type=int, default=20, help='requests per measurement')
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    os.environ['SQLITE_DB_PATH'] = os.path.join(tmpdir, 'benchmark.db')
+    import logging
+    logging.disable(logging.INFO)
+    from app import create_app
+
+    app = create_app()
+    conn = app.extensions['db_pool'].connection()
+    seed(conn, args.rows, random.Random(42))
+    conn.close()
+    client = app.test_client()
+
+    queries = [
+        {'q': 'zeldzaamwoord'},
+        {'q': 'zeldzaamwoord', 'type': 'news'},
+        {'q': 'Imam 42', 'type': 'mosques'},
+        {'q': 'brugse poort vrijwilligers', 'type': 'events'},
+    ]
+
+    print(f"rows={args.rows} repeat={args.repeat} fts_available={app.config['SEARCH_FTS_AVAILABLE']}")
+    print(f"{'query':45} {'like ms':>10} {'fts ms':>10} {'speedup':>8} {'hits':>6}")
+    for query in queries:
+        app.config['SEARCH_BACKEND'] = 'like'
+        like_ms, like_hits = time_query(client, query, args.repeat)
+        app.config['SEARCH_BACKEND'] = 'fts'
+        fts_ms, fts_hits = time_query(client, query, args.repeat)
+        assert like_hits == fts_hits, f"result mismatch for {query}: {like_hits} != {fts_hits}"
+        label = ' '.join(f"{k}={v}" for k, v in query.items())
+        print(f"{label:45} {like_ms:10.2f} {fts_ms:10.2f} {like_ms / fts_ms:7.1f}x {fts_hits:6d}")
+
+
+if __name__ == '__main__':
+    main()
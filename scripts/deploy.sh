@@ -387,6 +387,20 @@ EOF
     log "Monitoring setup complete"
 }
 
+# Setup scheduled jobs
+setup_scheduled_jobs() {
+    log "Setting up scheduled jobs..."
+    
+    # Keep a year of prayer times stored ahead and this week's cache warm
+    (crontab -l 2>/dev/null | grep -v "generate-prayer-times"; echo "30 2 * * 1 cd $BACKEND_DIR && .venv/bin/flask --app app_new generate-prayer-times >> $BACKEND_DIR/logs/prayer-times.log 2>&1") | crontab -
+    
+    # First run now, so the first visitors do not calculate
+    cd "$BACKEND_DIR"
+    .venv/bin/flask --app app_new generate-prayer-times
+    
+    log "Scheduled jobs setup complete"
+}
+
 # Start services
 start_services() {
     log "Starting services..."
@@ -462,6 +476,7 @@ deploy() {
     setup_nginx
     setup_ssl
     setup_monitoring
+    setup_scheduled_jobs
     start_services
     run_tests
     
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Prayer time reference table for Gent (Diyanet, Hanafi asr)
+
+Computes all six prayers with the NOAA solar position equations (Meeus),
+which share no code with the PrayTimes-based engine in
+services/prayer_calculation.py, and applies Diyanet's published temkin
+minutes. The result is written as a reference table for
+tests/test_prayer_calculation.py.
+
+Usage: python scripts/generate_prayer_reference.py [--year 2024] [--output PATH]
+"""
+
+import argparse
+import json
+import math
+import os
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+
+LATITUDE = 51.0543422
+LONGITUDE = 3.7174243
+TIMEZONE = 'Europe/Brussels'
+
+# Diyanet İşleri Başkanlığı: twilight angles and temkin (precaution) minutes
+FAJR_ANGLE = 18.0
+ISHA_ANGLE = 17.0
+TEMKIN = {'fajr': 0, 'sunrise': -7, 'dhuhr': 5, 'asr': 4, 'maghrib': 7, 'isha': 0}
+
+# Hanafi asr: shadow twice the object's length plus its noon shadow
+ASR_FACTOR = 2
+
+# Refraction plus the solar radius at sunrise and sunset
+HORIZON = -0.833
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              'tests', 'data', 'prayer_reference_gent_diyanet.json')
+
+
+def _julian_day(day: date, minutes_utc: float) -> float:
+    return day.toordinal() + 1721424.5 + minutes_utc / 1440
+
+
+def _sun(jd: float):
+    """(declination in degrees, equation of time in minutes)"""
+    t = (jd - 2451545.0) / 36525
+    mean_longitude = (280.46646 + t * (36000.76983 + t * 0.0003032)) % 360
+    anomaly = math.radians(357.52911 + t * (35999.05029 - 0.0001537 * t))
+    eccentricity = 0.016708634 - t * (0.000042037 + 0.0000001267 * t)
+    center = (math.sin(anomaly) * (1.914602 - t * (0.004817 + 0.000014 * t))
+              + math.sin(2 * anomaly) * (0.019993 - 0.000101 * t) + math.sin(3 * anomaly) * 0.000289)
+    omega = math.radians(125.04 - 1934.136 * t)
+    apparent_longitude = math.radians(mean_longitude + center - 0.00569 - 0.00478 * math.sin(omega))
+    mean_obliquity = 23 + (26 + (21.448 - t * (46.815 + t * (0.00059 - t * 0.001813))) / 60) / 60
+    obliquity = math.radians(mean_obliquity + 0.00256 * math.cos(omega))
+
+    declination = math.degrees(math.asin(math.sin(obliquity) * math.sin(apparent_longitude)))
+    y = math.tan(obliquity / 2) ** 2
+    l0 = math.radians(mean_longitude)
+    equation_of_time = 4 * math.degrees(
+        y * math.sin(2 * l0) - 2 * eccentricity * math.sin(anomaly)
+        + 4 * eccentricity * y * math.sin(anomaly) * math.cos(2 * l0)
+        - 0.5 * y * y * math.sin(4 * l0) - 1.25 * eccentricity ** 2 * math.sin(2 * anomaly)
+    )
+    return declination, equation_of_time
+
+
+def _transit(day: date) -> float:
+    minutes = 720.0
+    for _ in range(3):
+        _, equation_of_time = _sun(_julian_day(day, minutes))
+        minutes = 720 - 4 * LONGITUDE - equation_of_time
+    return minutes
+
+
+def _at_altitude(day: date, altitude, morning: bool):
+    """Minutes after 00:00 UTC at which the sun is at ``altitude`` degrees
+    (a function of the declination for asr), or None if it never is
+    """
+    minutes = 360.0 if morning else 1080.0
+    latitude = math.radians(LATITUDE)
+    for _ in range(4):
+        declination, equation_of_time = _sun(_julian_day(day, minutes))
+        target = altitude(declination) if callable(altitude) else altitude
+        decl = math.radians(declination)
+        cosine = ((math.sin(math.radians(target)) - math.sin(latitude) * math.sin(decl))
+                  / (math.cos(latitude) * math.cos(decl)))
+        if not -1 <= cosine <= 1:
+            return None
+        hour_angle = math.degrees(math.acos(cosine))
+        transit = 720 - 4 * LONGITUDE - equation_of_time
+        minutes = transit - 4 * hour_angle if morning else transit + 4 * hour_angle
+    return minutes
+
+
+def _asr_altitude(declination: float) -> float:
+    return math.degrees(math.atan(1 / (ASR_FACTOR + math.tan(math.radians(abs(LATITUDE - declination))))))
+
+
+def reference_day(day: date):
+    """Local 'HH:MM' per prayer, temkin included"""
+    times = {
+        'fajr': _at_altitude(day, -FAJR_ANGLE, morning=True),
+        'sunrise': _at_altitude(day, HORIZON, morning=True),
+        'dhuhr': _transit(day),
+        'asr': _at_altitude(day, _asr_altitude, morning=False),
+        'maghrib': _at_altitude(day, HORIZON, morning=False),
+        'isha': _at_altitude(day, -ISHA_ANGLE, morning=False),
+    }
+
+    # Angle-based high latitude rule (Aladhan's default): twilight lasts at
+    # most angle/60 of the night
+    night = 1440 - (times['maghrib'] - times['sunrise'])
+    if times['fajr'] is None or times['sunrise'] - times['fajr'] > FAJR_ANGLE / 60 * night:
+        times['fajr'] = times['sunrise'] - FAJR_ANGLE / 60 * night
+    if times['isha'] is None or times['isha'] - times['maghrib'] > ISHA_ANGLE / 60 * night:
+        times['isha'] = times['maghrib'] + ISHA_ANGLE / 60 * night
+
+    offset = datetime(day.year, day.month, day.day, 12, tzinfo=ZoneInfo(TIMEZONE)).utcoffset()
+    local = {}
+    for prayer, minutes in times.items():
+        value = round(minutes + offset.total_seconds() / 60 + TEMKIN[prayer]) % 1440
+        local[prayer] = f"{value // 60:02d}:{value % 60:02d}"
+    return local
+
+
+def reference_days(year: int):
+    """The 15th of every month plus the equinoxes and solstices"""
+    days = {date(year, month, 15) for month in range(1, 13)}
+    days |= {date(year, 3, 20), date(year, 6, 21), date(year, 9, 22), date(year, 12, 21)}
+    return sorted(days)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--year', type=int, default=2024)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    table = {
+        'location': {
+            'name': 'Gent',
+            'latitude': LATITUDE,
+            'longitude': LONGITUDE,
+            'timezone': TIMEZONE,
+            'method': 13,
+            'school': 1,
+            'temkin': TEMKIN,
+            'source': 'NOAA solar position equations (scripts/generate_prayer_reference.py), '
+                      'Diyanet angles 18/17, Hanafi asr, angle-based high latitude rule, Diyanet temkin minutes',
+        },
+        'times': {day.isoformat(): reference_day(day) for day in reference_days(args.year)},
+    }
+    with open(args.output, 'w', encoding='utf-8') as handle:
+        json.dump(table, handle, indent=2, ensure_ascii=False)
+        handle.write('\n')
+    print(f"Wrote {len(table['times'])} days to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""
+Incremental analytics rollups for the raw SQLite app (app.py)
+
+Raw page_views, analytics_events and user_activity rows are folded into
+hourly and daily count tables keyed on (bucket, source, dimension, mosque).
+A per-source watermark records the last raw id folded in, so each rollup run
+only reads rows inserted since the previous one. Readers combine the rollups
+with the raw rows above the watermark, so results are exact without waiting
+for the next run and their cost depends on the window, not on table size.
+"""
+
+import logging
+import sqlite3
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Per raw table: the column used as dimension and the mosque column (if any)
+ROLLUP_SOURCES = {
+    'page_views': {'dimension': 'page_path', 'mosque': None},
+    'analytics_events': {'dimension': 'event_type', 'mosque': 'mosque_id'},
+    'user_activity': {'dimension': 'activity_type', 'mosque': None},
+}
+
+# Bucket expression per granularity; both sort as text
+GRANULARITIES = {
+    'hourly': "strftime('%Y-%m-%d %H:00:00', created_at)",
+    'daily': "date(created_at)",
+}
+
+
+def rollup_table(granularity: str) -> str:
+    """Name of the rollup table for a granularity"""
+    return f"analytics_rollup_{granularity}"
+
+
+def init_rollup_tables(conn: sqlite3.Connection):
+    """Create rollup and watermark tables"""
+    for granularity in GRANULARITIES:
+        # mosque_id 0 stands for "no mosque" so it can be part of the key
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {rollup_table(granularity)} (
+                bucket TEXT NOT NULL,
+                source TEXT NOT NULL,
+                dimension TEXT NOT NULL,
+                mosque_id INTEGER NOT NULL DEFAULT 0,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (source, bucket, dimension, mosque_id)
+            ) WITHOUT ROWID
+        ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS analytics_rollup_watermarks (
+            source TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL DEFAULT 0,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+
+
+def get_watermarks(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Last raw id folded into the rollups, per source"""
+    watermarks = {source: 0 for source in ROLLUP_SOURCES}
+    for row in conn.execute('SELECT source, last_id FROM analytics_rollup_watermarks'):
+        watermarks[row[0]] = row[1]
+    return watermarks
+
+
+def run_rollup(conn: sqlite3.Connection, batch_size: int = 50000) -> Dict[str, int]:
+    """Fold raw rows above each watermark into the rollups.
+
+    Each source is processed in id ranges of ``batch_size`` rows, one
+    transaction per range, so the watermark and the counts it covers always
+    commit together. Returns the number of raw rows folded per source.
+    """
+    folded = {}
+    for source, definition in ROLLUP_SOURCES.items():
+        folded[source] = 0
+        dimension = f"COALESCE({definition['dimension']}, '')"
+        mosque = f"COALESCE({definition['mosque']}, 0)" if definition['mosque'] else '0'
+
+        while True:
+            # BEGIN IMMEDIATE takes the write lock before reading the
+            # watermark, so concurrent runs cannot fold the same rows twice
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute(
+                    'SELECT last_id FROM analytics_rollup_watermarks WHERE source = ?', (source,)
+                ).fetchone()
+                last_id = row[0] if row else 0
+                upper = conn.execute(
+                    f'SELECT MAX(id) FROM (SELECT id FROM {source} WHERE id > ? ORDER BY id LIMIT ?)',
+                    (last_id, batch_size)
+                ).fetchone()[0]
+                if upper is None:
+                    conn.rollback()
+                    break
+
+                for granularity, bucket in GRANULARITIES.items():
+                    conn.execute(f'''
+                        INSERT INTO {rollup_table(granularity)} (bucket, source, dimension, mosque_id, count)
+                        SELECT {bucket}, ?, {dimension}, {mosque}, COUNT(*)
+                        FROM {source}
+                        WHERE id > ? AND id <= ? AND {bucket} IS NOT NULL
+                        GROUP BY 1, 3, 4
+                        ON CONFLICT (source, bucket, dimension, mosque_id)
+                        DO UPDATE SET count = count + excluded.count
+                    ''', (source, last_id, upper))
+
+                rows = conn.execute(
+                    f'SELECT COUNT(*) FROM {source} WHERE id > ? AND id <= ?', (last_id, upper)
+                ).fetchone()[0]
+                conn.execute('''
+                    INSERT INTO analytics_rollup_watermarks (source, last_id, updated_at)
+                    VALUES (?, ?, CURRENT_TIMESTAMP)
+                    ON CONFLICT (source) DO UPDATE SET last_id = excluded.last_id, updated_at = excluded.updated_at
+                ''', (source, upper))
+                conn.commit()
+            except sqlite3.Error:
+                conn.rollback()
+                raise
+            folded[source] += rows
+
+    if any(folded.values()):
+        logger.info(f"Analytics rollup folded {folded}")
+    return folded
+
+
+def _window_sql(source: str, group_by: str, days: int):
+    """UNION of rollup and raw-tail counts for the last ``days`` days.
+
+    Full days after the cutoff day come from the daily rollup, the hours of
+    the cutoff day from the hourly rollup, and rows above the watermark from
+    the raw table. ``group_by`` is 'dimension', 'day' or 'total'. The
+    watermark is read by the same statement, so a rollup committing in
+    between cannot make the tail overlap the rollups.
+    """
+    definition = ROLLUP_SOURCES[source]
+    cutoff = f"datetime('now', '-{int(days)} days')"
+    select = {
+        'dimension': ('dimension', f"COALESCE({definition['dimension']}, '')"),
+        'day': ('substr(bucket, 1, 10)', 'date(created_at)'),
+        'total': ("'total'", "'total'"),
+    }[group_by]
+
+    sql = f'''
+        SELECT {select[0]} AS key, count FROM {rollup_table('daily')}
+        WHERE source = ? AND bucket > date({cutoff})
+        UNION ALL
+        SELECT {select[0]} AS key, count FROM {rollup_table('hourly')}
+        WHERE source = ? AND bucket >= strftime('%Y-%m-%d %H:00:00', {cutoff})
+          AND bucket < date({cutoff}, '+1 day')
+        UNION ALL
+        SELECT {select[1]} AS key, 1 AS count FROM {source}
+        WHERE id > (SELECT COALESCE(MAX(last_id), 0) FROM analytics_rollup_watermarks WHERE source = ?)
+          AND created_at >= {cutoff}
+    '''
+    return sql, [source, source, source]
+
+
+def window_counts(conn: sqlite3.Connection, source: str, days: int,
+                  group_by: str = 'dimension') -> List[sqlite3.Row]:
+    """Counts per dimension or per day over the last ``days`` days, largest first"""
+    sql, params = _window_sql(source, group_by, days)
+    order = 'key DESC' if group_by == 'day' else 'count DESC, key'
+    return conn.execute(
+        f'SELECT key, SUM(count) AS count FROM ({sql}) GROUP BY key ORDER BY {order}', params
+    ).fetchall()
+
+
+def window_total(conn: sqlite3.Connection, source: str, days: int) -> int:
+    """Total rows of a source over the last ``days`` days"""
+    sql, params = _window_sql(source, 'total', days)
+    return conn.execute(f'SELECT COALESCE(SUM(count), 0) FROM ({sql})', params).fetchone()[0]
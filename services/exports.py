@@ -0,0 +1,150 @@
+"""
+Streaming exports for the raw SQLite app (app.py)
+
+Export queries are iterated with ``fetchmany`` and encoded chunk by chunk as
+CSV, NDJSON or a JSON array, so a response for the full donation history
+uses the same worker memory as one for a single day.
+"""
+
+import csv
+import io
+import json
+import sqlite3
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Rows fetched from SQLite and encoded per yielded chunk
+CHUNK_SIZE = 1000
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Per dataset: SELECT/FROM, the created_at and mosque columns used by the
+# filters (mosque None if the dataset has no mosque), and the ORDER BY
+EXPORTS = {
+    'donations': {
+        'select': '''
+            SELECT d.id, d.created_at, d.donor_name, d.donor_email, d.amount, d.currency,
+                   d.donation_type, d.status, d.payment_method, d.mosque_id,
+                   m.name AS mosque_name, d.campaign_id, c.title AS campaign_title
+            FROM donations d
+            LEFT JOIN mosques m ON d.mosque_id = m.id
+            LEFT JOIN campaigns c ON d.campaign_id = c.id
+        ''',
+        'created_at': 'd.created_at',
+        'mosque': 'd.mosque_id',
+        'order': 'd.created_at, d.id',
+    },
+    'page_views': {
+        'select': '''
+            SELECT pv.id, pv.created_at, pv.page_path, pv.user_id, pv.session_id, pv.referrer, pv.user_agent
+            FROM page_views pv
+        ''',
+        'created_at': 'pv.created_at',
+        'mosque': None,
+        'order': 'pv.created_at, pv.id',
+    },
+    'users': {
+        # Activity is aggregated per user through the (user_id, created_at)
+        # index instead of a GROUP BY over the whole join
+        'select': '''
+            SELECT u.id, u.created_at, u.email, u.first_name, u.last_name, u.role, u.mosque_id,
+                   u.is_active,
+                   (SELECT COUNT(*) FROM user_activity ua WHERE ua.user_id = u.id) AS activity_count,
+                   (SELECT MAX(ua.created_at) FROM user_activity ua WHERE ua.user_id = u.id) AS last_activity
+            FROM users u
+        ''',
+        'created_at': 'u.created_at',
+        'mosque': 'u.mosque_id',
+        'order': 'u.id',
+    },
+}
+
+
+def build_export_query(dataset: str, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                       mosque_id: Optional[int] = None) -> Tuple[str, List[Any]]:
+    """SQL and parameters for an export; raises ValueError for unsupported filters"""
+    definition = EXPORTS[dataset]
+    conditions, params = [], []
+
+    # Range comparisons on the raw column keep the created_at indexes usable
+    if date_from:
+        conditions.append(f"{definition['created_at']} >= datetime(?)")
+        params.append(date_from)
+    if date_to:
+        conditions.append(f"{definition['created_at']} < datetime(?, '+1 day')")
+        params.append(date_to)
+    if mosque_id is not None:
+        if definition['mosque'] is None:
+            raise ValueError(f"{dataset} cannot be filtered by mosque")
+        conditions.append(f"{definition['mosque']} = ?")
+        params.append(mosque_id)
+
+    sql = definition['select']
+    if conditions:
+        sql += f" WHERE {' AND '.join(conditions)}"
+    sql += f" ORDER BY {definition['order']}"
+    return sql, params
+
+
+def _chunks(cursor: sqlite3.Cursor, chunk_size: int) -> Iterator[List[sqlite3.Row]]:
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield rows
+
+
+def _csv_value(value: Any) -> Any:
+    # Keep spreadsheet applications from evaluating user-supplied text as a formula
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@'):
+        return "'" + value
+    return value
+
+
+def iter_csv(cursor: sqlite3.Cursor, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """Header line, then CSV lines for every row of ``cursor``"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column[0] for column in cursor.description])
+    for rows in _chunks(cursor, chunk_size):
+        writer.writerows([_csv_value(value) for value in row] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # The header is still pending when the query returned no rows
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def iter_ndjson(cursor: sqlite3.Cursor, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """One JSON object per line for every row of ``cursor``"""
+    for rows in _chunks(cursor, chunk_size):
+        yield ''.join(json.dumps(dict(row), default=str) + '\n' for row in rows)
+
+
+def iter_json_array(cursor: sqlite3.Cursor, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """The rows of ``cursor`` as one JSON array, encoded chunk by chunk"""
+    yield '['
+    separator = ''
+    for rows in _chunks(cursor, chunk_size):
+        yield separator + ','.join(json.dumps(dict(row), default=str) for row in rows)
+        separator = ','
+    yield ']\n'
+
+
+ENCODERS = {
+    'csv': iter_csv,
+    'ndjson': iter_ndjson,
+}
+
+
+def export_headers(dataset: str, export_format: str, filters: Dict[str, Any]) -> Dict[str, str]:
+    """Content-Type and attachment filename for an export response"""
+    suffix = '-'.join(str(filters[key]) for key in ('date_from', 'date_to') if filters.get(key))
+    filename = f"{dataset}{'-' + suffix if suffix else ''}.{'csv' if export_format == 'csv' else 'ndjson'}"
+    return {
+        'Content-Type': f"{FORMATS[export_format]}; charset=utf-8",
+        'Content-Disposition': f'attachment; filename="{filename}"',
+    }
@@ -0,0 +1,35 @@
+"""
+Version counters for the public feeds of the legacy models (models.py)
+
+Each feed ('iftar_map', 'calendar') has a row in feed_versions that the
+mapper events in models.py bump, inside the writing transaction, whenever
+a row the feed reads changes. Feeds derive their ETag and cache keys from
+it, so a revalidation is one primary-key lookup and a write made through
+any worker invalidates every worker's copy.
+"""
+
+import hashlib
+from datetime import datetime
+
+
+def bump_feed_version(connection, *resources: str):
+    """Mark the feeds' cached bodies as outdated"""
+    from models import FeedVersion
+
+    table = FeedVersion.__table__
+    now = datetime.utcnow()
+    for resource in resources:
+        result = connection.execute(
+            table.update().where(table.c.resource == resource).values(version=table.c.version + 1, updated_at=now)
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(resource=resource, version=1, updated_at=now))
+
+
+def feed_etag(db, resource: str, *parts) -> str:
+    """ETag for a feed response: the feed's version plus what selects the response"""
+    from models import FeedVersion
+
+    row = db.session.get(FeedVersion, resource)
+    version = f"{row.version}:{row.updated_at.isoformat()}" if row else '0'
+    return hashlib.sha1(':'.join(str(part) for part in (version,) + parts).encode()).hexdigest()[:20]
@@ -0,0 +1,261 @@
+"""
+iCalendar subscription feeds for events and iftars
+
+/events/calendar.ics and /events/mosques/<id>/calendar.ics serve every
+active event and iftar as a VEVENT. Recurring events are one VEVENT with
+an RRULE instead of one per date, so a feed stays small however long a
+series runs. The body is streamed from an indexed query, written to disk
+as it goes and reused until the 'calendar' feed version
+(services/feed_versions.py) moves; If-None-Match is answered from that
+version alone.
+"""
+
+import glob
+import logging
+import os
+import tempfile
+from datetime import date, datetime, time
+from typing import Iterator, Optional
+
+from sqlalchemy.orm import joinedload
+
+from services.feed_versions import feed_etag
+from services.iftar_recurrence import event_rule
+
+logger = logging.getLogger(__name__)
+
+# Directory holding the generated feeds, one file per scope
+ICS_CACHE_DIR = os.environ.get('ICS_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'vgm-ics-feeds'))
+
+# Rows loaded per round trip while streaming
+STREAM_BATCH = 200
+
+PRODID = '-//VGM Gent//Kalender//NL'
+UID_DOMAIN = 'vgm.be'
+TIMEZONE = 'Europe/Brussels'
+
+# Events only have a start time; the calendar has always shown them as two hours
+DEFAULT_DURATION = 'PT2H'
+
+# Event.recurring_pattern -> RRULE frequency
+EVENT_FREQUENCIES = {'weekly': 'WEEKLY', 'monthly': 'MONTHLY', 'yearly': 'YEARLY'}
+
+LINE_OCTETS = 75
+CRLF = '\r\n'
+
+VTIMEZONE = CRLF.join([
+    'BEGIN:VTIMEZONE',
+    f'TZID:{TIMEZONE}',
+    'BEGIN:DAYLIGHT',
+    'TZOFFSETFROM:+0100',
+    'TZOFFSETTO:+0200',
+    'TZNAME:CEST',
+    'DTSTART:19700329T020000',
+    'RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU',
+    'END:DAYLIGHT',
+    'BEGIN:STANDARD',
+    'TZOFFSETFROM:+0200',
+    'TZOFFSETTO:+0100',
+    'TZNAME:CET',
+    'DTSTART:19701025T030000',
+    'RRULE:FREQ=YEARLY;BYMONTH=10;BYDAY=-1SU',
+    'END:STANDARD',
+    'END:VTIMEZONE',
+]) + CRLF
+
+
+def escape_text(value) -> str:
+    """TEXT value with backslashes, separators and newlines escaped"""
+    return (str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n').replace('\r', ''))
+
+
+def fold(line: str) -> str:
+    """Content line split into lines of at most 75 octets, without splitting a UTF-8 sequence"""
+    encoded = line.encode('utf-8')
+    parts = []
+    limit = LINE_OCTETS
+    while len(encoded) > limit:
+        cut = limit
+        while encoded[cut] & 0xC0 == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+        # Continuation lines start with a space, which counts towards the limit
+        limit = LINE_OCTETS - 1
+    parts.append(encoded.decode('utf-8'))
+    return (CRLF + ' ').join(parts) + CRLF
+
+
+def _local(day: date, at: time) -> str:
+    return datetime.combine(day, at).strftime('%Y%m%dT%H%M%S')
+
+
+def _stamp(row) -> str:
+    return (row.updated_at or row.created_at or datetime.utcnow()).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _location(mosque, location: Optional[str] = None) -> str:
+    return ', '.join(part for part in (location or (mosque.name if mosque else None),
+                                       mosque.address if mosque else None) if part)
+
+
+def _vevent(properties) -> str:
+    lines = ['BEGIN:VEVENT' + CRLF]
+    lines.extend(fold(f'{name}:{value}') for name, value in properties if value not in (None, ''))
+    lines.append('END:VEVENT' + CRLF)
+    return ''.join(lines)
+
+
+def event_vevent(event) -> str:
+    """VEVENT for an Event; weekly, monthly and yearly series become an RRULE"""
+    frequency = EVENT_FREQUENCIES.get(event.recurring_pattern) if event.is_recurring else None
+    return _vevent([
+        ('UID', f'event-{event.id}@{UID_DOMAIN}'),
+        ('DTSTAMP', _stamp(event)),
+        (f'DTSTART;TZID={TIMEZONE}', _local(event.event_date, event.event_time)),
+        ('DURATION', DEFAULT_DURATION),
+        ('RRULE', f'FREQ={frequency}' if frequency else None),
+        ('SUMMARY', escape_text(event.title)),
+        ('DESCRIPTION', escape_text(event.description) if event.description else None),
+        ('LOCATION', escape_text(_location(event.mosque))),
+        ('CATEGORIES', escape_text(event.event_type) if event.event_type else None),
+    ])
+
+
+def iftar_vevent(event) -> Optional[str]:
+    """VEVENT for an IfterEvent, recurring ones as an RRULE with their exclusions;
+    None when a series has no dates left
+    """
+    start, rrule, exdates = event.date, None, ()
+    if event.is_recurring:
+        try:
+            rule = event_rule(event)
+        except ValueError:
+            logger.warning(f"Iftar {event.id} has an unsupported recurrence rule, exported as a single date")
+        else:
+            # RFC 5545 always counts DTSTART as an occurrence, so the series
+            # starts at its first real date (a 'fridays' series created on a
+            # Wednesday starts on the Friday)
+            start = next(rule.occurrences(event.date, event.date, rule.until), None)
+            if start is None:
+                return None
+            # With a TZID start, UNTIL has to be UTC; end of day keeps the last date
+            rrule = f'{rule.to_rrule()};UNTIL={rule.until:%Y%m%d}T235959Z'
+            exdates = sorted(day for day in rule.exdates if start < day <= rule.until)
+
+    if event.end_time and event.end_time > event.start_time:
+        end = (f'DTEND;TZID={TIMEZONE}', _local(start, event.end_time))
+    else:
+        end = ('DURATION', DEFAULT_DURATION)
+    mosque = event.mosque
+    notes = []
+    if event.is_family_friendly:
+        notes.append('Gezinsvriendelijk')
+    if event.registration_required:
+        notes.append('Inschrijving vereist')
+    return _vevent([
+        ('UID', f'iftar-{event.id}@{UID_DOMAIN}'),
+        ('DTSTAMP', _stamp(event)),
+        (f'DTSTART;TZID={TIMEZONE}', _local(start, event.start_time)),
+        end,
+        ('RRULE', rrule),
+        (f'EXDATE;TZID={TIMEZONE}', ','.join(_local(day, event.start_time) for day in exdates)),
+        ('SUMMARY', escape_text(f"Iftar - {mosque.name if mosque else 'Moskee'}")),
+        ('DESCRIPTION', escape_text('\n'.join(notes))),
+        ('LOCATION', escape_text(_location(mosque, event.location))),
+        ('GEO', f'{mosque.latitude};{mosque.longitude}'
+         if mosque and mosque.latitude is not None and mosque.longitude is not None else None),
+        ('CATEGORIES', 'iftar'),
+    ])
+
+
+def calendar_chunks(db, mosque_id: Optional[int] = None) -> Iterator[str]:
+    """The feed as text chunks: the header, one VEVENT per chunk, the footer"""
+    from models import Event, IfterEvent, Mosque
+
+    name = 'VGM Gent'
+    if mosque_id is not None:
+        mosque = db.session.get(Mosque, mosque_id)
+        name = mosque.name if mosque else name
+    yield ''.join([
+        'BEGIN:VCALENDAR' + CRLF,
+        'VERSION:2.0' + CRLF,
+        fold(f'PRODID:{PRODID}'),
+        'CALSCALE:GREGORIAN' + CRLF,
+        'METHOD:PUBLISH' + CRLF,
+        fold(f'X-WR-CALNAME:{escape_text(name)}'),
+        f'X-WR-TIMEZONE:{TIMEZONE}' + CRLF,
+        VTIMEZONE,
+    ])
+
+    events = db.session.query(Event).options(joinedload(Event.mosque)).filter(Event.is_active == True)
+    iftars = db.session.query(IfterEvent).options(joinedload(IfterEvent.mosque))
+    if mosque_id is not None:
+        events = events.filter(Event.mosque_id == mosque_id)
+        iftars = iftars.filter(IfterEvent.mosque_id == mosque_id)
+
+    for event in events.order_by(Event.event_date, Event.event_time, Event.id).yield_per(STREAM_BATCH):
+        yield event_vevent(event)
+    for event in iftars.order_by(IfterEvent.date, IfterEvent.start_time, IfterEvent.id).yield_per(STREAM_BATCH):
+        vevent = iftar_vevent(event)
+        if vevent:
+            yield vevent
+
+    yield 'END:VCALENDAR' + CRLF
+
+
+class CalendarFeeds:
+    """Generated .ics files per scope (all, or one mosque), valid for one calendar version"""
+
+    def __init__(self, db, cache_dir: str = ICS_CACHE_DIR):
+        self.db = db
+        self.cache_dir = cache_dir
+        self.builds = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def _scope(mosque_id: Optional[int]) -> str:
+        return 'all' if mosque_id is None else f'mosque-{mosque_id}'
+
+    def etag(self, mosque_id: Optional[int] = None) -> str:
+        return feed_etag(self.db, 'calendar', 'ics', self._scope(mosque_id))
+
+    def _path(self, mosque_id: Optional[int], etag: str) -> str:
+        return os.path.join(self.cache_dir, f'{self._scope(mosque_id)}.{etag}.ics')
+
+    def cached(self, mosque_id: Optional[int], etag: str) -> Optional[str]:
+        """Path of the feed generated for this version, if there is one"""
+        path = self._path(mosque_id, etag)
+        return path if os.path.exists(path) else None
+
+    def stream(self, mosque_id: Optional[int], etag: str) -> Iterator[bytes]:
+        """Generate the feed, writing it to disk as it is sent.
+
+        The file only replaces the cached one once the whole body was
+        written, so a client disconnecting halfway leaves no partial feed.
+        """
+        path = self._path(mosque_id, etag)
+        fd, partial = tempfile.mkstemp(prefix=f'{self._scope(mosque_id)}.', suffix='.part', dir=self.cache_dir)
+        complete = False
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                for chunk in calendar_chunks(self.db, mosque_id):
+                    data = chunk.encode('utf-8')
+                    file.write(data)
+                    yield data
+            os.replace(partial, path)
+            complete = True
+            self.builds += 1
+            logger.debug(f"Generated calendar feed {path}")
+        finally:
+            if not complete:
+                os.unlink(partial)
+
+        # Feeds of older versions are never served again
+        for stale in glob.glob(os.path.join(self.cache_dir, f'{self._scope(mosque_id)}.*.ics')):
+            if stale != path:
+                try:
+                    os.unlink(stale)
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,96 @@
+"""
+GeoJSON feed for the iftar map
+
+The map page renders client-side from /ramadan/api/iftar-map.geojson. A
+feed body is built once per (date window, mosque, family filter) and kept
+in memory until the next iftar or mosque write, which bumps the
+'iftar_map' feed version (services/feed_versions.py). The ETag is derived
+from that version, so a revalidation is one primary-key lookup and a
+write made through any worker invalidates every worker's copy.
+"""
+
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+from services.feed_versions import feed_etag
+from services.ifter_calendar import IfterCalendar
+
+logger = logging.getLogger(__name__)
+
+# Feed bodies kept per process (one per filter combination)
+FEED_CACHE_SIZE = int(os.environ.get('IFTAR_MAP_FEED_CACHE_SIZE', 256))
+
+FeedKey = Tuple[date, date, Optional[int], bool]
+
+
+def map_etag(db, *parts) -> str:
+    """ETag for a map response: the map version plus what selects the response"""
+    return feed_etag(db, 'iftar_map', *parts)
+
+
+def feature_collection(events) -> Dict:
+    """GeoJSON for calendar instances; events without coordinates get no geometry"""
+    features = []
+    for event in events:
+        has_coordinates = event['latitude'] is not None and event['longitude'] is not None
+        features.append({
+            'type': 'Feature',
+            'geometry': {
+                'type': 'Point',
+                'coordinates': [event['longitude'], event['latitude']]
+            } if has_coordinates else None,
+            'properties': {
+                'id': event['id'],
+                'mosque_id': event['mosque_id'],
+                'mosque_name': event['mosque_name'] or 'Unknown',
+                'date': event['date'].strftime('%Y-%m-%d'),
+                'start_time': event['start_time'].strftime('%H:%M'),
+                'location': event['location'],
+                'is_family_friendly': bool(event['is_family_friendly']),
+            },
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+class IftarMapFeed:
+    """Serialized feeds per filter combination, valid for one map version"""
+
+    def __init__(self, db, max_entries: int = FEED_CACHE_SIZE):
+        self.db = db
+        self.max_entries = max_entries
+        self._cache: 'OrderedDict[FeedKey, Tuple[str, str]]' = OrderedDict()  # key -> (etag, body)
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def etag(self, key: FeedKey) -> str:
+        start_date, end_date, mosque_id, family_only = key
+        return map_etag(self.db, start_date, end_date, mosque_id, family_only)
+
+    def get(self, key: FeedKey, etag: Optional[str] = None) -> Tuple[str, str]:
+        """(etag, GeoJSON body), built only when the cached body is outdated"""
+        etag = etag or self.etag(key)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and cached[0] == etag:
+                self._cache.move_to_end(key)
+                return cached
+
+        start_date, end_date, mosque_id, family_only = key
+        events = IfterCalendar(self.db).get_events_for_period(
+            start_date, end_date, mosque_id=mosque_id, family_only=family_only
+        )
+        body = json.dumps(feature_collection(events), separators=(',', ':'))
+        logger.debug(f"Built iftar map feed for {key}: {len(events)} events")
+
+        with self._lock:
+            self.builds += 1
+            self._cache[key] = (etag, body)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return etag, body
@@ -0,0 +1,94 @@
+"""
+Materialised iftar occurrences
+
+Every date an IfterEvent takes place on is stored as a row in
+iftar_occurrences, so calendar and map requests read a date range from an
+index instead of expanding recurrences. The rows of an event are replaced
+from the IfterEvent mapper events (models.py) whenever it is inserted, or
+updated in a way that moves its dates, and removed when it is deleted.
+
+Bulk ``Query.update``/``delete`` calls bypass mapper events; run
+``rebuild_occurrences`` after those.
+"""
+
+import logging
+from datetime import date
+from typing import Dict, List
+
+from sqlalchemy import inspect
+
+from services.iftar_recurrence import event_occurrences
+
+logger = logging.getLogger(__name__)
+
+# IfterEvent attributes the occurrence rows are derived from
+SOURCE_ATTRIBUTES = (
+    'mosque_id', 'date', 'start_time', 'is_family_friendly', 'is_recurring',
+    'recurrence_type', 'recurrence_end_date', 'recurrence_exdates',
+)
+
+
+def occurrence_dates(event) -> List[date]:
+    """Every date of the event; unknown patterns only keep the first date"""
+    try:
+        return list(event_occurrences(event, event.date, date.max))
+    except ValueError as e:
+        logger.warning(f"Iftar event {event.id}: {e}")
+        return [event.date]
+
+
+def occurrence_rows(event) -> List[Dict]:
+    return [
+        {
+            'event_id': event.id,
+            'mosque_id': event.mosque_id,
+            'date': day,
+            'start_time': event.start_time,
+            'is_family_friendly': bool(event.is_family_friendly),
+        }
+        for day in occurrence_dates(event)
+    ]
+
+
+def _needs_sync(event) -> bool:
+    # During a flush the history holds what changed; a new event has its
+    # required columns (mosque_id, date, start_time) in there as well
+    state = inspect(event)
+    return any(state.attrs[name].history.has_changes() for name in SOURCE_ATTRIBUTES)
+
+
+def delete_occurrences(connection, event_id: int):
+    from models import IfterOccurrence
+
+    table = IfterOccurrence.__table__
+    connection.execute(table.delete().where(table.c.event_id == event_id))
+
+
+def sync_occurrences(connection, event, force: bool = False):
+    """Replace the event's rows, unless nothing they depend on changed"""
+    from models import IfterOccurrence
+
+    if not force and not _needs_sync(event):
+        return
+    delete_occurrences(connection, event.id)
+    rows = occurrence_rows(event)
+    if rows:
+        connection.execute(IfterOccurrence.__table__.insert(), rows)
+    logger.debug(f"Stored {len(rows)} occurrences for iftar event {event.id}")
+
+
+def rebuild_occurrences(session) -> int:
+    """Recreate every row from the events, e.g. for existing data; returns the row count"""
+    from models import IfterEvent, IfterOccurrence
+
+    connection = session.connection()
+    connection.execute(IfterOccurrence.__table__.delete())
+    count = 0
+    for event in session.query(IfterEvent).yield_per(500):
+        rows = occurrence_rows(event)
+        if rows:
+            connection.execute(IfterOccurrence.__table__.insert(), rows)
+        count += len(rows)
+    session.commit()
+    logger.info(f"Rebuilt {count} iftar occurrences")
+    return count
@@ -0,0 +1,151 @@
+"""
+Recurrence expansion for iftar events
+
+A recurring IfterEvent is described by its start date, ``recurrence_type``,
+``recurrence_end_date`` and ``recurrence_exdates``. ``recurrence_type`` is
+one of the named patterns below or an RRULE subset
+(``FREQ=DAILY|WEEKLY;INTERVAL=n;BYDAY=MO,FR;UNTIL=YYYYMMDD``).
+
+Occurrences are yielded lazily for a window only: the first one inside the
+window is found arithmetically, so a series that started years ago costs
+the same as one that started yesterday.
+"""
+
+import math
+from datetime import date, datetime, timedelta
+from typing import FrozenSet, Iterable, Iterator, Optional
+
+WEEKDAY_CODES = {'MO': 0, 'TU': 1, 'WE': 2, 'TH': 3, 'FR': 4, 'SA': 5, 'SU': 6}
+
+# Series without an end date used to stop 30 days after their start
+DEFAULT_SPAN_DAYS = 30
+
+# Named patterns offered by the iftar form, as (freq, weekdays)
+PATTERNS = {
+    'daily': ('DAILY', None),
+    'weekly': ('WEEKLY', None),
+    'weekdays': ('DAILY', frozenset(range(5))),
+    'weekends': ('DAILY', frozenset((5, 6))),
+    'fridays': ('WEEKLY', frozenset((4,))),
+}
+
+
+class RecurrenceRule:
+    """When a series repeats: every ``interval`` days or weeks, optionally
+    only on ``weekdays`` (0 = Monday), until ``until``, except ``exdates``.
+    """
+
+    def __init__(self, freq: str, interval: int = 1, weekdays: Optional[Iterable[int]] = None,
+                 until: Optional[date] = None, exdates: Iterable[date] = ()):
+        if freq not in ('DAILY', 'WEEKLY'):
+            raise ValueError(f"Unsupported recurrence frequency: {freq}")
+        if interval < 1:
+            raise ValueError("Recurrence interval must be at least 1")
+        self.freq = freq
+        self.interval = interval
+        self.weekdays: Optional[FrozenSet[int]] = frozenset(weekdays) if weekdays else None
+        self.until = until
+        self.exdates = frozenset(exdates)
+
+    @classmethod
+    def parse(cls, recurrence_type: str, until: Optional[date] = None,
+              exdates: Iterable[date] = ()) -> 'RecurrenceRule':
+        """Rule from a named pattern or an RRULE string; raises ValueError"""
+        if recurrence_type in PATTERNS:
+            freq, weekdays = PATTERNS[recurrence_type]
+            return cls(freq, weekdays=weekdays, until=until, exdates=exdates)
+
+        parts = {}
+        for part in recurrence_type.upper().replace('RRULE:', '').split(';'):
+            name, _, value = part.partition('=')
+            if not value:
+                raise ValueError(f"Invalid recurrence rule: {recurrence_type}")
+            parts[name.strip()] = value.strip()
+
+        unsupported = set(parts) - {'FREQ', 'INTERVAL', 'BYDAY', 'UNTIL'}
+        if unsupported:
+            raise ValueError(f"Unsupported recurrence parts: {', '.join(sorted(unsupported))}")
+        try:
+            weekdays = [WEEKDAY_CODES[code] for code in parts['BYDAY'].split(',')] if 'BYDAY' in parts else None
+        except KeyError:
+            raise ValueError(f"Invalid BYDAY in recurrence rule: {recurrence_type}")
+        if 'UNTIL' in parts:
+            rule_until = datetime.strptime(parts['UNTIL'][:8], '%Y%m%d').date()
+            until = min(until, rule_until) if until else rule_until
+        return cls(parts.get('FREQ', ''), int(parts.get('INTERVAL', 1)), weekdays, until, exdates)
+
+    def to_rrule(self) -> str:
+        """RFC 5545 RRULE value (without UNTIL, which depends on the start's timezone)"""
+        parts = [f"FREQ={self.freq}"]
+        if self.interval > 1:
+            parts.append(f"INTERVAL={self.interval}")
+        if self.weekdays:
+            codes = {weekday: code for code, weekday in WEEKDAY_CODES.items()}
+            parts.append("BYDAY=" + ','.join(codes[weekday] for weekday in sorted(self.weekdays)))
+        return ';'.join(parts)
+
+    def occurrences(self, start: date, window_start: date, window_end: date) -> Iterator[date]:
+        """Dates of the series starting at ``start`` that fall in the window, in order"""
+        last = min(window_end, self.until) if self.until else window_end
+        first = max(start, window_start)
+        if first > last:
+            return
+
+        if self.freq == 'DAILY':
+            dates = self._daily(start, first, last)
+        else:
+            dates = self._weekly(start, first, last)
+        for day in dates:
+            if day not in self.exdates:
+                yield day
+
+    def _daily(self, start: date, first: date, last: date) -> Iterator[date]:
+        # Jump to the first step on or after the window
+        steps = math.ceil((first - start).days / self.interval)
+        day = start + timedelta(days=steps * self.interval)
+        step = timedelta(days=self.interval)
+        while day <= last:
+            if self.weekdays is None or day.weekday() in self.weekdays:
+                yield day
+            day += step
+
+    def _weekly(self, start: date, first: date, last: date) -> Iterator[date]:
+        weekdays = sorted(self.weekdays) if self.weekdays else [start.weekday()]
+        # Weeks run Monday to Sunday; every interval-th week from the start's week is active
+        start_week = start - timedelta(days=start.weekday())
+        weeks = (first - start_week).days // 7
+        week = start_week + timedelta(weeks=weeks - weeks % self.interval)
+        step = timedelta(weeks=self.interval)
+        while week <= last:
+            for weekday in weekdays:
+                day = week + timedelta(days=weekday)
+                if day > last:
+                    return
+                if day >= first:
+                    yield day
+            week += step
+
+
+def parse_exdates(value: Optional[str]) -> FrozenSet[date]:
+    """Comma separated ISO dates as stored in ``recurrence_exdates``"""
+    if not value:
+        return frozenset()
+    return frozenset(datetime.strptime(part.strip(), '%Y-%m-%d').date() for part in value.split(',') if part.strip())
+
+
+def event_occurrences(event, window_start: date, window_end: date) -> Iterator[date]:
+    """Dates an IfterEvent takes place on within the window"""
+    if not event.is_recurring:
+        if window_start <= event.date <= window_end:
+            yield event.date
+        return
+
+    yield from event_rule(event).occurrences(event.date, window_start, window_end)
+
+
+def event_rule(event) -> RecurrenceRule:
+    """Rule of a recurring IfterEvent; raises ValueError for unsupported rules"""
+    until = event.recurrence_end_date or (event.date + timedelta(days=DEFAULT_SPAN_DAYS))
+    return RecurrenceRule.parse(
+        event.recurrence_type or 'daily', until, parse_exdates(getattr(event, 'recurrence_exdates', None))
+    )
@@ -69,7 +69,8 @@ class IfterService:
                 capacity=event_data.get('capacity'),
                 is_recurring=event_data.get('is_recurring', False),
                 recurrence_type=event_data.get('recurrence_type'),
-                recurrence_end_date=event_data.get('recurrence_end_date')
+                recurrence_end_date=event_data.get('recurrence_end_date'),
+                recurrence_exdates=event_data.get('recurrence_exdates')
             )
 
             self.db.session.add(event)
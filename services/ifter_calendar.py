@@ -1,7 +1,10 @@
 import logging
-from datetime import date, timedelta
-import copy
-from typing import List, Dict, Set, Optional
+from datetime import date
+from typing import Iterator, List, Optional
+
+from sqlalchemy.orm import joinedload
+
+from services.iftar_recurrence import event_occurrences
 
 logger = logging.getLogger(__name__)
 
@@ -10,96 +13,50 @@ class IfterCalendar:
 
     def __init__(self, db):
         self.db = db
-        self.processed_keys = set()  # For duplicate detection
-
-    def generate_event_instances(self, event) -> List[dict]:
-        """Generate all instances of a recurring event without duplicates"""
-        if not event.is_recurring:
-            return [self._create_event_instance(event, event.date)]
-
-        instances = []
-        start_date = event.date
-        end_date = event.recurrence_end_date or (start_date + timedelta(days=30))  # Default 30 days
-
-        # Determine recurrence pattern
-        if event.recurrence_type == 'daily':
-            delta = timedelta(days=1)
-        elif event.recurrence_type == 'weekly':
-            delta = timedelta(days=7)
-        else:
-            # Other recurrence patterns here
-            return [self._create_event_instance(event, event.date)]
-
-        # Generate unique instances
-        current_date = start_date
-        seen_dates = set()  # For duplicate detection
-
-        while current_date <= end_date:
-            if current_date not in seen_dates:
-                seen_dates.add(current_date)
-
-                # Create new instance with correct date
-                instance = self._create_event_instance(event, current_date)
-                instances.append(instance)
-
-            current_date += delta
 
-        return instances
+    def generate_event_instances(self, event, start_date: Optional[date] = None,
+                                 end_date: Optional[date] = None) -> Iterator[dict]:
+        """Lazily generate the instances of an event, limited to the window if given"""
+        window_start = start_date or event.date
+        window_end = end_date or date.max
+        try:
+            dates = list(event_occurrences(event, window_start, window_end))
+        except ValueError as e:
+            # Unknown patterns keep the old behaviour: only the first date
+            logger.warning(f"Iftar event {event.id}: {e}")
+            dates = [event.date] if window_start <= event.date <= window_end else []
+
+        for instance_date in dates:
+            yield self._create_event_instance(event, instance_date)
 
     def get_events_for_period(self, start_date: date, end_date: date, 
                            mosque_id: Optional[int] = None,
                            family_only: bool = False,
                            event_type: str = 'all') -> List[dict]:
         """Get all events for a specific period with filtering"""
-        from models import IfterEvent
+        from models import IfterEvent, IfterOccurrence
 
-        # Build base query with filters
-        query = self.db.session.query(IfterEvent)
+        # Occurrences are materialised, so the period is an index range scan
+        query = self.db.session.query(IfterOccurrence.date, IfterEvent)\
+            .join(IfterEvent, IfterOccurrence.event_id == IfterEvent.id)\
+            .options(joinedload(IfterEvent.mosque))\
+            .filter(IfterOccurrence.date >= start_date, IfterOccurrence.date <= end_date)
 
         if mosque_id:
-            query = query.filter(IfterEvent.mosque_id == mosque_id)
+            query = query.filter(IfterOccurrence.mosque_id == mosque_id)
         if family_only:
-            query = query.filter(IfterEvent.is_family_friendly == True)
+            query = query.filter(IfterOccurrence.is_family_friendly == True)
         if event_type != 'all':
-            if event_type == 'daily':
-                query = query.filter(IfterEvent.is_recurring == True,
-                                   IfterEvent.recurrence_type == 'daily')
-            elif event_type == 'weekly':
-                query = query.filter(IfterEvent.is_recurring == True,
-                                   IfterEvent.recurrence_type == 'weekly')
-            elif event_type == 'single':
+            if event_type == 'single':
                 query = query.filter(IfterEvent.is_recurring == False)
+            else:
+                query = query.filter(IfterEvent.is_recurring == True,
+                                   IfterEvent.recurrence_type == event_type)
 
-        # Get base events within period
-        events = query.filter(
-            (IfterEvent.date <= end_date) & 
-            ((IfterEvent.recurrence_end_date >= start_date) | 
-             (IfterEvent.recurrence_end_date.is_(None)))
-        ).all()
-
-        logger.debug(f"Found {len(events)} base events matching filters")
-
-        # Generate all instances
-        unique_events = {}  # Dictionary to prevent duplicates
-        for event in events:
-            instances = self.generate_event_instances(event)
-
-            for instance in instances:
-                instance_date = instance['date']
-
-                # Only add if within range and not duplicate
-                if start_date <= instance_date <= end_date:
-                    key = f"{instance['id']}_{instance_date}_{instance['type']}"
-                    if key not in unique_events:
-                        unique_events[key] = instance
-
-        # Sort events by date and time
-        sorted_events = sorted(
-            unique_events.values(), 
-            key=lambda x: (x['date'], x['start_time'])
-        )
+        rows = query.order_by(IfterOccurrence.date, IfterOccurrence.start_time, IfterOccurrence.event_id).all()
+        logger.debug(f"Found {len(rows)} occurrences matching filters")
 
-        return sorted_events
+        return [self._create_event_instance(event, instance_date) for instance_date, event in rows]
 
     def _create_event_instance(self, event, instance_date: date) -> dict:
         """Create a standardized event instance"""
@@ -107,7 +64,7 @@ class IfterCalendar:
             'id': event.id,
             'type': 'single' if not event.is_recurring else event.recurrence_type,
             'mosque_id': event.mosque_id,
-            'mosque_name': event.mosque.mosque_name if event.mosque else None,
+            'mosque_name': event.mosque.name if event.mosque else None,
             'date': instance_date,
             'start_time': event.start_time,
             'end_time': event.end_time,
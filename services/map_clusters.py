@@ -0,0 +1,191 @@
+"""
+Server-side marker clustering for the iftar and mosque maps
+
+Points are projected to Web Mercator once and grouped per zoom level into
+grid cells of CLUSTER_RADIUS_PX screen pixels, the way supercluster's
+grid pass does. A level is computed the first time it is asked for and
+reused until the map feed version (services/feed_versions.py) moves, which
+happens on every IfterEvent or Mosque write. Clients send a zoom level and
+their viewport and get back only the clusters inside it.
+"""
+
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from services.iftar_map_feed import map_etag
+from services.ifter_calendar import IfterCalendar
+
+logger = logging.getLogger(__name__)
+
+TILE_SIZE = 256
+
+# Cluster cell size in screen pixels, and the zoom from which points are
+# only grouped when they share a position
+CLUSTER_RADIUS_PX = int(os.environ.get('MAP_CLUSTER_RADIUS_PX', 60))
+MAX_CLUSTER_ZOOM = int(os.environ.get('MAP_CLUSTER_MAX_ZOOM', 16))
+MAX_ZOOM = 22
+
+# Items returned with each cluster
+REPRESENTATIVES = 3
+
+# Point sets kept per process (one per layer and filter combination)
+CLUSTER_CACHE_SIZE = int(os.environ.get('MAP_CLUSTER_CACHE_SIZE', 64))
+
+LAYERS = ('iftars', 'mosques')
+
+Bounds = Tuple[float, float, float, float]  # west, south, east, north
+Point = Tuple[float, float, Dict]  # latitude, longitude, item
+
+
+def mercator(lat: float, lng: float) -> Tuple[float, float]:
+    """Position on the world square, both coordinates in [0, 1]"""
+    sin = math.sin(math.radians(max(min(lat, 85.0511), -85.0511)))
+    x = lng / 360 + 0.5
+    y = 0.5 - 0.25 * math.log((1 + sin) / (1 - sin)) / math.pi
+    return x, y
+
+
+def parse_bounds(value: str) -> Bounds:
+    """'west,south,east,north' in degrees; raises ValueError when malformed"""
+    parts = [float(part) for part in value.split(',')]
+    if len(parts) != 4 or not all(math.isfinite(part) for part in parts):
+        raise ValueError("expected 'west,south,east,north'")
+    west, south, east, north = parts
+    if not (-90 <= south <= north <= 90) or not (-180 <= west <= 180 and -180 <= east <= 180):
+        raise ValueError("bounds out of range")
+    return west, south, east, north
+
+
+def _in_bounds(lat: float, lng: float, bounds: Bounds) -> bool:
+    west, south, east, north = bounds
+    if not south <= lat <= north:
+        return False
+    # A viewport across the antimeridian has west > east
+    return west <= lng <= east if west <= east else (lng >= west or lng <= east)
+
+
+class GridClusters:
+    """Clusters of a fixed point set, computed per zoom level on demand"""
+
+    def __init__(self, points: Sequence[Point], radius_px: int = CLUSTER_RADIUS_PX,
+                 max_cluster_zoom: int = MAX_CLUSTER_ZOOM):
+        self.points = [(lat, lng, item, mercator(lat, lng)) for lat, lng, item in points]
+        self.radius_px = radius_px
+        self.max_cluster_zoom = max_cluster_zoom
+        self._levels: Dict[int, List[Dict]] = {}
+        self._lock = threading.Lock()
+
+    def _cell(self, projected: Tuple[float, float], zoom: int) -> Tuple:
+        if zoom > self.max_cluster_zoom:
+            # Past the last clustering zoom only identical positions are merged
+            return projected
+        scale = TILE_SIZE * 2 ** zoom / self.radius_px
+        return math.floor(projected[0] * scale), math.floor(projected[1] * scale)
+
+    def _build(self, zoom: int) -> List[Dict]:
+        cells: Dict[Tuple, List] = {}
+        for lat, lng, item, projected in self.points:
+            cells.setdefault(self._cell(projected, zoom), []).append((lat, lng, item))
+
+        clusters = []
+        for members in cells.values():
+            lats = [lat for lat, _, _ in members]
+            lngs = [lng for _, lng, _ in members]
+            clusters.append({
+                'count': len(members),
+                'latitude': sum(lats) / len(lats),
+                'longitude': sum(lngs) / len(lngs),
+                'bounds': [min(lngs), min(lats), max(lngs), max(lats)],
+                'items': [item for _, _, item in members[:REPRESENTATIVES]],
+            })
+        return clusters
+
+    def clusters(self, zoom: int, bounds: Optional[Bounds] = None) -> List[Dict]:
+        """Clusters at the zoom level whose centre lies in ``bounds``, largest first"""
+        zoom = max(0, min(zoom, MAX_ZOOM))
+        level = self._levels.get(zoom)
+        if level is None:
+            level = self._build(zoom)
+            with self._lock:
+                self._levels[zoom] = level
+        if bounds is not None:
+            level = [cluster for cluster in level if _in_bounds(cluster['latitude'], cluster['longitude'], bounds)]
+        return sorted(level, key=lambda cluster: (-cluster['count'], cluster['latitude'], cluster['longitude']))
+
+
+def iftar_points(db, start_date: date, end_date: date, mosque_id: Optional[int],
+                 family_only: bool) -> List[Point]:
+    """Iftar occurrences of the period at their mosque's position"""
+    events = IfterCalendar(db).get_events_for_period(start_date, end_date, mosque_id=mosque_id,
+                                                     family_only=family_only)
+    return [
+        (event['latitude'], event['longitude'], {
+            'id': event['id'],
+            'mosque_id': event['mosque_id'],
+            'mosque_name': event['mosque_name'] or 'Unknown',
+            'date': event['date'].strftime('%Y-%m-%d'),
+            'start_time': event['start_time'].strftime('%H:%M'),
+            'location': event['location'],
+            'is_family_friendly': bool(event['is_family_friendly']),
+        })
+        for event in events
+        if event['latitude'] is not None and event['longitude'] is not None
+    ]
+
+
+def mosque_points(db) -> List[Point]:
+    """Active mosques with coordinates"""
+    from models import Mosque
+
+    mosques = db.session.query(Mosque).filter(
+        Mosque.is_active == True, Mosque.latitude.isnot(None), Mosque.longitude.isnot(None)
+    ).order_by(Mosque.name).all()
+    return [
+        (mosque.latitude, mosque.longitude, {'id': mosque.id, 'name': mosque.name, 'address': mosque.address})
+        for mosque in mosques
+    ]
+
+
+class MapClusters:
+    """GridClusters per layer and filter combination, valid for one map version"""
+
+    def __init__(self, db, max_entries: int = CLUSTER_CACHE_SIZE):
+        self.db = db
+        self.max_entries = max_entries
+        self._cache: 'OrderedDict[Tuple, Tuple[str, GridClusters]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def version(self, key: Tuple) -> str:
+        """Validator of the point set selected by ``key``"""
+        return map_etag(self.db, 'clusters', *key)
+
+    def get(self, key: Tuple, version: Optional[str] = None) -> GridClusters:
+        """Point set for (layer, start, end, mosque_id, family_only); mosques ignore the filters"""
+        version = version or self.version(key)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached and cached[0] == version:
+                self._cache.move_to_end(key)
+                return cached[1]
+
+        layer, start_date, end_date, mosque_id, family_only = key
+        if layer == 'mosques':
+            points = mosque_points(self.db)
+        else:
+            points = iftar_points(self.db, start_date, end_date, mosque_id, family_only)
+        clusters = GridClusters(points)
+        logger.debug(f"Built map clusters for {key}: {len(points)} points")
+
+        with self._lock:
+            self.builds += 1
+            self._cache[key] = (version, clusters)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return clusters
@@ -0,0 +1,207 @@
+"""
+Mawaqit mosque UUIDs for the raw SQLite app (app.py)
+
+Mawaqit prayer times are requested per mosque UUID, which used to be looked
+up with a /mosque/search request before every prayers request. The
+directory keeps the UUID per city and per mosque in the mawaqit_uuids
+table, so the fallback path makes a single request. Entries are filled on
+first use or in bulk (flask refresh-mawaqit-uuids) and re-resolved in the
+background once they are older than MAWAQIT_UUID_MAX_AGE. Admins can pin
+the UUID of one of our mosques; pinned entries are never re-resolved.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+UUID_TABLE = 'mawaqit_uuids'
+
+MAWAQIT_SEARCH_URL = "https://mawaqit.net/api/2.0/mosque/search"
+
+# Seconds after which a resolved (not pinned) UUID is re-resolved in the background
+MAX_AGE = int(os.environ.get('MAWAQIT_UUID_MAX_AGE', 30 * 86400))
+
+
+def city_key(city: str) -> str:
+    return f"city:{city.strip().lower()}"
+
+
+def mosque_key(mosque_id: int) -> str:
+    return f"mosque:{mosque_id}"
+
+
+def init_mawaqit_uuids(conn: sqlite3.Connection):
+    """Create the UUID lookup table"""
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {UUID_TABLE} (
+            lookup_key TEXT PRIMARY KEY,
+            uuid TEXT NOT NULL,
+            pinned BOOLEAN NOT NULL DEFAULT 0,
+            resolved_at REAL NOT NULL
+        )
+    ''')
+    conn.commit()
+
+
+class MawaqitDirectory:
+    """Lookup key ('city:gent', 'mosque:3') -> Mawaqit UUID.
+
+    ``connect`` returns a database connection (the app passes the pool's
+    ``connection``); without it the directory only remembers UUIDs in memory.
+    With it every lookup reads the table (a primary key lookup), so a pin
+    made through one worker applies to all of them at once.
+    """
+
+    def __init__(self, search_url: str, connect: Optional[Callable[[], sqlite3.Connection]] = None,
+                 max_age: int = MAX_AGE):
+        self.search_url = search_url
+        self.max_age = max_age
+        self._connect = connect
+        self._memory = {}  # key -> (uuid, pinned, resolved_at), without a database
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='mawaqit-refresh')
+
+    def _query(self, sql: str, params=()) -> List[sqlite3.Row]:
+        conn = self._connect()
+        try:
+            rows = conn.execute(sql, params).fetchall()
+            conn.commit()
+            return rows
+        finally:
+            conn.close()
+
+    def _entry(self, key: str):
+        if not self._connect:
+            with self._lock:
+                return self._memory.get(key)
+        rows = self._query(f'SELECT uuid, pinned, resolved_at FROM {UUID_TABLE} WHERE lookup_key = ?', (key,))
+        return (rows[0][0], bool(rows[0][1]), rows[0][2]) if rows else None
+
+    def lookup(self, key: str) -> Optional[str]:
+        """The known UUID, or None. A stale one is still returned while it is re-resolved."""
+        entry = self._entry(key)
+        if entry is None:
+            return None
+        uuid, pinned, resolved_at = entry
+        if not pinned and time.time() - resolved_at > self.max_age:
+            self._refresh_in_background(key)
+        return uuid
+
+    def remember(self, key: str, uuid: str, pinned: bool = False):
+        """Store a UUID; a resolved one never replaces a pinned one"""
+        entry = self._entry(key)
+        if entry and entry[1] and not pinned:
+            return
+        resolved_at = time.time()
+        if not self._connect:
+            with self._lock:
+                self._memory[key] = (uuid, pinned, resolved_at)
+        else:
+            self._query(f'''
+                INSERT INTO {UUID_TABLE} (lookup_key, uuid, pinned, resolved_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT (lookup_key) DO UPDATE SET
+                    uuid = excluded.uuid, pinned = excluded.pinned, resolved_at = excluded.resolved_at
+            ''', (key, uuid, int(pinned), resolved_at))
+
+    def forget(self, key: str):
+        """Drop a resolved UUID that Mawaqit no longer knows; pins stay"""
+        if not self._connect:
+            with self._lock:
+                entry = self._memory.get(key)
+                if entry and not entry[1]:
+                    del self._memory[key]
+        else:
+            self._query(f'DELETE FROM {UUID_TABLE} WHERE lookup_key = ? AND NOT pinned', (key,))
+
+    def pin(self, mosque_id: int, uuid: str):
+        self.remember(mosque_key(mosque_id), uuid, pinned=True)
+
+    def unpin(self, mosque_id: int):
+        key = mosque_key(mosque_id)
+        if not self._connect:
+            with self._lock:
+                self._memory.pop(key, None)
+        else:
+            self._query(f'DELETE FROM {UUID_TABLE} WHERE lookup_key = ?', (key,))
+
+    def search_query(self, key: str) -> Optional[str]:
+        """What to search Mawaqit for: the city, or the mosque's name"""
+        kind, _, value = key.partition(':')
+        if kind == 'city':
+            return value
+        if kind == 'mosque' and self._connect:
+            rows = self._query('SELECT name FROM mosques WHERE id = ?', (int(value),))
+            return rows[0][0] if rows else None
+        return None
+
+    def resolve(self, key: str) -> Optional[str]:
+        """Search Mawaqit now and remember the result"""
+        query = self.search_query(key)
+        if not query:
+            return None
+        try:
+            response = requests.get(
+                self.search_url,
+                params={'q': query, 'limit': 1},
+                headers={'Accept': 'application/json'},
+                timeout=10
+            )
+            mosques = response.json().get('mosques') if response.status_code == 200 else None
+        except (requests.RequestException, ValueError) as e:
+            logger.warning(f"Mawaqit search for {key} failed: {e}")
+            return None
+
+        uuid = mosques[0].get('uuid') if mosques else None
+        if uuid:
+            self.remember(key, uuid)
+        return uuid
+
+    def _refresh_in_background(self, key: str):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self.resolve(key)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        self._executor.submit(refresh)
+
+    def refresh_all(self, cities: Optional[List[str]] = None) -> Dict[str, int]:
+        """Resolve every active mosque and city now, except pinned mosques"""
+        keys = [city_key(city) for city in cities or []]
+        if self._connect:
+            keys += [row[0] for row in self._query(
+                f"SELECT lookup_key FROM {UUID_TABLE} WHERE lookup_key LIKE 'city:%'"
+            )]
+            keys += [mosque_key(row[0]) for row in self._query(f'''
+                SELECT m.id FROM mosques m
+                LEFT JOIN {UUID_TABLE} u ON u.lookup_key = 'mosque:' || m.id
+                WHERE m.is_active = 1 AND NOT COALESCE(u.pinned, 0)
+            ''')]
+
+        summary = {'resolved': 0, 'failed': 0}
+        for key in dict.fromkeys(keys):
+            summary['resolved' if self.resolve(key) else 'failed'] += 1
+        return summary
+
+    def entries(self) -> List[Dict]:
+        """Every stored UUID, for the admin overview"""
+        rows = self._query(f'SELECT lookup_key, uuid, pinned, resolved_at FROM {UUID_TABLE} ORDER BY lookup_key')
+        return [
+            {'key': row[0], 'uuid': row[1], 'pinned': bool(row[2]), 'resolved_at': row[3]}
+            for row in rows
+        ]
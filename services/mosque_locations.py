@@ -0,0 +1,141 @@
+"""
+Spatial index of mosque coordinates for the raw SQLite app (app.py)
+
+Active mosques with coordinates are bucketed in a latitude/longitude grid
+held in memory. A radius query only visits the cells overlapping the
+circle's bounding box and sorts the candidates by haversine distance. The
+index is rebuilt when the 'mosques' resource version (bumped by the
+triggers from services/resource_versions.py) differs from the one it was
+built from, so a change made through any worker is picked up on the next
+query.
+"""
+
+import logging
+import math
+import sqlite3
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from services.resource_versions import get_validators
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Grid cell size in degrees (about 5.5 km of latitude)
+CELL_DEGREES = 0.05
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def parse_point(value: str) -> Tuple[float, float]:
+    """'lat,lng' as floats; raises ValueError when malformed or out of range"""
+    parts = value.split(',')
+    if len(parts) != 2:
+        raise ValueError("expected 'lat,lng'")
+    lat, lng = float(parts[0]), float(parts[1])
+    validate_point(lat, lng)
+    return lat, lng
+
+
+def validate_point(lat: float, lng: float):
+    if not (math.isfinite(lat) and math.isfinite(lng)):
+        raise ValueError("coordinates must be finite")
+    if not -90 <= lat <= 90 or not -180 <= lng <= 180:
+        raise ValueError("latitude must be within [-90, 90] and longitude within [-180, 180]")
+
+
+class MosqueLocationIndex:
+    """Grid cell -> [(mosque id, lat, lng)] for active mosques.
+
+    ``connect`` returns a database connection (the app passes the pool's
+    ``connection``).
+    """
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], cell_degrees: float = CELL_DEGREES):
+        self._connect = connect
+        self.cell_degrees = cell_degrees
+        self._cells: Dict[Tuple[int, int], List[Tuple[int, float, float]]] = {}
+        self._version: Optional[str] = None
+        self._size = 0
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_degrees), math.floor(lng / self.cell_degrees)
+
+    def _wrap(self, col: int) -> int:
+        # Longitudes wrap around the antimeridian: -180 and 180 share a column
+        turn = round(360 / self.cell_degrees)
+        return (col + turn // 2) % turn - turn // 2
+
+    def _refresh(self):
+        """Rebuild when the mosques version moved since the last build"""
+        conn = self._connect()
+        try:
+            version, _ = get_validators(conn, 'mosques')
+            if version == self._version:
+                return
+            with self._lock:
+                if version == self._version:
+                    return
+                rows = conn.execute('''
+                    SELECT id, latitude, longitude FROM mosques
+                    WHERE is_active = 1 AND latitude IS NOT NULL AND longitude IS NOT NULL
+                ''').fetchall()
+                cells = defaultdict(list)
+                for mosque_id, lat, lng in rows:
+                    row, col = self._cell(lat, lng)
+                    cells[(row, self._wrap(col))].append((mosque_id, lat, lng))
+                self._cells = dict(cells)
+                self._size = len(rows)
+                self._version = version
+                self.rebuilds += 1
+                logger.info(f"Mosque location index rebuilt: {len(rows)} mosques in {len(cells)} cells")
+        finally:
+            conn.close()
+
+    def nearby(self, lat: float, lng: float, radius_km: float,
+               limit: Optional[int] = None) -> List[Tuple[int, float]]:
+        """(mosque id, distance in km) within the radius, nearest first"""
+        self._refresh()
+        cells = self._cells
+
+        # Bounding box of the circle, widened in longitude towards the poles
+        lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+        cos_lat = math.cos(math.radians(min(abs(lat) + lat_delta, 90.0)))
+        lng_delta = 180.0 if cos_lat < 1e-9 else min(180.0, lat_delta / cos_lat)
+        min_row, min_col = self._cell(max(lat - lat_delta, -90.0), lng - lng_delta)
+        max_row, max_col = self._cell(min(lat + lat_delta, 90.0), lng + lng_delta)
+
+        columns = range(min_col, max_col + 1)
+        if len(columns) >= round(360 / self.cell_degrees):
+            columns = range(round(360 / self.cell_degrees))
+        columns = {self._wrap(col) for col in columns}
+
+        rows = range(min_row, max_row + 1)
+        if len(rows) * len(columns) > len(cells):
+            # A wide radius touches more cells than are occupied: visit those instead
+            candidates = (point for points in cells.values() for point in points)
+        else:
+            candidates = (point for row in rows for col in columns for point in cells.get((row, col), ()))
+
+        results = []
+        for mosque_id, mosque_lat, mosque_lng in candidates:
+            distance = haversine_km(lat, lng, mosque_lat, mosque_lng)
+            if distance <= radius_km:
+                results.append((mosque_id, distance))
+
+        results.sort(key=lambda item: (item[1], item[0]))
+        return results[:limit] if limit is not None else results
+
+    def get_stats(self) -> Dict:
+        return {'mosques': self._size, 'cells': len(self._cells), 'rebuilds': self.rebuilds}
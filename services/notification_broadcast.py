@@ -0,0 +1,178 @@
+"""
+Bulk notification broadcasts for the raw SQLite app (app.py)
+
+A broadcast stores the notification once, together with an audience, and is
+delivered by set-based ``INSERT ... SELECT`` statements that expand the
+audience from the users table in batches of user ids. Each batch commits
+together with the broadcast's progress (the last user id delivered), so a
+run that stops half-way resumes where it left off without duplicates.
+"""
+
+import logging
+import sqlite3
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_TABLE = 'notification_broadcasts'
+
+# Audience -> (condition on users ``u``, whether it takes a value). A mosque's
+# audience is the users who have it as their home mosque.
+AUDIENCES = {
+    'all': ('1 = 1', False),
+    'mosque': ('u.mosque_id = ?', True),
+    'role': ('u.role = ?', True),
+}
+
+# Columns copied from the broadcast into every notification
+NOTIFICATION_COLUMNS = (
+    'mosque_id', 'title', 'message', 'notification_type',
+    'priority', 'action_url', 'metadata', 'expires_at',
+)
+
+
+def init_broadcast_tables(conn: sqlite3.Connection):
+    """Create the broadcast table"""
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {BROADCAST_TABLE} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            audience TEXT NOT NULL,
+            audience_value TEXT,
+            mosque_id INTEGER,
+            title TEXT NOT NULL,
+            message TEXT NOT NULL,
+            notification_type TEXT NOT NULL,
+            priority TEXT DEFAULT 'normal',
+            action_url TEXT,
+            metadata TEXT,
+            expires_at DATETIME,
+            status TEXT NOT NULL DEFAULT 'queued',
+            total_recipients INTEGER,
+            delivered INTEGER NOT NULL DEFAULT 0,
+            last_user_id INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            created_by INTEGER,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            started_at DATETIME,
+            completed_at DATETIME
+        )
+    ''')
+    conn.execute(
+        f'CREATE INDEX IF NOT EXISTS idx_{BROADCAST_TABLE}_status ON {BROADCAST_TABLE} (status)'
+    )
+    conn.commit()
+
+
+def _audience_filter(audience: str, audience_value: Optional[str]) -> Tuple[str, list]:
+    condition, takes_value = AUDIENCES[audience]
+    return f'u.is_active = 1 AND {condition}', [audience_value] if takes_value else []
+
+
+def create_broadcast(conn: sqlite3.Connection, audience: str, audience_value: Optional[str],
+                     notification: Dict[str, Any], created_by: Optional[int] = None) -> int:
+    """Queue a broadcast; raises ValueError for an unknown or incomplete audience"""
+    if audience not in AUDIENCES:
+        raise ValueError(f"Unknown audience: {audience}")
+    if AUDIENCES[audience][1] and audience_value in (None, ''):
+        raise ValueError(f"Audience '{audience}' requires a value")
+
+    condition, params = _audience_filter(audience, audience_value)
+    total = conn.execute(f'SELECT COUNT(*) FROM users u WHERE {condition}', params).fetchone()[0]
+    cursor = conn.execute(f'''
+        INSERT INTO {BROADCAST_TABLE} (
+            audience, audience_value, {', '.join(NOTIFICATION_COLUMNS)}, total_recipients, created_by
+        ) VALUES (?, ?, {', '.join('?' for _ in NOTIFICATION_COLUMNS)}, ?, ?)
+    ''', [audience, audience_value] + [notification.get(column) for column in NOTIFICATION_COLUMNS]
+         + [total, created_by])
+    conn.commit()
+    return cursor.lastrowid
+
+
+def run_broadcast(conn: sqlite3.Connection, broadcast_id: int, batch_size: int = 5000,
+                  on_batch: Optional[Callable[[List[int]], Any]] = None) -> int:
+    """Deliver a queued or interrupted broadcast; returns the rows inserted by this run.
+
+    ``on_batch`` is called with the recipients' user ids after each batch commits.
+    """
+    broadcast = conn.execute(f'SELECT * FROM {BROADCAST_TABLE} WHERE id = ?', (broadcast_id,)).fetchone()
+    if broadcast is None or broadcast['status'] == 'completed':
+        return 0
+
+    conn.execute(f'''
+        UPDATE {BROADCAST_TABLE} SET status = 'running', started_at = COALESCE(started_at, CURRENT_TIMESTAMP)
+        WHERE id = ?
+    ''', (broadcast_id,))
+    conn.commit()
+
+    condition, params = _audience_filter(broadcast['audience'], broadcast['audience_value'])
+    columns = ', '.join(NOTIFICATION_COLUMNS)
+    delivered = 0
+    try:
+        while True:
+            # BEGIN IMMEDIATE so the progress read and the batch it covers
+            # cannot interleave with another run of the same broadcast
+            conn.execute('BEGIN IMMEDIATE')
+            last_user_id = conn.execute(
+                f'SELECT last_user_id FROM {BROADCAST_TABLE} WHERE id = ?', (broadcast_id,)
+            ).fetchone()[0]
+            upper = conn.execute(f'''
+                SELECT MAX(id) FROM (
+                    SELECT u.id FROM users u WHERE {condition} AND u.id > ? ORDER BY u.id LIMIT ?
+                )
+            ''', params + [last_user_id, batch_size]).fetchone()[0]
+            if upper is None:
+                conn.execute(f'''
+                    UPDATE {BROADCAST_TABLE} SET status = 'completed', completed_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                ''', (broadcast_id,))
+                conn.commit()
+                break
+
+            recipients = [row[0] for row in conn.execute(f'''
+                INSERT INTO notifications (user_id, {columns})
+                SELECT u.id, {', '.join(f'b.{column}' for column in NOTIFICATION_COLUMNS)}
+                FROM users u, {BROADCAST_TABLE} b
+                WHERE b.id = ? AND {condition} AND u.id > ? AND u.id <= ?
+                ORDER BY u.id
+                RETURNING user_id
+            ''', [broadcast_id] + params + [last_user_id, upper]).fetchall()]
+            conn.execute(f'''
+                UPDATE {BROADCAST_TABLE} SET last_user_id = ?, delivered = delivered + ? WHERE id = ?
+            ''', (upper, len(recipients), broadcast_id))
+            conn.commit()
+            delivered += len(recipients)
+            if on_batch is not None:
+                on_batch(recipients)
+    except sqlite3.Error as e:
+        conn.rollback()
+        conn.execute(
+            f"UPDATE {BROADCAST_TABLE} SET status = 'failed', error = ? WHERE id = ?", (str(e), broadcast_id)
+        )
+        conn.commit()
+        logger.error(f"Broadcast {broadcast_id} failed after {delivered} notifications: {e}")
+        raise
+
+    logger.info(f"Broadcast {broadcast_id} delivered {delivered} notifications")
+    return delivered
+
+
+def pending_broadcasts(conn: sqlite3.Connection):
+    """Ids of broadcasts that were queued or interrupted"""
+    return [
+        row[0] for row in conn.execute(
+            f"SELECT id FROM {BROADCAST_TABLE} WHERE status IN ('queued', 'running', 'failed') ORDER BY id"
+        )
+    ]
+
+
+def get_broadcast(conn: sqlite3.Connection, broadcast_id: int) -> Optional[Dict[str, Any]]:
+    """Broadcast row with its progress, or None"""
+    row = conn.execute(f'SELECT * FROM {BROADCAST_TABLE} WHERE id = ?', (broadcast_id,)).fetchone()
+    if row is None:
+        return None
+    broadcast = dict(row)
+    total = broadcast['total_recipients'] or 0
+    broadcast['progress'] = 1.0 if broadcast['status'] == 'completed' else (
+        round(broadcast['delivered'] / total, 4) if total else 0.0
+    )
+    return broadcast
@@ -0,0 +1,108 @@
+"""
+Materialized unread notification counts for the raw SQLite app (app.py)
+
+One row per user holds the unread count and a version that changes with
+every write affecting it. Triggers on the notifications table keep the row
+in sync inside the writing transaction, so single inserts, bulk inserts and
+mark-as-read updates can never leave it stale, and reading the count is a
+primary-key lookup instead of a COUNT(*) over the user's notifications.
+"""
+
+import logging
+import sqlite3
+from typing import Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+COUNTER_TABLE = 'notification_counters'
+
+
+def _adjust_sql(user: str, delta: str) -> str:
+    """Upsert adding ``delta`` to a user's unread count and bumping its version"""
+    return f'''
+        INSERT INTO {COUNTER_TABLE} (user_id, unread_count, version)
+        SELECT {user}, {delta}, 1 WHERE {user} IS NOT NULL
+        ON CONFLICT (user_id) DO UPDATE SET
+            unread_count = unread_count + excluded.unread_count,
+            version = version + 1;
+    '''
+
+
+# 1 when a notification row counts as unread
+_UNREAD = "(COALESCE({row}.is_read, 0) = 0)"
+
+
+def _schema_statements():
+    new_unread = _UNREAD.format(row='NEW')
+    old_unread = _UNREAD.format(row='OLD')
+
+    yield f'''
+        CREATE TABLE IF NOT EXISTS {COUNTER_TABLE} (
+            user_id INTEGER PRIMARY KEY,
+            unread_count INTEGER NOT NULL DEFAULT 0,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    '''
+    yield f'''
+        CREATE TRIGGER IF NOT EXISTS {COUNTER_TABLE}_ai AFTER INSERT ON notifications
+        WHEN NEW.user_id IS NOT NULL BEGIN
+            {_adjust_sql('NEW.user_id', new_unread)}
+        END
+    '''
+    # Only fires when the row moves between users or between read/unread
+    yield f'''
+        CREATE TRIGGER IF NOT EXISTS {COUNTER_TABLE}_au AFTER UPDATE OF is_read, user_id ON notifications
+        WHEN OLD.user_id IS NOT NEW.user_id OR {old_unread} != {new_unread} BEGIN
+            {_adjust_sql('OLD.user_id', f'-{old_unread}')}
+            {_adjust_sql('NEW.user_id', new_unread)}
+        END
+    '''
+    yield f'''
+        CREATE TRIGGER IF NOT EXISTS {COUNTER_TABLE}_ad AFTER DELETE ON notifications
+        WHEN OLD.user_id IS NOT NULL BEGIN
+            {_adjust_sql('OLD.user_id', f'-{old_unread}')}
+        END
+    '''
+
+
+def init_notification_counters(conn: sqlite3.Connection):
+    """Create the counter table and triggers; backfill when the table is new"""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (COUNTER_TABLE,)
+    ).fetchone()
+    for statement in _schema_statements():
+        conn.execute(statement)
+    if not exists:
+        _populate(conn)
+    conn.commit()
+
+
+def _populate(conn: sqlite3.Connection) -> int:
+    # Versions only ever grow, so an ETag handed out before a rebuild
+    # cannot match a recomputed count
+    conn.execute(f'UPDATE {COUNTER_TABLE} SET unread_count = 0, version = version + 1')
+    cursor = conn.execute(f'''
+        INSERT INTO {COUNTER_TABLE} (user_id, unread_count, version)
+        SELECT user_id, SUM({_UNREAD.format(row='notifications')}), 1
+        FROM notifications
+        WHERE user_id IS NOT NULL
+        GROUP BY user_id
+        ON CONFLICT (user_id) DO UPDATE SET unread_count = excluded.unread_count
+    ''')
+    return cursor.rowcount
+
+
+def rebuild_notification_counters(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Recompute every counter from the notifications table"""
+    users = _populate(conn)
+    conn.commit()
+    logger.info(f"Notification counters rebuilt for {users} users")
+    return {'users': users}
+
+
+def get_unread_count(conn: sqlite3.Connection, user_id: int) -> Tuple[int, int]:
+    """(unread count, version) for a user; (0, 0) if they never had a notification"""
+    row = conn.execute(
+        f'SELECT unread_count, version FROM {COUNTER_TABLE} WHERE user_id = ?', (user_id,)
+    ).fetchone()
+    return (row[0], row[1]) if row else (0, 0)
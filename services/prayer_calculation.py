@@ -0,0 +1,287 @@
+"""
+Offline prayer time calculation
+
+Solar position follows the PrayTimes.org algorithm (the one behind the
+Aladhan API): declination and equation of time per day, then the hour angle
+at which the sun reaches each prayer's altitude. Parameters mirror the
+Aladhan request the prayer services send (method 13 = Diyanet, school 1 =
+Hanafi asr, Europe/Brussels), so the results can replace those calls when the
+APIs are slow or down. No network access is needed.
+"""
+
+import json
+import math
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python < 3.9
+    ZoneInfo = None
+
+DEFAULT_TIMEZONE = 'Europe/Brussels'
+
+# Gent, as used by the prayer services
+DEFAULT_LATITUDE = 51.0543422
+DEFAULT_LONGITUDE = 3.7174243
+
+# Calculation methods keyed by their Aladhan id. ``isha`` is an angle, or
+# minutes after maghrib when ``isha_minutes`` is set. ``offsets`` are minutes
+# added to the computed times; for Diyanet these are its temkin (precaution)
+# minutes as applied in the Diyanet calendars.
+METHODS = {
+    2: {'name': 'ISNA', 'fajr': 15.0, 'isha': 15.0, 'offsets': {}},
+    3: {'name': 'Muslim World League', 'fajr': 18.0, 'isha': 17.0, 'offsets': {}},
+    12: {'name': 'Union des Organisations Islamiques de France', 'fajr': 12.0, 'isha': 12.0, 'offsets': {}},
+    13: {
+        'name': 'Diyanet İşleri Başkanlığı',
+        'fajr': 18.0,
+        'isha': 17.0,
+        'offsets': {'sunrise': -7, 'dhuhr': 5, 'asr': 4, 'maghrib': 7},
+    },
+}
+DIYANET = 13
+
+# Aladhan ``school``: shadow length factor for asr
+ASR_FACTORS = {0: 1, 1: 2}
+SHAFI, HANAFI = 0, 1
+
+# Aladhan ``latitudeAdjustmentMethod``: how fajr and isha are bounded when
+# the sun does not get low enough (Belgium from May to August)
+MIDDLE_OF_THE_NIGHT, ONE_SEVENTH, ANGLE_BASED = 1, 2, 3
+HIGH_LATITUDE_RULES = (MIDDLE_OF_THE_NIGHT, ONE_SEVENTH, ANGLE_BASED)
+
+PRAYERS = ('fajr', 'sunrise', 'dhuhr', 'asr', 'maghrib', 'isha')
+
+# Sun altitude at sunrise and sunset: refraction plus the solar radius
+SUNRISE_ANGLE = 0.833
+
+# First guesses (local hours) at which the sun position is evaluated
+_INITIAL_GUESS = {'fajr': 5, 'sunrise': 6, 'dhuhr': 12, 'asr': 13, 'maghrib': 18, 'isha': 18}
+
+
+def _sin(degrees: float) -> float:
+    return math.sin(math.radians(degrees))
+
+
+def _cos(degrees: float) -> float:
+    return math.cos(math.radians(degrees))
+
+
+def _tan(degrees: float) -> float:
+    return math.tan(math.radians(degrees))
+
+
+def _fix(value: float, modulus: float) -> float:
+    value = value - modulus * math.floor(value / modulus)
+    return value + modulus if value < 0 else value
+
+
+def _julian_day(day: date) -> float:
+    year, month = day.year, day.month
+    if month <= 2:
+        year -= 1
+        month += 12
+    a = year // 100
+    b = 2 - a + a // 4
+    return math.floor(365.25 * (year + 4716)) + math.floor(30.6001 * (month + 1)) + day.day + b - 1524.5
+
+
+def _sun_position(jd: float) -> Tuple[float, float]:
+    """(declination in degrees, equation of time in hours)"""
+    d = jd - 2451545.0
+    g = _fix(357.529 + 0.98560028 * d, 360)
+    q = _fix(280.459 + 0.98564736 * d, 360)
+    ecliptic_longitude = _fix(q + 1.915 * _sin(g) + 0.020 * _sin(2 * g), 360)
+    obliquity = 23.439 - 0.00000036 * d
+
+    right_ascension = math.degrees(math.atan2(
+        _cos(obliquity) * _sin(ecliptic_longitude), _cos(ecliptic_longitude)
+    )) / 15
+    equation_of_time = q / 15 - _fix(right_ascension, 24)
+    declination = math.degrees(math.asin(_sin(obliquity) * _sin(ecliptic_longitude)))
+    return declination, equation_of_time
+
+
+class _Day:
+    """Sun-position helpers for one date and coordinate (times in UT-ish hours)"""
+
+    def __init__(self, day: date, latitude: float, longitude: float):
+        self.latitude = latitude
+        self.jd = _julian_day(day) - longitude / (15 * 24)
+
+    def noon(self, hours: float) -> float:
+        _, equation_of_time = _sun_position(self.jd + hours / 24)
+        return _fix(12 - equation_of_time, 24)
+
+    def angle_time(self, angle: float, hours: float, before_noon: bool) -> Optional[float]:
+        """When the sun is ``angle`` degrees below the horizon; None if it never is"""
+        declination, _ = _sun_position(self.jd + hours / 24)
+        cosine = (-_sin(angle) - _sin(declination) * _sin(self.latitude)) / (
+            _cos(declination) * _cos(self.latitude)
+        )
+        if not -1 <= cosine <= 1:
+            return None
+        offset = math.degrees(math.acos(cosine)) / 15
+        noon = self.noon(hours)
+        return noon - offset if before_noon else noon + offset
+
+    def asr_time(self, factor: int, hours: float) -> Optional[float]:
+        declination, _ = _sun_position(self.jd + hours / 24)
+        angle = -math.degrees(math.atan(1 / (factor + _tan(abs(self.latitude - declination)))))
+        return self.angle_time(angle, hours, before_noon=False)
+
+
+def _utc_offset(day: date, timezone: str) -> float:
+    """UTC offset in hours at local noon (after any DST switch of that day)"""
+    if ZoneInfo is None:
+        raise RuntimeError('Prayer time calculation needs zoneinfo (Python 3.9+)')
+    offset = datetime(day.year, day.month, day.day, 12, tzinfo=ZoneInfo(timezone)).utcoffset()
+    return offset.total_seconds() / 3600
+
+
+def _night_portion(rule: int, angle: float, night: float) -> float:
+    if rule == ANGLE_BASED:
+        return angle / 60 * night
+    if rule == ONE_SEVENTH:
+        return night / 7
+    return night / 2
+
+
+def compute_day_hours(day: date, latitude: float, longitude: float, method: int = DIYANET,
+                      school: int = HANAFI, high_latitude_rule: int = ANGLE_BASED,
+                      timezone: str = DEFAULT_TIMEZONE) -> Dict[str, float]:
+    """Prayer times of one day as fractional local hours, before offsets and rounding"""
+    params = METHODS[method]
+    factor = ASR_FACTORS[school]
+    sun = _Day(day, latitude, longitude)
+
+    # One refinement: evaluate the sun where a first guess puts each event
+    guess = _INITIAL_GUESS
+    times = {
+        'fajr': sun.angle_time(params['fajr'], guess['fajr'], before_noon=True),
+        'sunrise': sun.angle_time(SUNRISE_ANGLE, guess['sunrise'], before_noon=True),
+        'dhuhr': sun.noon(guess['dhuhr']),
+        'asr': sun.asr_time(factor, guess['asr']),
+        'maghrib': sun.angle_time(SUNRISE_ANGLE, guess['maghrib'], before_noon=False),
+    }
+    if params.get('isha_minutes'):
+        times['isha'] = times['maghrib'] + params['isha_minutes'] / 60
+    else:
+        times['isha'] = sun.angle_time(params['isha'], guess['isha'], before_noon=False)
+
+    shift = _utc_offset(day, timezone) - longitude / 15
+    for prayer, value in times.items():
+        if value is not None:
+            times[prayer] = value + shift
+
+    # Bound fajr and isha by a portion of the night when twilight lasts too long
+    night = 24 - (times['maghrib'] - times['sunrise'])
+    fajr_limit = _night_portion(high_latitude_rule, params['fajr'], night)
+    if times['fajr'] is None or times['sunrise'] - times['fajr'] > fajr_limit:
+        times['fajr'] = times['sunrise'] - fajr_limit
+    if not params.get('isha_minutes'):
+        isha_limit = _night_portion(high_latitude_rule, params['isha'], night)
+        if times['isha'] is None or times['isha'] - times['maghrib'] > isha_limit:
+            times['isha'] = times['maghrib'] + isha_limit
+
+    return times
+
+
+def _format(hours: float) -> str:
+    minutes = int(round(_fix(hours, 24) * 60)) % (24 * 60)
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def calculate_day(day: date, latitude: float = DEFAULT_LATITUDE, longitude: float = DEFAULT_LONGITUDE,
+                  method: int = DIYANET, school: int = HANAFI, high_latitude_rule: int = ANGLE_BASED,
+                  timezone: str = DEFAULT_TIMEZONE) -> Dict[str, str]:
+    """Prayer times ('HH:MM', local time) for one day"""
+    if method not in METHODS:
+        raise ValueError(f"Unsupported calculation method: {method}")
+    if school not in ASR_FACTORS:
+        raise ValueError(f"Unsupported school: {school}")
+    if high_latitude_rule not in HIGH_LATITUDE_RULES:
+        raise ValueError(f"Unsupported high latitude rule: {high_latitude_rule}")
+
+    hours = compute_day_hours(day, latitude, longitude, method, school, high_latitude_rule, timezone)
+    offsets = METHODS[method]['offsets']
+    return {prayer: _format(hours[prayer] + offsets.get(prayer, 0) / 60) for prayer in PRAYERS}
+
+
+def calculate_range(start_date: date, end_date: date, latitude: float = DEFAULT_LATITUDE,
+                    longitude: float = DEFAULT_LONGITUDE, **params) -> Dict[date, Dict[str, str]]:
+    """Prayer times for every day from ``start_date`` to ``end_date`` inclusive"""
+    times = {}
+    day = start_date
+    while day <= end_date:
+        times[day] = calculate_day(day, latitude, longitude, **params)
+        day += timedelta(days=1)
+    return times
+
+
+def calculate_year(year: int, latitude: float = DEFAULT_LATITUDE, longitude: float = DEFAULT_LONGITUDE,
+                   **params) -> Dict[date, Dict[str, str]]:
+    """Prayer times for every day of ``year``"""
+    return calculate_range(date(year, 1, 1), date(year, 12, 31), latitude, longitude, **params)
+
+
+def _minutes(value: str) -> int:
+    hours, minutes = value.split(':')[:2]
+    return int(hours) * 60 + int(minutes)
+
+
+def compare_with_reference(computed: Dict[date, Dict[str, str]], reference: Dict[date, Dict[str, str]],
+                           tolerance_minutes: int = 2) -> List[str]:
+    """Differences larger than ``tolerance_minutes`` between computed and reference times"""
+    differences = []
+    for day, expected in sorted(reference.items()):
+        actual = computed.get(day)
+        if actual is None:
+            differences.append(f"{day}: not computed")
+            continue
+        for prayer, expected_time in expected.items():
+            if not expected_time or prayer not in actual:
+                continue
+            delta = _minutes(actual[prayer]) - _minutes(expected_time)
+            # Times around midnight wrap
+            delta = (delta + 720) % 1440 - 720
+            if abs(delta) > tolerance_minutes:
+                differences.append(f"{day} {prayer}: {actual[prayer]} vs reference {expected_time} ({delta:+d} min)")
+    return differences
+
+
+def load_reference(path: str) -> Tuple[Dict[str, object], Dict[date, Dict[str, str]]]:
+    """Read a reference table: {"location": {...}, "times": {"YYYY-MM-DD": {prayer: "HH:MM"}}}"""
+    with open(path, encoding='utf-8') as handle:
+        data = json.load(handle)
+    times = {
+        datetime.strptime(day, '%Y-%m-%d').date(): prayers
+        for day, prayers in data['times'].items()
+    }
+    return data.get('location', {}), times
+
+
+
+def _islamic_to_ordinal(year: int, month: int, day: int) -> int:
+    """Proleptic Gregorian ordinal of a date in the tabular Islamic calendar"""
+    julian_day = (day + math.ceil(29.5 * (month - 1)) + (year - 1) * 354
+                  + (3 + 11 * year) // 30 + 1948439.5 - 1)
+    return int(julian_day + 0.5) - 1721425
+
+
+def ramadan_window(year: int, margin_days: int = 1) -> Tuple[date, date]:
+    """First and last day of the (first) Ramadan that starts in Gregorian ``year``.
+
+    Uses the tabular Islamic calendar, which can be a day off from the
+    announced (moon sighting) dates; ``margin_days`` is added on both sides.
+    The end includes the first of Shawwal (Eid).
+    """
+    # The Islamic year is about 11 days shorter, so at most two candidates
+    hijri_year = int((year - 622) * 33 / 32)
+    for candidate in (hijri_year - 1, hijri_year, hijri_year + 1, hijri_year + 2):
+        start = date.fromordinal(_islamic_to_ordinal(candidate, 9, 1))
+        if start.year == year:
+            end = date.fromordinal(_islamic_to_ordinal(candidate, 10, 1))
+            return start - timedelta(days=margin_days), end + timedelta(days=margin_days)
+    raise ValueError(f"No Ramadan starts in {year}")
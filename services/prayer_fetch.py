@@ -0,0 +1,317 @@
+"""
+Concurrent prayer time fetching for PrayerTimeService (services/prayer_times.py)
+
+All Aladhan month calendars a range needs are requested at once with
+aiohttp. When Aladhan has not answered within a latency budget, Mawaqit is
+asked as well (a hedged request) and the first usable answer wins. Each
+source has a circuit breaker, so a source that keeps failing is skipped
+for a while instead of costing every request its timeout.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+
+from services.mawaqit_directory import MawaqitDirectory, city_key, mosque_key
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for the primary source before also asking the secondary,
+# and for the whole fetch
+HEDGE_AFTER = float(os.environ.get('PRAYER_HEDGE_AFTER', 1.5))
+FETCH_TIMEOUT = float(os.environ.get('PRAYER_FETCH_TIMEOUT', 8))
+
+# Consecutive failures that open a source's circuit, and seconds before it
+# is tried again
+BREAKER_THRESHOLD = int(os.environ.get('PRAYER_BREAKER_THRESHOLD', 3))
+BREAKER_RESET = float(os.environ.get('PRAYER_BREAKER_RESET', 60))
+
+# Same request as before: Gent, Diyanet method, Hanafi asr
+ALADHAN_PARAMS = {
+    'latitude': 51.0543422,
+    'longitude': 3.7174243,
+    'method': 13,  # Diyanet İşleri Başkanlığı
+    'adjustment': 0,
+    'school': 1,  # Hanafi
+    'timezonestring': 'Europe/Brussels'
+}
+
+PRAYERS = ('fajr', 'sunrise', 'dhuhr', 'asr', 'maghrib', 'isha')
+
+
+class CircuitBreaker:
+    """Closed until ``threshold`` consecutive failures, then open for
+    ``reset_timeout`` seconds; after that one trial request is let through
+    (half open) and its outcome closes or reopens the circuit.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, name: str, threshold: int = BREAKER_THRESHOLD, reset_timeout: float = BREAKER_RESET):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now"""
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.threshold or self._opened_at is not None:
+                if self._opened_at is None:
+                    logger.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+                self._opened_at = time.monotonic()
+
+    def release(self):
+        """Give up a trial request without an outcome (it was cancelled)"""
+        with self._lock:
+            self._trial_running = False
+
+
+def validate_times(times: Dict[str, str]) -> Dict[str, Optional[str]]:
+    """'HH:MM' per prayer; timezone suffixes are dropped and invalid values become None"""
+    cleaned_times = {}
+    for prayer, time_str in times.items():
+        try:
+            # Remove timezone indicators if present
+            time_str = time_str.split(' ')[0]
+            # Validate time format
+            datetime.strptime(time_str, '%H:%M')
+            cleaned_times[prayer] = time_str
+        except Exception:
+            logger.error(f"Invalid time format for {prayer}: {time_str}")
+            cleaned_times[prayer] = None
+
+    return cleaned_times
+
+
+def months_between(start_date: date, end_date: date) -> List[Tuple[int, int]]:
+    """(year, month) of every month touched by the range"""
+    months = []
+    year, month = start_date.year, start_date.month
+    while (year, month) <= (end_date.year, end_date.month):
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+class HedgedFetcher:
+    """Fetches a date range from Aladhan, hedged with Mawaqit"""
+
+    def __init__(self, aladhan_url: str, mawaqit_url: str, hedge_after: float = HEDGE_AFTER,
+                 timeout: float = FETCH_TIMEOUT, directory: Optional[MawaqitDirectory] = None):
+        self.aladhan_url = aladhan_url
+        self.mawaqit_url = mawaqit_url
+        # Mosque UUIDs, so a Mawaqit fetch is a single request once known
+        self.directory = directory if directory is not None else MawaqitDirectory(f"{mawaqit_url}/mosque/search")
+        self.hedge_after = hedge_after
+        self.timeout = timeout
+        self.breakers = {
+            'aladhan': CircuitBreaker('aladhan'),
+            'mawaqit': CircuitBreaker('mawaqit'),
+        }
+
+    def fetch_ranges(self, source: str, ranges: List[Tuple[date, date]], city: str = "Gent",
+                     mosque_id: Optional[int] = None) -> List[Optional[Dict[date, Dict]]]:
+        """Blocking entry point for the request thread: every range fetched concurrently"""
+        async def fetch_all():
+            return await asyncio.gather(*(
+                self.fetch(source, start, end, city, mosque_id) for start, end in ranges
+            ))
+        return asyncio.run(fetch_all())
+
+    async def fetch(self, source: str, start_date: date, end_date: date, city: str = "Gent",
+                    mosque_id: Optional[int] = None) -> Optional[Dict[date, Dict]]:
+        """Prayer times per day, or None when no source answered in time"""
+        # 'diyanet' is served by Aladhan first; anything else only by Mawaqit
+        order = ['aladhan', 'mawaqit'] if source == 'diyanet' else ['mawaqit']
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(timeout=timeout, headers={'Accept': 'application/json'}) as session:
+            fetchers = {
+                'aladhan': lambda: self._aladhan(session, start_date, end_date),
+                'mawaqit': lambda: self._mawaqit(session, start_date, end_date, city, mosque_id),
+            }
+            try:
+                return await asyncio.wait_for(self._race(order, fetchers), self.timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"No prayer times for {start_date} - {end_date} within {self.timeout}s")
+                return None
+
+    async def _race(self, order: List[str], fetchers) -> Optional[Dict[date, Dict]]:
+        sources = list(order)
+        pending = {}
+        try:
+            while True:
+                name = self._next_source(sources)
+                if name:
+                    pending[asyncio.ensure_future(self._guarded(name, fetchers[name]()))] = name
+                if not pending:
+                    return None
+
+                # Hedge: what is running gets the latency budget before the
+                # next source is started as well
+                budget = self.hedge_after if sources else None
+                done, _ = await asyncio.wait(pending, timeout=budget, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    pending.pop(task)
+                    result = task.result()
+                    if result:
+                        return result
+        except asyncio.CancelledError:
+            # Out of time: whatever is still running was too slow
+            for task, name in pending.items():
+                task.cancel()
+                self.breakers[name].record_failure()
+            pending.clear()
+            raise
+        finally:
+            # Lost the race, which says nothing about the source's health
+            for task, name in pending.items():
+                task.cancel()
+                self.breakers[name].release()
+
+    def _next_source(self, sources: List[str]) -> Optional[str]:
+        # Breakers are asked only when a source is about to be used, so a
+        # half-open trial is not claimed by a request that never sends it
+        while sources:
+            name = sources.pop(0)
+            if self.breakers[name].allow():
+                return name
+            logger.info(f"Skipping {name}: circuit {self.breakers[name].state}")
+        return None
+
+    async def _guarded(self, name: str, request) -> Optional[Dict[date, Dict]]:
+        breaker = self.breakers[name]
+        try:
+            result = await request
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error with {name} API: {e}")
+            result = None
+        if result:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+        return result
+
+    async def _aladhan(self, session: aiohttp.ClientSession, start_date: date,
+                       end_date: date) -> Optional[Dict[date, Dict]]:
+        months = await asyncio.gather(*(
+            self._aladhan_month(session, year, month) for year, month in months_between(start_date, end_date)
+        ))
+        # A range is only usable when every month arrived
+        if not all(months):
+            return None
+
+        prayer_times = {}
+        for days in months:
+            for day_date, times in days.items():
+                if start_date <= day_date <= end_date:
+                    prayer_times[day_date] = times
+        return prayer_times or None
+
+    async def _aladhan_month(self, session: aiohttp.ClientSession, year: int,
+                             month: int) -> Optional[Dict[date, Dict]]:
+        params = dict(ALADHAN_PARAMS, month=month, year=year)
+        async with session.get(self.aladhan_url, params=params) as response:
+            if response.status != 200:
+                logger.warning(f"Aladhan returned {response.status} for {year}-{month:02d}")
+                return None
+            data = await response.json(content_type=None)
+
+        days = {}
+        for day_data in data.get('data', []):
+            try:
+                day_date = datetime.strptime(day_data['date']['gregorian']['date'], '%d-%m-%Y').date()
+                timings = day_data['timings']
+                days[day_date] = validate_times({prayer: timings[prayer.capitalize()] for prayer in PRAYERS})
+            except Exception as e:
+                logger.error(f"Error processing day data: {e}")
+        return days
+
+    async def _mawaqit_uuid(self, session: aiohttp.ClientSession, key: str, city: str) -> Optional[str]:
+        # The directory reads SQLite, which would block the other fetches on the loop
+        mosque_uuid = await asyncio.to_thread(self.directory.lookup, key)
+        if mosque_uuid:
+            return mosque_uuid
+
+        # First use: search once and remember the answer
+        query = await asyncio.to_thread(self.directory.search_query, key) or city
+        async with session.get(f"{self.mawaqit_url}/mosque/search", params={'q': query, 'limit': 1}) as response:
+            if response.status != 200:
+                return None
+            mosques = (await response.json(content_type=None)).get('mosques')
+        mosque_uuid = mosques[0].get('uuid') if mosques else None
+        if mosque_uuid:
+            await asyncio.to_thread(self.directory.remember, key, mosque_uuid)
+        return mosque_uuid
+
+    async def _mawaqit(self, session: aiohttp.ClientSession, start_date: date, end_date: date,
+                       city: str, mosque_id: Optional[int] = None) -> Optional[Dict[date, Dict]]:
+        key = mosque_key(mosque_id) if mosque_id else city_key(city)
+        mosque_uuid = await self._mawaqit_uuid(session, key, city)
+        if not mosque_uuid:
+            return None
+
+        params = {'start': start_date.strftime('%Y-%m-%d'), 'end': end_date.strftime('%Y-%m-%d')}
+        async with session.get(f"{self.mawaqit_url}/mosque/{mosque_uuid}/prayers", params=params) as response:
+            if response.status == 404:
+                # The mosque moved or was removed; search again next time
+                await asyncio.to_thread(self.directory.forget, key)
+            if response.status != 200:
+                return None
+            data = await response.json(content_type=None)
+
+        prayer_times = {}
+        for day_data in data.get('prayers', []):
+            try:
+                day_date = datetime.strptime(day_data['date'], '%Y-%m-%d').date()
+                prayer_times[day_date] = validate_times({prayer: day_data[prayer] for prayer in PRAYERS})
+            except Exception as e:
+                logger.error(f"Error processing Mawaqit day data: {e}")
+        return prayer_times or None
+
+    def get_stats(self) -> Dict[str, Dict]:
+        return {
+            name: {'state': breaker.state, 'failures': breaker.failures}
+            for name, breaker in self.breakers.items()
+        }
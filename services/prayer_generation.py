@@ -0,0 +1,94 @@
+"""
+Bulk generation of the prayer_times table for the Flask-SQLAlchemy app (app_new.py)
+
+Times for a whole year (or the Ramadan window) are calculated offline for
+every active mosque and upserted in batches on the (mosque_id, date) unique
+constraint, so /api/prayer-times reads a stored row instead of calculating
+and inserting one on the first request of the day.
+"""
+
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List
+
+from models_new import db, Mosque, PrayerTime
+from services.prayer_calculation import calculate_range
+from cache_service import cache_prayer_times_many
+
+logger = logging.getLogger(__name__)
+
+# Columns of PrayerTime filled from the calculation
+PRAYER_COLUMNS = ('fajr', 'dhuhr', 'asr', 'maghrib', 'isha')
+
+# Rows per INSERT ... ON CONFLICT statement
+BATCH_SIZE = 1000
+
+
+def _upsert_statement():
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise ValueError(f"Bulk prayer time upserts are not supported on {dialect}")
+
+    statement = insert(PrayerTime.__table__)
+    return statement.on_conflict_do_update(
+        index_elements=['mosque_id', 'date'],
+        set_={column: statement.excluded[column] for column in PRAYER_COLUMNS}
+    )
+
+
+def active_mosques() -> List[Mosque]:
+    """Active mosques that have coordinates to calculate for"""
+    return Mosque.query.filter(
+        Mosque.is_active == True,
+        Mosque.latitude.isnot(None),
+        Mosque.longitude.isnot(None)
+    ).order_by(Mosque.id).all()
+
+
+def generate_prayer_times(mosques: Iterable[Mosque], start_date: date, end_date: date,
+                          warm_days: int = 7, batch_size: int = BATCH_SIZE, **params) -> Dict[str, int]:
+    """Calculate and upsert prayer times from ``start_date`` to ``end_date`` inclusive.
+
+    ``params`` are passed to the calculation (method, school, ...). The
+    cache keys of the first ``warm_days`` days from today that fall in the
+    range are filled as well, and kept until the last of them has passed.
+    """
+    statement = _upsert_statement()
+    today = date.today()
+    warm_until = today + timedelta(days=warm_days)
+    summary = {'mosques': 0, 'rows': 0, 'cached': 0}
+
+    for mosque in mosques:
+        times = calculate_range(start_date, end_date, float(mosque.latitude), float(mosque.longitude), **params)
+        rows = [
+            dict(
+                mosque_id=mosque.id,
+                date=day,
+                **{prayer: datetime.strptime(day_times[prayer], '%H:%M').time() for prayer in PRAYER_COLUMNS}
+            )
+            for day, day_times in times.items()
+        ]
+        for offset in range(0, len(rows), batch_size):
+            db.session.execute(statement, rows[offset:offset + batch_size])
+        db.session.commit()
+
+        # Same payload as the endpoint caches for a calculated day
+        warm = {
+            day: {prayer: day_times[prayer] for prayer in PRAYER_COLUMNS}
+            for day, day_times in times.items()
+            if today <= day < warm_until
+        }
+        if warm:
+            ttl_seconds = (max(warm) - today).days * 86400 + 2 * 86400
+            if cache_prayer_times_many(mosque.id, {day.isoformat(): value for day, value in warm.items()}, ttl_seconds):
+                summary['cached'] += len(warm)
+
+        summary['mosques'] += 1
+        summary['rows'] += len(rows)
+        logger.info(f"Generated {len(rows)} prayer times for mosque {mosque.id}")
+
+    return summary
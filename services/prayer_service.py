@@ -1,24 +1,122 @@
+from collections import OrderedDict
 from datetime import date, datetime, timedelta
+import json
 import logging
+import os
+import tempfile
+import threading
+import time
 from typing import Dict, Optional
 import requests
 
+from services.prayer_calculation import calculate_day
+
 logger = logging.getLogger(__name__)
 
+# Months of calendars kept in memory, how long one stays valid, and an
+# optional JSON file that survives worker restarts
+MONTH_CACHE_SIZE = int(os.environ.get('PRAYER_MONTH_CACHE_SIZE', 24))
+MONTH_CACHE_TTL = int(os.environ.get('PRAYER_MONTH_CACHE_TTL', 7 * 86400))
+MONTH_CACHE_PATH = os.environ.get('PRAYER_MONTH_CACHE_PATH')
+
+
+class MonthCache:
+    """Bounded LRU of month calendars with a TTL per month, optionally persisted to disk"""
+
+    def __init__(self, max_entries: int = MONTH_CACHE_SIZE, ttl_seconds: int = MONTH_CACHE_TTL,
+                 path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = path
+        self._entries = OrderedDict()  # key -> (expires_at, {iso date: times})
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    def get(self, key: str) -> Optional[Dict[str, Dict[str, str]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, days: Dict[str, Dict[str, str]]):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl_seconds, days)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if self.path:
+                self._save()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as handle:
+                stored = json.load(handle)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable prayer time cache {self.path}: {e}")
+            return
+
+        now = time.time()
+        # Stored oldest first, so the LRU order survives the restart
+        for key, entry in stored.items():
+            if entry['expires_at'] > now:
+                self._entries[key] = (entry['expires_at'], entry['days'])
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _save(self):
+        # Write a temporary file and rename it, so readers never see half a file
+        data = {key: {'expires_at': expires_at, 'days': days} for key, (expires_at, days) in self._entries.items()}
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            with tempfile.NamedTemporaryFile('w', dir=directory, delete=False, encoding='utf-8') as handle:
+                json.dump(data, handle)
+            os.replace(handle.name, self.path)
+        except OSError as e:
+            logger.warning(f"Could not persist prayer time cache to {self.path}: {e}")
+
+
 class PrayerService:
     """Service for fetching prayer times"""
 
-    def __init__(self):
-        self._cache = {}
-
-    def get_prayer_times(self, target_date: date, city: str = "Gent") -> Optional[Dict[str, str]]:
-        """Get prayer times for a specific date"""
+    def __init__(self, cache: Optional[MonthCache] = None):
+        self._cache = cache if cache is not None else MonthCache(path=MONTH_CACHE_PATH)
+        # One lock per month, so concurrent requests for a month share one download
+        self._fetch_locks = {}
+        self._fetch_locks_lock = threading.Lock()
+
+    def _fetch_lock(self, key: str) -> threading.Lock:
+        with self._fetch_locks_lock:
+            return self._fetch_locks.setdefault(key, threading.Lock())
+
+    def _get_month(self, year: int, month: int, city: str) -> Optional[Dict[str, Dict[str, str]]]:
+        """Every day of a month calendar keyed by ISO date; downloaded at most once per TTL"""
+        cache_key = f"{city}:{year}-{month:02d}"
+        days = self._cache.get(cache_key)
+        if days is not None:
+            return days
+
+        with self._fetch_lock(cache_key):
+            # Another thread may have downloaded it while we waited
+            days = self._cache.get(cache_key)
+            if days is None:
+                days = self._fetch_month(year, month)
+                if days:
+                    self._cache.set(cache_key, days)
+            return days
+
+    def _fetch_month(self, year: int, month: int) -> Optional[Dict[str, Dict[str, str]]]:
         try:
-            # Check cache first
-            cache_key = f"{target_date}_{city}"
-            if cache_key in self._cache:
-                return self._cache[cache_key]
-
             # Get coordinates for Gent
             lat, lng = 51.0543422, 3.7174243
 
@@ -27,8 +125,8 @@ class PrayerService:
                 'latitude': lat,
                 'longitude': lng,
                 'method': 13,  # Diyanet method
-                'month': target_date.month,
-                'year': target_date.year,
+                'month': month,
+                'year': year,
                 'adjustment': 0,
                 'school': 1,  # Hanafi
                 'timezonestring': 'Europe/Brussels'
@@ -40,48 +138,58 @@ class PrayerService:
                 timeout=10
             )
 
-            if response.status_code == 200:
-                data = response.json()
-
-                # Find the specific day
-                for day_data in data.get('data', []):
-                    day_date = datetime.strptime(
-                        day_data['date']['gregorian']['date'],
-                        '%d-%m-%Y'
-                    ).date()
-
-                    if day_date == target_date:
-                        times = day_data['timings']
-                        prayer_times = {
-                            'fajr': times['Fajr'].split(' ')[0],
-                            'sunrise': times['Sunrise'].split(' ')[0],
-                            'dhuhr': times['Dhuhr'].split(' ')[0],
-                            'asr': times['Asr'].split(' ')[0],
-                            'maghrib': times['Maghrib'].split(' ')[0],
-                            'isha': times['Isha'].split(' ')[0]
-                        }
-
-                        # Cache the result
-                        self._cache[cache_key] = prayer_times
-                        return prayer_times
-
-            logger.warning(f"No prayer times found for {target_date}")
-            return None
+            if response.status_code != 200:
+                logger.warning(f"Aladhan returned {response.status_code} for {year}-{month:02d}")
+                return None
+
+            days = {}
+            for day_data in response.json().get('data', []):
+                day_date = datetime.strptime(
+                    day_data['date']['gregorian']['date'],
+                    '%d-%m-%Y'
+                ).date()
+                times = day_data['timings']
+                days[day_date.isoformat()] = {
+                    'fajr': times['Fajr'].split(' ')[0],
+                    'sunrise': times['Sunrise'].split(' ')[0],
+                    'dhuhr': times['Dhuhr'].split(' ')[0],
+                    'asr': times['Asr'].split(' ')[0],
+                    'maghrib': times['Maghrib'].split(' ')[0],
+                    'isha': times['Isha'].split(' ')[0]
+                }
+            return days
 
         except Exception as e:
-            logger.error(f"Error fetching prayer times: {e}", exc_info=True)
+            logger.error(f"Error fetching prayer times for {year}-{month:02d}: {e}", exc_info=True)
             return None
 
-    def get_prayer_times_range(self, start_date: date, end_date: date, 
+    def get_prayer_times(self, target_date: date, city: str = "Gent") -> Optional[Dict[str, str]]:
+        """Get prayer times for a specific date"""
+        days = self._get_month(target_date.year, target_date.month, city)
+        if days and target_date.isoformat() in days:
+            return days[target_date.isoformat()]
+        return self._calculate_locally(target_date)
+
+    def _calculate_locally(self, target_date: date) -> Dict[str, str]:
+        logger.warning(f"No prayer times found for {target_date}, calculating locally")
+        # Same parameters as the API request, so the fallback matches it
+        return calculate_day(target_date, 51.0543422, 3.7174243, method=13, school=1,
+                             timezone='Europe/Brussels')
+
+    def get_prayer_times_range(self, start_date: date, end_date: date,
                            city: str = "Gent") -> Dict[date, Dict[str, str]]:
         """Get prayer times for a date range"""
         prayer_times = {}
+        months = {}
         current_date = start_date
 
         while current_date <= end_date:
-            times = self.get_prayer_times(current_date, city)
-            if times:
-                prayer_times[current_date] = times
+            # Each month is looked up once, also when its download failed
+            month = (current_date.year, current_date.month)
+            if month not in months:
+                months[month] = self._get_month(current_date.year, current_date.month, city) or {}
+            times = months[month].get(current_date.isoformat())
+            prayer_times[current_date] = times or self._calculate_locally(current_date)
             current_date += timedelta(days=1)
 
         return prayer_times
@@ -91,4 +199,4 @@ _prayer_service = PrayerService()
 
 def get_prayer_times_for_date_range(start_date: date, end_date: date, city: str = "Gent") -> Dict[date, Dict[str, str]]:
     """Get prayer times for a date range using the singleton service instance"""
-    return _prayer_service.get_prayer_times_range(start_date, end_date, city)
\ No newline at end of file
+    return _prayer_service.get_prayer_times_range(start_date, end_date, city)
@@ -1,193 +1,133 @@
 import os
-import requests
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, date, timedelta
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Tuple
 import logging
 from bs4 import BeautifulSoup
 
+from services.mawaqit_directory import MawaqitDirectory, mosque_key
+from services.prayer_fetch import HedgedFetcher
+
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# Days kept per service instance (all sources and cities) and how long one stays valid
+DAY_CACHE_SIZE = int(os.environ.get('PRAYER_DAY_CACHE_SIZE', 4000))
+DAY_CACHE_TTL = int(os.environ.get('PRAYER_DAY_CACHE_TTL', 7 * 86400))
+
+
+class DayCache:
+    """Prayer times per (source, city, day), so any range is answered from
+    the days already known and only the gaps are fetched.
+
+    Least recently used days are evicted beyond ``max_days``; days older
+    than ``ttl_seconds`` count as missing.
+    """
+
+    def __init__(self, max_days: int = DAY_CACHE_SIZE, ttl_seconds: int = DAY_CACHE_TTL):
+        self.max_days = max_days
+        self.ttl_seconds = ttl_seconds
+        self._days = OrderedDict()  # (source, city, day) -> (expires_at, times)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_range(self, source: str, city: str, start_date: date,
+                  end_date: date) -> Tuple[Dict[date, Dict], List[Tuple[date, date]]]:
+        """(cached days in the range, missing (start, end) gaps)"""
+        found, gaps = {}, []
+        now = time.monotonic()
+        with self._lock:
+            day = start_date
+            while day <= end_date:
+                key = (source, city, day)
+                entry = self._days.get(key)
+                if entry is not None and entry[0] > now:
+                    self._days.move_to_end(key)
+                    found[day] = entry[1]
+                    self.hits += 1
+                else:
+                    if entry is not None:
+                        del self._days[key]
+                    self.misses += 1
+                    if gaps and gaps[-1][1] == day - timedelta(days=1):
+                        gaps[-1] = (gaps[-1][0], day)
+                    else:
+                        gaps.append((day, day))
+                day += timedelta(days=1)
+        return found, gaps
+
+    def put(self, source: str, city: str, prayer_times: Dict[date, Dict]):
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            for day, times in prayer_times.items():
+                key = (source, city, day)
+                self._days[key] = (expires_at, times)
+                self._days.move_to_end(key)
+            while len(self._days) > self.max_days:
+                self._days.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._days.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'days': len(self._days),
+                'max_days': self.max_days,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
 class PrayerTimeService:
     """Handles fetching and validation of prayer times from multiple sources"""
 
     ALADHAN_API_URL = "http://api.aladhan.com/v1/calendar"
     MAWAQIT_BASE_URL = "https://mawaqit.net/api/2.0"
 
-    def __init__(self):
-        self.cache = {}  # Simple in-memory cache
+    def __init__(self, cache: Optional[DayCache] = None, fetcher: Optional[HedgedFetcher] = None,
+                 directory: Optional[MawaqitDirectory] = None):
+        self.cache = cache if cache is not None else DayCache()
+        self.fetcher = fetcher if fetcher is not None else HedgedFetcher(
+            self.ALADHAN_API_URL, self.MAWAQIT_BASE_URL, directory=directory
+        )
 
-    def get_prayer_times_for_range(self, source: str, start_date: date, end_date: date, city: str = "Gent") -> Optional[Dict[date, Dict]]:
+    def get_prayer_times_for_range(self, source: str, start_date: date, end_date: date, city: str = "Gent",
+                                   mosque_id: Optional[int] = None) -> Optional[Dict[date, Dict]]:
         """
-        Fetch prayer times for a date range with fallback mechanism
+        Fetch prayer times for a date range with fallback mechanism.
+        With ``mosque_id``, Mawaqit answers with that mosque's own times.
         """
         try:
             logger.info(f"Fetching prayer times for {start_date} to {end_date} using {source}")
 
-            # Check cache first
-            cache_key = f"{start_date}_{end_date}_{source}_{city}"
-            if cache_key in self.cache:
+            # Check cache first; only the days it does not have are fetched
+            place = mosque_key(mosque_id) if mosque_id else city
+            prayer_times, gaps = self.cache.get_range(source, place, start_date, end_date)
+            if not gaps:
                 logger.info("Returning cached prayer times")
-                return self.cache[cache_key]
-
-            # Try primary source
-            if source == 'diyanet':
-                prayer_times = self._get_aladhan_times(start_date, end_date, city)
-                if prayer_times:
-                    self.cache[cache_key] = prayer_times
-                    return prayer_times
-                logger.warning("Aladhan API failed, falling back to Mawaqit")
-
-            # Fallback to Mawaqit
-            prayer_times = self._get_mawaqit_api_times(start_date, end_date, city)
-            if prayer_times:
-                self.cache[cache_key] = prayer_times
                 return prayer_times
 
-            return None
-
-        except Exception as e:
-            logger.error(f"Error fetching prayer times: {e}", exc_info=True)
-            return None
-
-    def _get_aladhan_times(self, start_date: date, end_date: date, city: str) -> Optional[Dict[date, Dict]]:
-        """Get prayer times from Aladhan API with validation"""
-        try:
-            # Precise coordinates for Gent
-            latitude = 51.0543422
-            longitude = 3.7174243
-
-            prayer_times = {}
-            current_date = start_date
-
-            while current_date <= end_date:
-                params = {
-                    'latitude': latitude,
-                    'longitude': longitude,
-                    'method': 13,  # Diyanet İşleri Başkanlığı
-                    'month': current_date.month,
-                    'year': current_date.year,
-                    'adjustment': 0,
-                    'school': 1,  # Hanafi
-                    'timezonestring': 'Europe/Brussels'
-                }
-
-                response = requests.get(self.ALADHAN_API_URL, params=params, timeout=10)
-
-                if response.status_code == 200:
-                    data = response.json()
-
-                    for day_data in data.get('data', []):
-                        try:
-                            day_date = datetime.strptime(
-                                day_data['date']['gregorian']['date'],
-                                '%d-%m-%Y'
-                            ).date()
-
-                            if start_date <= day_date <= end_date:
-                                times = day_data['timings']
-                                prayer_times[day_date] = self._validate_and_clean_times({
-                                    'fajr': times['Fajr'].split(' ')[0],
-                                    'sunrise': times['Sunrise'].split(' ')[0],
-                                    'dhuhr': times['Dhuhr'].split(' ')[0],
-                                    'asr': times['Asr'].split(' ')[0],
-                                    'maghrib': times['Maghrib'].split(' ')[0],
-                                    'isha': times['Isha'].split(' ')[0]
-                                })
-
-                        except Exception as e:
-                            logger.error(f"Error processing day data: {e}")
-                            continue
-
-                # Move to next month
-                if current_date.month == 12:
-                    current_date = current_date.replace(year=current_date.year + 1, month=1)
-                else:
-                    current_date = current_date.replace(month=current_date.month + 1)
-
-            return prayer_times if prayer_times else None
-
-        except Exception as e:
-            logger.error(f"Error with Aladhan API: {e}", exc_info=True)
-            return None
-
-    def _get_mawaqit_api_times(self, start_date: date, end_date: date, city: str) -> Optional[Dict[date, Dict]]:
-        """Get prayer times from Mawaqit API with validation"""
-        try:
-            # Get mosque UUID
-            search_response = requests.get(
-                f"{self.MAWAQIT_BASE_URL}/mosque/search",
-                params={'q': city, 'limit': 1},
-                headers={'Accept': 'application/json'},
-                timeout=10
-            )
-
-            if search_response.status_code != 200:
-                return None
-
-            mosque_data = search_response.json()
-            if not mosque_data.get('mosques'):
-                return None
-
-            mosque_uuid = mosque_data['mosques'][0].get('uuid')
-            if not mosque_uuid:
-                return None
-
-            # Get prayer times
-            times_response = requests.get(
-                f"{self.MAWAQIT_BASE_URL}/mosque/{mosque_uuid}/prayers",
-                params={
-                    'start': start_date.strftime('%Y-%m-%d'),
-                    'end': end_date.strftime('%Y-%m-%d')
-                },
-                headers={'Accept': 'application/json'},
-                timeout=10
-            )
-
-            if times_response.status_code != 200:
-                return None
-
-            times_data = times_response.json()
-            prayer_times = {}
-
-            for day_data in times_data.get('prayers', []):
-                try:
-                    day_date = datetime.strptime(day_data['date'], '%Y-%m-%d').date()
-                    prayer_times[day_date] = self._validate_and_clean_times({
-                        'fajr': day_data['fajr'],
-                        'sunrise': day_data['sunrise'],
-                        'dhuhr': day_data['dhuhr'],
-                        'asr': day_data['asr'],
-                        'maghrib': day_data['maghrib'],
-                        'isha': day_data['isha']
-                    })
-                except Exception as e:
-                    logger.error(f"Error processing Mawaqit day data: {e}")
-                    continue
+            # Aladhan months in parallel, hedged with Mawaqit (services/prayer_fetch.py)
+            for fetched in self.fetcher.fetch_ranges(source, gaps, city, mosque_id):
+                if fetched:
+                    self.cache.put(source, place, fetched)
+                    prayer_times.update(fetched)
 
             return prayer_times if prayer_times else None
 
         except Exception as e:
-            logger.error(f"Error with Mawaqit API: {e}", exc_info=True)
+            logger.error(f"Error fetching prayer times: {e}", exc_info=True)
             return None
 
-    def _validate_and_clean_times(self, times: Dict[str, str]) -> Dict[str, str]:
-        """Validate and clean prayer times"""
-        cleaned_times = {}
-        for prayer, time_str in times.items():
-            try:
-                # Remove timezone indicators if present
-                time_str = time_str.split(' ')[0]
-                # Validate time format
-                datetime.strptime(time_str, '%H:%M')
-                cleaned_times[prayer] = time_str
-            except Exception as e:
-                logger.error(f"Invalid time format for {prayer}: {time_str}")
-                cleaned_times[prayer] = None
-
-        return cleaned_times
-
     def get_prayer_times_batch(self, source: str, dates: List[date], prayer_name: str, city: str = "Gent") -> Dict[date, Optional[str]]:
         """Get prayer times for multiple dates efficiently"""
         if not dates:
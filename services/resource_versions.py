@@ -0,0 +1,98 @@
+"""
+Per-resource version counters for the raw SQLite app (app.py)
+
+Each public list resource (mosques, events, ...) has a version and a
+last-modified time, bumped by triggers on every write to the tables whose
+columns appear in its payload. The public endpoints derive ETag and
+Last-Modified from them, so a revalidation costs one primary-key lookup.
+"""
+
+import hashlib
+import logging
+import sqlite3
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+VERSION_TABLE = 'resource_versions'
+
+# Per resource: the tables its payload reads. None means any write to the
+# table counts; a column list limits it to updates of the joined columns
+# (and deletes) for tables that are only joined in for a name.
+RESOURCE_TABLES: Dict[str, Dict[str, Optional[List[str]]]] = {
+    'mosques': {'mosques': None},
+    'events': {'events': None, 'mosques': ['name']},
+    'news': {'news': None, 'users': ['first_name', 'last_name']},
+    'campaigns': {'campaigns': None, 'mosques': ['name']},
+    'files': {'media_files': None, 'users': ['first_name', 'last_name'], 'mosques': ['name']},
+}
+
+_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+def _bump_sql(resource: str) -> str:
+    return f'''
+        INSERT INTO {VERSION_TABLE} (resource, version, updated_at) VALUES ('{resource}', 1, {_NOW})
+        ON CONFLICT (resource) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+    '''
+
+
+def _schema_statements():
+    yield f'''
+        CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (
+            resource TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT NOT NULL
+        )
+    '''
+    for resource, tables in RESOURCE_TABLES.items():
+        for table, columns in tables.items():
+            prefix = f'{VERSION_TABLE}_{resource}_{table}'
+            if columns is None:
+                yield f'''
+                    CREATE TRIGGER IF NOT EXISTS {prefix}_ai AFTER INSERT ON {table} BEGIN
+                        {_bump_sql(resource)}
+                    END
+                '''
+                update = f'AFTER UPDATE ON {table}'
+            else:
+                update = f"AFTER UPDATE OF {', '.join(columns)} ON {table}"
+            yield f'''
+                CREATE TRIGGER IF NOT EXISTS {prefix}_au {update} BEGIN
+                    {_bump_sql(resource)}
+                END
+            '''
+            yield f'''
+                CREATE TRIGGER IF NOT EXISTS {prefix}_ad AFTER DELETE ON {table} BEGIN
+                    {_bump_sql(resource)}
+                END
+            '''
+
+
+def init_resource_versions(conn: sqlite3.Connection):
+    """Create the version table and triggers; start every resource at the current time"""
+    for statement in _schema_statements():
+        conn.execute(statement)
+    conn.executemany(
+        f'INSERT OR IGNORE INTO {VERSION_TABLE} (resource, version, updated_at) VALUES (?, 1, {_NOW})',
+        [(resource,) for resource in RESOURCE_TABLES]
+    )
+    conn.commit()
+
+
+def get_validators(conn: sqlite3.Connection, resource: str) -> Tuple[str, datetime]:
+    """(strong ETag value, Last-Modified) for a resource.
+
+    The ETag hashes the modification time along with the version, so a
+    recreated database never repeats the ETag of an older one.
+    """
+    row = conn.execute(
+        f'SELECT version, updated_at FROM {VERSION_TABLE} WHERE resource = ?', (resource,)
+    ).fetchone()
+    version, updated_at = (row[0], row[1]) if row else (0, '1970-01-01 00:00:00.000')
+    etag = hashlib.sha1(f'{resource}:{version}:{updated_at}'.encode()).hexdigest()[:20]
+    last_modified = datetime.strptime(updated_at, '%Y-%m-%d %H:%M:%S.%f').replace(
+        microsecond=0, tzinfo=timezone.utc
+    )
+    return etag, last_modified
@@ -0,0 +1,217 @@
+"""
+FTS5 full-text search index for the raw SQLite app (app.py)
+
+One trigram-tokenized FTS5 table per content type, keyed on the source row id
+and kept in sync by triggers. The trigram tokenizer matches case-insensitive
+substrings, so MATCH gives the same results as the LIKE '%q%' scans it replaces
+for queries of at least MIN_QUERY_LENGTH characters.
+"""
+
+import base64
+import json
+import logging
+import sqlite3
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Trigram MATCH needs at least one full trigram
+MIN_QUERY_LENGTH = 3
+
+# Pagination limits for /api/search
+MAX_PER_PAGE = 100
+COUNT_ESTIMATE_CAP = 1000
+CURSOR_VERSION = 1
+
+# Per content type: indexed columns, the source columns whose updates require
+# re-indexing, the SELECT that produces (rowid, *columns) for a source row
+# (aliased ``s``), and the tables whose columns are denormalized into the
+# index as (table, foreign key, columns).
+INDEX_DEFINITIONS = {
+    'mosques': {
+        'source_table': 'mosques',
+        'watch_columns': ('name', 'description', 'address', 'imam_name', 'email', 'phone'),
+        'columns': ('name', 'description', 'address', 'imam_name', 'email', 'phone'),
+        'select': (
+            "SELECT s.id, s.name, s.description, s.address, s.imam_name, s.email, s.phone"
+            " FROM mosques s"
+        ),
+        'dependencies': (),
+    },
+    'events': {
+        'source_table': 'events',
+        'watch_columns': ('title', 'description', 'mosque_id'),
+        'columns': ('title', 'description', 'mosque_name', 'mosque_address'),
+        'select': (
+            "SELECT s.id, s.title, s.description, m.name, m.address"
+            " FROM events s LEFT JOIN mosques m ON s.mosque_id = m.id"
+        ),
+        'dependencies': (('mosques', 'mosque_id', ('name', 'address')),),
+    },
+    'news': {
+        'source_table': 'news',
+        'watch_columns': ('title', 'excerpt', 'content', 'author_id'),
+        'columns': ('title', 'excerpt', 'content', 'author_first_name', 'author_last_name'),
+        'select': (
+            "SELECT s.id, s.title, s.excerpt, s.content, u.first_name, u.last_name"
+            " FROM news s LEFT JOIN users u ON s.author_id = u.id"
+        ),
+        'dependencies': (('users', 'author_id', ('first_name', 'last_name')),),
+    },
+    'campaigns': {
+        'source_table': 'campaigns',
+        'watch_columns': ('title', 'description', 'mosque_id'),
+        'columns': ('title', 'description', 'mosque_name', 'mosque_address'),
+        'select': (
+            "SELECT s.id, s.title, s.description, m.name, m.address"
+            " FROM campaigns s LEFT JOIN mosques m ON s.mosque_id = m.id"
+        ),
+        'dependencies': (('mosques', 'mosque_id', ('name', 'address')),),
+    },
+}
+
+
+def fts_table(content_type: str) -> str:
+    """Name of the FTS5 table for a content type"""
+    return f"{content_type}_fts"
+
+
+def _reindex_sql(content_type: str, where: str) -> str:
+    """DELETE + INSERT statements re-indexing the source rows matching ``where``"""
+    definition = INDEX_DEFINITIONS[content_type]
+    table = fts_table(content_type)
+    columns = ', '.join(definition['columns'])
+    return (
+        f"DELETE FROM {table} WHERE rowid IN "
+        f"(SELECT s.id FROM {definition['source_table']} s WHERE {where});\n"
+        f"INSERT INTO {table}(rowid, {columns}) {definition['select']} WHERE {where};"
+    )
+
+
+def _schema_statements(content_type: str):
+    """CREATE statements for one content type's FTS table and sync triggers"""
+    definition = INDEX_DEFINITIONS[content_type]
+    source = definition['source_table']
+    table = fts_table(content_type)
+
+    yield (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+        f"{', '.join(definition['columns'])}, tokenize='trigram')"
+    )
+
+    yield f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON {source} BEGIN
+            {_reindex_sql(content_type, 's.id = NEW.id')}
+        END
+    '''
+    yield f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_au
+        AFTER UPDATE OF {', '.join(definition['watch_columns'])} ON {source} BEGIN
+            DELETE FROM {table} WHERE rowid = OLD.id;
+            {_reindex_sql(content_type, 's.id = NEW.id')}
+        END
+    '''
+    yield f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON {source} BEGIN
+            DELETE FROM {table} WHERE rowid = OLD.id;
+        END
+    '''
+
+    # Denormalized columns (mosque name, author name) follow their parent row
+    for parent, foreign_key, parent_columns in definition['dependencies']:
+        yield f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_{parent}_au
+            AFTER UPDATE OF {', '.join(parent_columns)} ON {parent} BEGIN
+                {_reindex_sql(content_type, f's.{foreign_key} = NEW.id')}
+            END
+        '''
+        yield f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_{parent}_ad AFTER DELETE ON {parent} BEGIN
+                {_reindex_sql(content_type, f's.{foreign_key} = OLD.id')}
+            END
+        '''
+
+
+def init_search_index(conn: sqlite3.Connection) -> bool:
+    """Create FTS tables and triggers; populate tables that did not exist yet.
+
+    Returns False when this SQLite build lacks FTS5 or the trigram tokenizer,
+    in which case callers should keep using LIKE scans.
+    """
+    try:
+        existing = {
+            row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE '%_fts'"
+            )
+        }
+        for content_type in INDEX_DEFINITIONS:
+            for statement in _schema_statements(content_type):
+                conn.execute(statement)
+            if fts_table(content_type) not in existing:
+                _populate(conn, content_type)
+        conn.commit()
+        return True
+    except sqlite3.OperationalError as e:
+        conn.rollback()
+        logger.warning(f"FTS5 search index unavailable, falling back to LIKE search: {e}")
+        return False
+
+
+def _populate(conn: sqlite3.Connection, content_type: str) -> int:
+    definition = INDEX_DEFINITIONS[content_type]
+    table = fts_table(content_type)
+    conn.execute(f"DELETE FROM {table}")
+    cursor = conn.execute(
+        f"INSERT INTO {table}(rowid, {', '.join(definition['columns'])}) {definition['select']}"
+    )
+    return cursor.rowcount
+
+
+def rebuild_search_index(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Repopulate every FTS table from its source table and optimize it"""
+    counts = {}
+    for content_type in INDEX_DEFINITIONS:
+        counts[content_type] = _populate(conn, content_type)
+        table = fts_table(content_type)
+        conn.execute(f"INSERT INTO {table}({table}) VALUES ('optimize')")
+    conn.commit()
+    logger.info(f"Search index rebuilt: {counts}")
+    return counts
+
+
+def build_match_query(text: str) -> Optional[str]:
+    """Turn user input into an FTS5 phrase query, or None if too short for trigrams"""
+    text = (text or '').strip()
+    if len(text) < MIN_QUERY_LENGTH:
+        return None
+    return '"' + text.replace('"', '""') + '"'
+
+
+def encode_cursor(sort: str, positions: Dict[str, List[Any]]) -> str:
+    """Opaque continuation token holding the last sort key seen per content type"""
+    payload = {'v': CURSOR_VERSION, 's': sort, 'k': positions}
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token: str, sort: str) -> Dict[str, List[Any]]:
+    """Decode a token from encode_cursor; raises ValueError if malformed or for another sort"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError('Malformed cursor') from e
+
+    if not isinstance(payload, dict) or payload.get('v') != CURSOR_VERSION:
+        raise ValueError('Unsupported cursor version')
+    if payload.get('s') != sort:
+        raise ValueError('Cursor was issued for a different sort order')
+
+    positions = payload.get('k')
+    if not isinstance(positions, dict) or not all(
+        content_type in INDEX_DEFINITIONS and isinstance(key, list)
+        and all(value is None or isinstance(value, (str, int, float)) for value in key)
+        for content_type, key in positions.items()
+    ):
+        raise ValueError('Malformed cursor')
+    return positions
@@ -13,6 +13,9 @@ os.environ['TESTING'] = 'True'
 os.environ['SECRET_KEY'] = 'test-secret-key'
 os.environ['JWT_SECRET_KEY'] = 'test-jwt-secret-key'
 os.environ['WTF_CSRF_ENABLED'] = 'False'
+os.environ.setdefault('DATABASE_URL', 'sqlite:///:memory:')
+# Keep the raw SQLite app (imported indirectly via routes) away from instance/
+os.environ['SQLITE_DB_PATH'] = os.path.join(tempfile.mkdtemp(), 'vgm_website.db')
 
 @pytest.fixture(scope='session')
 def app():
@@ -151,6 +154,85 @@ def admin_auth_headers(app, test_admin_user):
         token = generate_jwt_token(test_admin_user.id, test_admin_user.role, 'access')
         return {'Authorization': f'Bearer {token}'}
 
+@pytest.fixture
+def sqlite_app(tmp_path, monkeypatch):
+    """Create the raw SQLite app (app.py) against a temporary database"""
+    import importlib
+    monkeypatch.setenv('SQLITE_DB_PATH', str(tmp_path / 'vgm_website.db'))
+    legacy_app = importlib.import_module('app')
+    
+    app = legacy_app.create_app()
+    app.config['TESTING'] = True
+    yield app
+    app.extensions['analytics_buffer'].close()
+    app.extensions['db_pool'].close_all()
+
+@pytest.fixture
+def sqlite_client(sqlite_app):
+    """Create test client for the raw SQLite app"""
+    return sqlite_app.test_client()
+
+@pytest.fixture
+def sqlite_admin_headers(sqlite_client):
+    """Log in as the seeded admin of the raw SQLite app"""
+    response = sqlite_client.post('/api/auth/login', json={
+        'email': 'admin@vgm.be',
+        'password': 'admin123'
+    })
+    token = response.get_json()['token']
+    return {'Authorization': f'Bearer {token}'}
+
+@pytest.fixture
+def legacy_db():
+    """The legacy models (models.py) on an in-memory database"""
+    from flask import Flask
+    from models import db
+    
+    legacy_app = Flask(__name__)
+    legacy_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(legacy_app)
+    with legacy_app.app_context():
+        db.create_all()
+        yield db
+        db.session.remove()
+        db.drop_all()
+
+class FakeRedis:
+    """In-memory stand-in for the redis client methods used by cache_service"""
+    
+    def __init__(self):
+        self.store = {}
+    
+    def get(self, key):
+        return self.store.get(key)
+    
+    def setex(self, key, ttl_seconds, value):
+        self.store[key] = value
+        return True
+    
+    def mget(self, keys):
+        return [self.store.get(key) for key in keys]
+    
+    def incr(self, key):
+        value = int(self.store.get(key) or 0) + 1
+        self.store[key] = str(value)
+        return value
+    
+    def delete(self, *keys):
+        return sum(1 for key in keys if self.store.pop(key, None) is not None)
+    
+    def keys(self, pattern):
+        import fnmatch
+        return [key for key in self.store if fnmatch.fnmatchcase(key, pattern)]
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Enable cache_service against an in-memory Redis"""
+    from cache_service import cache
+    client = FakeRedis()
+    monkeypatch.setattr(cache, 'redis_client', client)
+    return client
+
 @pytest.fixture
 def temp_upload_dir():
     """Create temporary upload directory"""
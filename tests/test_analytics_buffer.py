@@ -0,0 +1,175 @@
+"""
+Tests for buffered analytics ingestion in the raw SQLite app (app.py)
+"""
+
+import time
+
+import pytest
+
+from analytics_buffer import AnalyticsBuffer
+from db_pool import SQLiteConnectionPool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = SQLiteConnectionPool(str(tmp_path / 'analytics.db'))
+    conn = pool.connection()
+    conn.execute('''
+        CREATE TABLE page_views (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            page_path TEXT NOT NULL,
+            user_id INTEGER,
+            session_id TEXT,
+            ip_address TEXT,
+            user_agent TEXT,
+            referrer TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+    conn.close()
+    yield pool
+    pool.close_all()
+
+
+@pytest.fixture
+def make_buffer(pool):
+    """Create buffers against the pool; every one is closed on teardown"""
+    buffers = []
+
+    def make(**options):
+        buffer = AnalyticsBuffer(pool, **options)
+        buffers.append(buffer)
+        return buffer
+
+    yield make
+    for buffer in buffers:
+        buffer.close()
+
+
+def page_view_count(pool):
+    conn = pool.connection()
+    count = conn.execute('SELECT COUNT(*) FROM page_views').fetchone()[0]
+    conn.close()
+    return count
+
+
+def page_view(path='/'):
+    return (path, None, 'session', '127.0.0.1', 'pytest', None)
+
+
+class TestAnalyticsBuffer:
+    """Batching, backpressure and shutdown flush"""
+
+    def test_size_trigger_writes_one_batch(self, pool, make_buffer):
+        buffer = make_buffer(batch_size=50, flush_interval=30)
+        for i in range(50):
+            assert buffer.submit('page_views', page_view(f'/page/{i}'))
+
+        deadline = time.monotonic() + 5
+        while page_view_count(pool) < 50 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert page_view_count(pool) == 50
+        stats = buffer.get_stats()
+        assert stats['batches'] == 1
+        assert stats['written'] == 50
+
+    def test_time_trigger_flushes_partial_batch(self, pool, make_buffer):
+        buffer = make_buffer(batch_size=1000, flush_interval=0.05)
+        buffer.submit('page_views', page_view())
+
+        deadline = time.monotonic() + 5
+        while page_view_count(pool) < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert page_view_count(pool) == 1
+
+    def test_full_buffer_drops_and_counts(self, pool, make_buffer):
+        buffer = make_buffer(max_size=3, batch_size=100, flush_interval=30)
+        buffer._ensure_worker = lambda: None  # keep rows queued
+
+        accepted = [buffer.submit('page_views', page_view()) for _ in range(5)]
+
+        assert accepted == [True, True, True, False, False]
+        stats = buffer.get_stats()
+        assert stats['dropped'] == 2
+        assert stats['queued'] == 3
+
+    def test_close_flushes_pending_rows(self, pool, make_buffer):
+        buffer = make_buffer(batch_size=1000, flush_interval=30)
+        for _ in range(10):
+            buffer.submit('page_views', page_view())
+        buffer.close()
+
+        assert page_view_count(pool) == 10
+        # After shutdown rows are written synchronously instead of being lost
+        assert buffer.submit('page_views', page_view())
+        assert page_view_count(pool) == 11
+
+    def test_writes_do_not_touch_thread_connection(self, pool, make_buffer):
+        buffer = make_buffer(batch_size=1000, flush_interval=30)
+        buffer.close()
+
+        held = pool.connection()
+        held.execute('BEGIN')
+        held.execute('SELECT COUNT(*) FROM page_views').fetchone()
+        assert buffer.submit('page_views', page_view('/after-close'))
+        # The request's own transaction was neither committed nor rolled back
+        assert held.in_transaction
+        assert buffer._conn is not held.raw
+        held.rollback()
+        held.close()
+
+        assert page_view_count(pool) == 1
+
+    def test_unknown_table_rejected(self, make_buffer):
+        buffer = make_buffer()
+        with pytest.raises(ValueError):
+            buffer.submit('users', ('x',))
+
+
+class TestTrackingEndpoints:
+    """Tracking endpoints enqueue instead of writing on the request thread"""
+
+    def test_page_view_is_buffered(self, sqlite_app, sqlite_client):
+        response = sqlite_client.post('/api/analytics/page-view', json={'page_path': '/moskeeen'})
+        assert response.status_code == 202
+
+        sqlite_app.extensions['analytics_buffer'].flush()
+        conn = sqlite_app.extensions['db_pool'].connection()
+        row = conn.execute("SELECT page_path, created_at FROM page_views").fetchone()
+        conn.close()
+        assert row['page_path'] == '/moskeeen'
+        assert row['created_at']
+
+    def test_event_is_buffered(self, sqlite_app, sqlite_client):
+        response = sqlite_client.post('/api/analytics/track', json={'event_type': 'donation_click', 'mosque_id': 1})
+        assert response.status_code == 202
+
+        sqlite_app.extensions['analytics_buffer'].flush()
+        conn = sqlite_app.extensions['db_pool'].connection()
+        count = conn.execute("SELECT COUNT(*) FROM analytics_events WHERE event_type = 'donation_click'").fetchone()[0]
+        conn.close()
+        assert count == 1
+
+    def test_full_buffer_returns_503(self, sqlite_app, sqlite_client, monkeypatch):
+        monkeypatch.setattr(sqlite_app.extensions['analytics_buffer'], 'submit', lambda table, row: False)
+        response = sqlite_client.post('/api/analytics/page-view', json={'page_path': '/'})
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+
+    def test_exit_handler_registered_once(self, sqlite_app, monkeypatch):
+        import atexit
+        import app as legacy_app
+
+        registered = []
+        monkeypatch.setattr(atexit, 'register', registered.append)
+        second = legacy_app.create_app()
+        try:
+            assert registered == []
+            assert second.extensions['analytics_buffer'] in legacy_app._analytics_buffers
+            assert sqlite_app.extensions['analytics_buffer'] in legacy_app._analytics_buffers
+        finally:
+            second.extensions['analytics_buffer'].close()
+            second.extensions['db_pool'].close_all()
@@ -0,0 +1,136 @@
+"""
+Tests for incremental analytics rollups in the raw SQLite app (app.py)
+"""
+
+import pytest
+
+from services.analytics_rollup import run_rollup, get_watermarks, window_counts, window_total
+
+
+@pytest.fixture
+def db_conn(sqlite_app):
+    conn = sqlite_app.extensions['db_pool'].connection()
+    yield conn
+    conn.close()
+
+
+def add_page_views(conn, rows):
+    """rows: (page_path, SQLite datetime modifier relative to now)"""
+    conn.executemany(
+        "INSERT INTO page_views (page_path, created_at) VALUES (?, datetime('now', ?))", rows
+    )
+    conn.commit()
+
+
+def raw_page_view_counts(conn, days):
+    return {
+        row[0]: row[1] for row in conn.execute(
+            "SELECT page_path, COUNT(*) FROM page_views"
+            " WHERE created_at >= datetime('now', ?) GROUP BY page_path",
+            (f'-{days} days',)
+        )
+    }
+
+
+PAGE_VIEWS = (
+    [('/', '-10 minutes')] * 5
+    + [('/moskeeen', '-3 hours')] * 3
+    + [('/moskeeen', '-2 days')] * 4
+    + [('/agenda', '-6 days')] * 2
+    + [('/agenda', '-7 days')] * 2
+    + [('/agenda', '-167 hours')]
+    + [('/oud', '-40 days')] * 6
+)
+
+
+class TestRollup:
+    """Watermarked folding of raw rows and windowed reads"""
+
+    def test_rollup_is_incremental(self, db_conn):
+        add_page_views(db_conn, PAGE_VIEWS)
+        folded = run_rollup(db_conn)
+        assert folded['page_views'] == len(PAGE_VIEWS)
+        assert get_watermarks(db_conn)['page_views'] == db_conn.execute(
+            'SELECT MAX(id) FROM page_views').fetchone()[0]
+
+        assert run_rollup(db_conn)['page_views'] == 0
+
+        add_page_views(db_conn, [('/', '-1 minutes')])
+        assert run_rollup(db_conn)['page_views'] == 1
+
+    def test_small_batches_match_single_run(self, db_conn):
+        add_page_views(db_conn, PAGE_VIEWS)
+        run_rollup(db_conn, batch_size=4)
+        daily = db_conn.execute(
+            "SELECT SUM(count) FROM analytics_rollup_daily WHERE source = 'page_views'"
+        ).fetchone()[0]
+        assert daily == len(PAGE_VIEWS)
+
+    @pytest.mark.parametrize('days', [1, 7, 30, 365])
+    def test_window_matches_raw_counts(self, db_conn, days):
+        add_page_views(db_conn, PAGE_VIEWS)
+        run_rollup(db_conn)
+        # Rows after the watermark are read from the raw table
+        add_page_views(db_conn, [('/', '-5 minutes'), ('/nieuw', '-1 minutes')])
+
+        counts = {row['key']: row['count'] for row in window_counts(db_conn, 'page_views', days)}
+        expected = raw_page_view_counts(db_conn, days)
+        # Hourly buckets round the window start down to the hour, so rows
+        # right at the 7 day edge (/agenda) may be included
+        for path, count in expected.items():
+            assert counts[path] >= count
+        assert {path: count for path, count in counts.items() if path != '/agenda'} == \
+            {path: count for path, count in expected.items() if path != '/agenda'}
+        assert window_total(db_conn, 'page_views', days) == sum(counts.values())
+
+    def test_watermark_read_in_the_same_statement(self, db_conn):
+        add_page_views(db_conn, PAGE_VIEWS)
+        run_rollup(db_conn)
+        statements = []
+        db_conn.set_trace_callback(statements.append)
+        try:
+            total = window_total(db_conn, 'page_views', 30)
+        finally:
+            db_conn.set_trace_callback(None)
+        # A rollup committing between a separate watermark read and the
+        # window query would count the raw tail twice
+        assert len(statements) == 1
+        assert total == len(PAGE_VIEWS) - 6
+
+    def test_daily_stats(self, db_conn):
+        add_page_views(db_conn, [('/', '-2 days')] * 3)
+        run_rollup(db_conn)
+        add_page_views(db_conn, [('/', '-2 days')])
+
+        days = window_counts(db_conn, 'page_views', 30, group_by='day')
+        expected = db_conn.execute("SELECT date('now', '-2 days')").fetchone()[0]
+        assert [(row['key'], row['count']) for row in days] == [(expected, 4)]
+
+
+class TestSummaryEndpoints:
+    """Dashboard endpoints read from the rollups"""
+
+    def test_summary_and_overview(self, sqlite_app, sqlite_client, sqlite_admin_headers, db_conn):
+        add_page_views(db_conn, PAGE_VIEWS)
+        db_conn.executemany(
+            "INSERT INTO analytics_events (event_type, mosque_id) VALUES (?, ?)",
+            [('donation_click', 1), ('donation_click', 2), ('share', None)]
+        )
+        db_conn.commit()
+        result = sqlite_app.test_cli_runner().invoke(args=['rollup-analytics'])
+        assert f'page_views: {len(PAGE_VIEWS)} rows rolled up' in result.output
+        add_page_views(db_conn, [('/', '-1 minutes')])
+
+        summary = sqlite_client.get('/api/analytics/summary?days=3', headers=sqlite_admin_headers).get_json()
+        assert summary['page_views'] == [
+            {'page_path': '/moskeeen', 'views': 7},
+            {'page_path': '/', 'views': 6},
+        ]
+        assert summary['events'] == [
+            {'event_type': 'donation_click', 'count': 2},
+            {'event_type': 'share', 'count': 1},
+        ]
+        assert sum(day['page_views'] for day in summary['daily_stats']) == 13
+
+        overview = sqlite_client.get('/api/analytics/reports?days=3', headers=sqlite_admin_headers).get_json()
+        assert overview['total_page_views'] == 13
@@ -0,0 +1,128 @@
+"""
+Tests for the pooled SQLite connection manager used by app.py
+"""
+
+import threading
+
+import pytest
+
+from db_pool import SQLiteConnectionPool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    """Create a pool against a temporary database"""
+    pool = SQLiteConnectionPool(str(tmp_path / 'pool.db'), max_idle=2)
+    yield pool
+    pool.close_all()
+
+
+class TestSQLiteConnectionPool:
+    """Connection reuse, PRAGMA tuning and statistics"""
+
+    def test_pragmas_applied(self, pool):
+        conn = pool.connection()
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+        assert conn.execute('PRAGMA cache_size').fetchone()[0] == -16000
+        conn.close()
+
+    def test_connection_reused_after_close(self, pool):
+        first = pool.connection()
+        raw = first.raw
+        first.close()
+
+        second = pool.connection()
+        assert second.raw is raw
+        second.close()
+
+        stats = pool.get_stats()
+        assert stats['connections_created'] == 1
+        assert stats['connections_reused'] == 1
+        assert stats['idle'] == 1
+        assert stats['in_use'] == 0
+
+    def test_nested_acquire_shares_thread_connection(self, pool):
+        outer = pool.connection()
+        inner = pool.connection()
+        assert inner.raw is outer.raw
+
+        inner.close()
+        assert pool.get_stats()['in_use'] == 1
+        outer.close()
+        assert pool.get_stats()['in_use'] == 0
+
+    def test_uncommitted_work_rolled_back_on_release(self, pool):
+        conn = pool.connection()
+        conn.execute('CREATE TABLE items (id INTEGER PRIMARY KEY)')
+        conn.commit()
+        conn.execute('INSERT INTO items DEFAULT VALUES')
+        conn.close()
+
+        conn = pool.connection()
+        assert conn.execute('SELECT COUNT(*) FROM items').fetchone()[0] == 0
+        conn.close()
+        assert pool.get_stats()['rollbacks_on_release'] == 1
+
+    def test_threads_get_separate_connections(self, pool):
+        held = pool.connection()
+        seen = []
+
+        def worker():
+            conn = pool.connection()
+            seen.append(conn.raw)
+            conn.close()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+
+        assert seen[0] is not held.raw
+        held.close()
+
+    def test_idle_pool_is_bounded(self, pool):
+        conns = []
+        for _ in range(3):
+            # Acquire on separate threads so each gets its own connection
+            def worker():
+                conns.append(pool.acquire())
+            thread = threading.Thread(target=worker)
+            thread.start()
+            thread.join()
+
+        for conn in conns:
+            pool._return_to_idle(conn)
+
+        stats = pool.get_stats()
+        assert stats['idle'] == 2
+        assert stats['connections_closed'] == 1
+
+
+    def test_detached_connection_survives_teardown(self, pool):
+        detached = pool.detached_connection()
+        pool.release_thread()
+        assert pool.get_stats()['in_use'] == 1
+
+        other = pool.connection()
+        assert other.raw is not detached.raw
+        other.close()
+
+        detached.close()
+        stats = pool.get_stats()
+        assert stats['in_use'] == 0
+        assert stats['idle'] == 2
+
+
+class TestAppIntegration:
+    """app.py uses the pool for every helper"""
+
+    def test_requests_reuse_connections(self, sqlite_app, sqlite_client):
+        for _ in range(5):
+            assert sqlite_client.get('/api/mosques').status_code == 200
+
+        response = sqlite_client.get('/health/db')
+        assert response.status_code == 200
+        pool = response.get_json()['pool']
+        assert pool['connections_created'] <= 2
+        assert pool['connections_reused'] >= 5
+        assert pool['in_use'] == 0
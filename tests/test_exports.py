@@ -0,0 +1,147 @@
+"""
+Tests for streaming exports in the raw SQLite app (app.py)
+"""
+
+import csv
+import io
+import json
+import threading
+
+import pytest
+
+from services.exports import build_export_query, iter_csv, iter_json_array
+
+
+@pytest.fixture
+def db_conn(sqlite_app):
+    conn = sqlite_app.extensions['db_pool'].connection()
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def donations(db_conn):
+    db_conn.executemany(
+        "INSERT INTO donations (donor_name, amount, mosque_id, status, created_at) VALUES (?, ?, ?, 'completed', ?)",
+        [(f'Donor {i}', 10 + i, 1 + i % 2, f'2025-0{1 + i % 3}-15 12:00:00') for i in range(30)]
+        + [('=HYPERLINK("x")', 5, 1, '2025-02-01 08:00:00')]
+    )
+    db_conn.commit()
+
+
+class TestEncoders:
+    """Chunked encoders produce the same output as encoding everything at once"""
+
+    def test_csv_chunks(self, db_conn, donations):
+        sql, params = build_export_query('donations')
+        chunks = list(iter_csv(db_conn.execute(sql, params), chunk_size=7))
+        assert len(chunks) > 4
+
+        rows = list(csv.DictReader(io.StringIO(''.join(chunks))))
+        expected = db_conn.execute('SELECT COUNT(*) FROM donations').fetchone()[0]
+        assert len(rows) == expected
+        assert "'=HYPERLINK(\"x\")" in [row['donor_name'] for row in rows]
+
+    def test_csv_without_rows_has_header(self, db_conn):
+        sql, params = build_export_query('page_views')
+        assert ''.join(iter_csv(db_conn.execute(sql, params))).splitlines() == [
+            'id,created_at,page_path,user_id,session_id,referrer,user_agent'
+        ]
+
+    def test_json_array(self, db_conn, donations):
+        cursor = db_conn.execute('SELECT id, donor_name FROM donations ORDER BY id')
+        rows = json.loads(''.join(iter_json_array(cursor, chunk_size=4)))
+        assert [row['id'] for row in rows] == [
+            row[0] for row in db_conn.execute('SELECT id FROM donations ORDER BY id')
+        ]
+        assert json.loads(''.join(iter_json_array(db_conn.execute('SELECT 1 WHERE 0')))) == []
+
+    def test_page_views_reject_mosque_filter(self):
+        with pytest.raises(ValueError):
+            build_export_query('page_views', mosque_id=1)
+
+
+class TestExportEndpoint:
+    """/api/exports/<dataset> streams filtered rows"""
+
+    def test_filtered_ndjson(self, sqlite_client, sqlite_admin_headers, donations):
+        response = sqlite_client.get(
+            '/api/exports/donations?format=ndjson&date_from=2025-02-01&date_to=2025-02-28&mosque_id=1',
+            headers=sqlite_admin_headers
+        )
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        assert 'donations-2025-02-01-2025-02-28.ndjson' in response.headers['Content-Disposition']
+        assert response.is_streamed
+
+        rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert rows
+        assert all(row['mosque_id'] == 1 and row['created_at'].startswith('2025-02') for row in rows)
+        assert [row['created_at'] for row in rows] == sorted(row['created_at'] for row in rows)
+
+    def test_users_csv(self, sqlite_client, sqlite_admin_headers, db_conn):
+        db_conn.execute("INSERT INTO user_activity (user_id, activity_type) VALUES (1, 'login')")
+        db_conn.commit()
+        response = sqlite_client.get('/api/exports/users', headers=sqlite_admin_headers)
+        assert response.mimetype == 'text/csv'
+        rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+        admin = next(row for row in rows if row['id'] == '1')
+        assert admin['activity_count'] == '1'
+        assert 'password_hash' not in admin
+
+    @pytest.mark.parametrize('url', [
+        '/api/exports/mosques',
+        '/api/exports/donations?format=xml',
+        '/api/exports/donations?date_from=yesterday',
+        '/api/exports/page_views?mosque_id=1',
+    ])
+    def test_invalid_requests(self, sqlite_client, sqlite_admin_headers, url):
+        assert sqlite_client.get(url, headers=sqlite_admin_headers).status_code == 400
+
+    def test_requires_admin(self, sqlite_client):
+        assert sqlite_client.get('/api/exports/donations').status_code == 401
+
+    def test_donation_listing_is_streamed(self, sqlite_client, sqlite_admin_headers, donations):
+        response = sqlite_client.get('/api/donations', headers=sqlite_admin_headers)
+        assert response.is_streamed
+        rows = response.get_json()
+        assert len(rows) >= 31
+        assert rows[0]['created_at'] >= rows[-1]['created_at']
+
+    def test_stream_keeps_its_connection(self, sqlite_app, sqlite_client, sqlite_admin_headers):
+        pool = sqlite_app.extensions['db_pool']
+        conn = pool.dedicated_connection()
+        conn.executemany(
+            "INSERT INTO donations (donor_name, amount, mosque_id, status) VALUES ('Donor', 10, 1, 'completed')",
+            [()] * 2500
+        )
+        conn.commit()
+        conn.close()
+        with sqlite_client.get('/api/exports/donations', headers=sqlite_admin_headers) as complete:
+            expected = len(complete.get_data(as_text=True).splitlines())
+
+        response = sqlite_client.get('/api/exports/donations', headers=sqlite_admin_headers, buffered=False)
+        chunks = iter(response.response)
+        body = [next(chunks)]
+        # Request teardown has run; the streaming connection is still checked out
+        stats = pool.get_stats()
+        assert stats['in_use'] == 1 and stats['idle'] == 0
+
+        created = stats['connections_created']
+        other = {}
+
+        def acquire():
+            conn = pool.connection()
+            other['count'] = conn.execute('SELECT COUNT(*) FROM donations').fetchone()[0]
+            conn.close()
+
+        thread = threading.Thread(target=acquire)
+        thread.start()
+        thread.join()
+        assert other['count'] >= 2500
+        assert pool.get_stats()['connections_created'] == created + 1
+
+        body.extend(chunks)
+        response.close()
+        assert len(b''.join(body).decode().splitlines()) == expected
+        assert pool.get_stats()['in_use'] == 0
@@ -0,0 +1,98 @@
+"""
+Tests for conditional requests on the public list endpoints of the raw SQLite app (app.py)
+"""
+
+import pytest
+
+from services.resource_versions import get_validators
+
+
+@pytest.fixture
+def db_conn(sqlite_app):
+    conn = sqlite_app.extensions['db_pool'].connection()
+    yield conn
+    conn.close()
+
+
+def revalidate(client, url, response):
+    return client.get(url, headers={'If-None-Match': response.headers['ETag']})
+
+
+class TestValidators:
+    """Writes to a resource's tables change its validators"""
+
+    @pytest.mark.parametrize('resource, statement', [
+        ('mosques', "UPDATE mosques SET phone = '000' WHERE id = 1"),
+        ('events', "UPDATE mosques SET name = 'Nieuwe naam' WHERE id = 1"),
+        ('news', "UPDATE users SET first_name = 'Admin2' WHERE id = 1"),
+        ('campaigns', "DELETE FROM campaigns WHERE id = 1"),
+        ('files', "INSERT INTO media_files (filename, original_filename, file_path, file_size, file_type, mime_type)"
+                  " VALUES ('a', 'a', '/tmp/a', 1, 'txt', 'text/plain')"),
+    ])
+    def test_write_changes_etag(self, db_conn, resource, statement):
+        before = get_validators(db_conn, resource)
+        db_conn.execute(statement)
+        db_conn.commit()
+        assert get_validators(db_conn, resource)[0] != before[0]
+
+    def test_unrelated_write_keeps_etag(self, db_conn):
+        before = get_validators(db_conn, 'news')
+        db_conn.execute("UPDATE users SET phone = '0470' WHERE id = 1")
+        db_conn.execute("UPDATE mosques SET phone = '000' WHERE id = 1")
+        db_conn.commit()
+        assert get_validators(db_conn, 'news') == before
+
+    def test_rolled_back_write_keeps_etag(self, db_conn):
+        before = get_validators(db_conn, 'mosques')
+        db_conn.execute("UPDATE mosques SET phone = '000' WHERE id = 1")
+        db_conn.rollback()
+        assert get_validators(db_conn, 'mosques') == before
+
+
+class TestConditionalRequests:
+    """304 handling and cache directives"""
+
+    @pytest.mark.parametrize('url', ['/api/mosques', '/api/events', '/api/news', '/api/campaigns', '/api/files'])
+    def test_if_none_match(self, sqlite_client, url):
+        response = sqlite_client.get(url)
+        assert response.status_code == 200
+        assert response.headers['ETag'].startswith('"')
+        assert response.headers['Last-Modified']
+        cache_control = response.headers['Cache-Control']
+        assert 'public' in cache_control
+        assert 'max-age=60' in cache_control
+        assert 'stale-while-revalidate=300' in cache_control
+
+        cached = revalidate(sqlite_client, url, response)
+        assert cached.status_code == 304
+        assert cached.data == b''
+        assert cached.headers['ETag'] == response.headers['ETag']
+
+    def test_write_invalidates(self, sqlite_client, db_conn):
+        response = sqlite_client.get('/api/mosques')
+        db_conn.execute("UPDATE mosques SET phone = '000' WHERE id = 1")
+        db_conn.commit()
+
+        fresh = revalidate(sqlite_client, '/api/mosques', response)
+        assert fresh.status_code == 200
+        assert fresh.headers['ETag'] != response.headers['ETag']
+        assert any(mosque['phone'] == '000' for mosque in fresh.get_json())
+
+    def test_if_modified_since(self, sqlite_client):
+        response = sqlite_client.get('/api/events')
+        since = {'If-Modified-Since': response.headers['Last-Modified']}
+        assert sqlite_client.get('/api/events', headers=since).status_code == 304
+
+        # If-None-Match takes precedence over If-Modified-Since
+        mismatch = dict(since, **{'If-None-Match': '"other"'})
+        assert sqlite_client.get('/api/events', headers=mismatch).status_code == 200
+
+    def test_campaign_detail(self, sqlite_client):
+        response = sqlite_client.get('/api/campaigns/1')
+        assert response.status_code == 200
+        # A 404 from the view is not given validators
+        missing = sqlite_client.get('/api/campaigns/999')
+        assert missing.status_code == 404
+        assert 'ETag' not in missing.headers
+
+        assert revalidate(sqlite_client, '/api/campaigns/1', response).status_code == 304
@@ -0,0 +1,133 @@
+"""
+Tests for the iCalendar subscription feeds (services/ics_feeds.py)
+"""
+
+import os
+from datetime import date, time
+
+import pytest
+
+from models import db, Event, IfterEvent, Mosque
+from services.iftar_recurrence import RecurrenceRule
+from services.ics_feeds import CalendarFeeds, escape_text, fold, iftar_vevent
+
+
+@pytest.fixture
+def mosques(legacy_db):
+    rows = [
+        Mosque(name='Moskee Ensar', address='Gent', latitude=51.05, longitude=3.72),
+        Mosque(name='Moskee Tevhid', address='Gent'),
+    ]
+    legacy_db.session.add_all(rows)
+    legacy_db.session.commit()
+    return rows
+
+
+def add(row):
+    db.session.add(row)
+    db.session.commit()
+    return row
+
+
+def unfolded(body):
+    return body.replace('\r\n ', '').split('\r\n')
+
+
+def read(feeds, mosque_id=None):
+    etag = feeds.etag(mosque_id)
+    path = feeds.cached(mosque_id, etag)
+    if path:
+        with open(path, 'rb') as file:
+            return file.read().decode('utf-8')
+    return b''.join(feeds.stream(mosque_id, etag)).decode('utf-8')
+
+
+class TestContentLines:
+    """Escaping and line folding"""
+
+    def test_escape(self):
+        assert escape_text('Iftar; soep, dadels\\\nwater') == 'Iftar\\; soep\\, dadels\\\\\\nwater'
+
+    def test_fold(self):
+        line = 'DESCRIPTION:' + 'é' * 100
+        folded = fold(line)
+        parts = folded[:-2].split('\r\n')
+        assert all(len(part.encode('utf-8')) <= 75 for part in parts)
+        assert all(part.startswith(' ') for part in parts[1:])
+        assert ''.join(part[1:] if i else part for i, part in enumerate(parts)) == line
+        assert fold('SUMMARY:Iftar') == 'SUMMARY:Iftar\r\n'
+
+    def test_rrule(self):
+        assert RecurrenceRule.parse('weekdays').to_rrule() == 'FREQ=DAILY;BYDAY=MO,TU,WE,TH,FR'
+        assert RecurrenceRule.parse('FREQ=WEEKLY;INTERVAL=2;BYDAY=FR,MO').to_rrule() == \
+            'FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,FR'
+
+
+class TestIftarEvents:
+    """Recurring iftars become one VEVENT with an RRULE"""
+
+    def test_recurring(self, mosques):
+        # 2025-03-05 is a Wednesday; the series starts on the first Friday
+        event = add(IfterEvent(mosque_id=mosques[0].id, date=date(2025, 3, 5), start_time=time(19, 0),
+                               end_time=time(21, 0), is_recurring=True, recurrence_type='fridays',
+                               recurrence_end_date=date(2025, 3, 28), recurrence_exdates='2025-03-14'))
+        lines = unfolded(iftar_vevent(event))
+        assert 'DTSTART;TZID=Europe/Brussels:20250307T190000' in lines
+        assert 'DTEND;TZID=Europe/Brussels:20250307T210000' in lines
+        assert 'RRULE:FREQ=WEEKLY;BYDAY=FR;UNTIL=20250328T235959Z' in lines
+        assert 'EXDATE;TZID=Europe/Brussels:20250314T190000' in lines
+        assert 'GEO:51.05;3.72' in lines
+
+    def test_single_and_unsupported(self, mosques):
+        single = add(IfterEvent(mosque_id=mosques[1].id, date=date(2025, 3, 5), start_time=time(19, 0)))
+        lines = unfolded(iftar_vevent(single))
+        assert 'DURATION:PT2H' in lines
+        assert not any(line.startswith(('RRULE', 'GEO')) for line in lines)
+
+        monthly = add(IfterEvent(mosque_id=mosques[1].id, date=date(2025, 3, 5), start_time=time(19, 0),
+                                 is_recurring=True, recurrence_type='FREQ=MONTHLY'))
+        lines = unfolded(iftar_vevent(monthly))
+        assert 'DTSTART;TZID=Europe/Brussels:20250305T190000' in lines
+        assert not any(line.startswith('RRULE') for line in lines)
+
+
+class TestCalendarFeeds:
+    """Feeds are generated once per calendar version and scope"""
+
+    def test_cached_until_write(self, mosques, tmp_path):
+        add(Event(mosque_id=mosques[0].id, title='Lezing, met thee', event_date=date(2025, 3, 2),
+                  event_time=time(14, 0), is_recurring=True, recurring_pattern='weekly'))
+        feeds = CalendarFeeds(db, str(tmp_path))
+
+        body = read(feeds)
+        lines = unfolded(body)
+        assert lines[0] == 'BEGIN:VCALENDAR' and lines[-2] == 'END:VCALENDAR'
+        assert 'SUMMARY:Lezing\\, met thee' in lines
+        assert 'RRULE:FREQ=WEEKLY' in lines
+        assert read(feeds) == body
+        assert feeds.builds == 1
+
+        etag = feeds.etag()
+        add(IfterEvent(mosque_id=mosques[0].id, date=date(2025, 3, 5), start_time=time(19, 0)))
+        assert feeds.etag() != etag
+        assert 'UID:iftar-1@vgm.be' in unfolded(read(feeds))
+        assert feeds.builds == 2
+        assert os.listdir(tmp_path) == [f'all.{feeds.etag()}.ics']
+
+    def test_per_mosque(self, mosques, tmp_path):
+        add(Event(mosque_id=mosques[0].id, title='Ensar', event_date=date(2025, 3, 2), event_time=time(14, 0)))
+        add(Event(mosque_id=mosques[1].id, title='Tevhid', event_date=date(2025, 3, 2), event_time=time(14, 0)))
+        feeds = CalendarFeeds(db, str(tmp_path))
+
+        lines = unfolded(read(feeds, mosques[1].id))
+        assert 'X-WR-CALNAME:Moskee Tevhid' in lines
+        assert [line for line in lines if line.startswith('SUMMARY')] == ['SUMMARY:Tevhid']
+        assert feeds.etag(mosques[0].id) != feeds.etag(mosques[1].id)
+
+    def test_interrupted_stream_is_discarded(self, mosques, tmp_path):
+        feeds = CalendarFeeds(db, str(tmp_path))
+        stream = feeds.stream(None, feeds.etag())
+        next(stream)
+        stream.close()
+        assert os.listdir(tmp_path) == []
+        assert feeds.cached(None, feeds.etag()) is None
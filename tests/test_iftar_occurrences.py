@@ -0,0 +1,137 @@
+"""
+Tests for the materialised iftar occurrences (services/iftar_occurrences.py)
+and the iftar map feed built on them (services/iftar_map_feed.py)
+"""
+
+import json
+from datetime import date, time
+
+import pytest
+
+from models import db, IfterEvent, IfterOccurrence, Mosque
+from services.ifter_calendar import IfterCalendar
+from services.iftar_map_feed import IftarMapFeed
+from services.iftar_occurrences import rebuild_occurrences
+
+
+@pytest.fixture
+def mosque(legacy_db):
+    mosque = Mosque(name='Moskee Ensar', address='Gent', latitude=51.05, longitude=3.72)
+    legacy_db.session.add(mosque)
+    legacy_db.session.commit()
+    return mosque
+
+
+def add_event(mosque, **fields):
+    values = dict(mosque_id=mosque.id, date=date(2025, 3, 1), start_time=time(19, 0), location='Zaal')
+    values.update(fields)
+    event = IfterEvent(**values)
+    db.session.add(event)
+    db.session.commit()
+    return event
+
+
+def stored_dates(event_id):
+    return [row.date for row in IfterOccurrence.query.filter_by(event_id=event_id).order_by(IfterOccurrence.date)]
+
+
+class TestOccurrenceMaintenance:
+    """Rows follow every create, edit and delete"""
+
+    def test_create(self, mosque):
+        single = add_event(mosque, date=date(2025, 3, 4))
+        fridays = add_event(mosque, is_recurring=True, recurrence_type='fridays',
+                            recurrence_end_date=date(2025, 3, 29), recurrence_exdates='2025-03-14')
+        assert stored_dates(single.id) == [date(2025, 3, 4)]
+        assert stored_dates(fridays.id) == [date(2025, 3, 7), date(2025, 3, 21), date(2025, 3, 28)]
+
+    def test_edit(self, mosque):
+        event = add_event(mosque, is_recurring=True, recurrence_type='weekly', recurrence_end_date=date(2025, 3, 29))
+        event.recurrence_type = 'daily'
+        event.is_family_friendly = False
+        db.session.commit()
+        rows = IfterOccurrence.query.filter_by(event_id=event.id).all()
+        assert len(rows) == 29
+        assert not any(row.is_family_friendly for row in rows)
+
+        # Changes that do not move dates keep the rows
+        ids = {row.id for row in rows}
+        event.location = 'Tuin'
+        db.session.commit()
+        assert {row.id for row in IfterOccurrence.query.filter_by(event_id=event.id)} == ids
+
+    def test_delete(self, mosque):
+        event = add_event(mosque, is_recurring=True, recurrence_type='daily')
+        db.session.delete(event)
+        db.session.commit()
+        assert IfterOccurrence.query.count() == 0
+
+    def test_rebuild(self, mosque):
+        event = add_event(mosque, is_recurring=True, recurrence_type='weekdays', recurrence_end_date=date(2025, 3, 9))
+        IfterOccurrence.query.delete()
+        db.session.commit()
+        assert rebuild_occurrences(db.session) == 5
+        assert stored_dates(event.id) == [date(2025, 3, day) for day in (3, 4, 5, 6, 7)]
+
+
+class TestCalendarFromOccurrences:
+    """The calendar reads the stored rows"""
+
+    def test_period_and_filters(self, mosque, legacy_db):
+        add_event(mosque, is_recurring=True, recurrence_type='daily', recurrence_end_date=date(2025, 3, 30),
+                  start_time=time(19, 30))
+        add_event(mosque, date=date(2025, 3, 5), start_time=time(18, 45), is_family_friendly=False)
+
+        calendar = IfterCalendar(legacy_db)
+        events = calendar.get_events_for_period(date(2025, 3, 5), date(2025, 3, 6))
+        assert [(event['date'].day, event['type']) for event in events] == [(5, 'single'), (5, 'daily'), (6, 'daily')]
+        assert events[0]['mosque_name'] == 'Moskee Ensar'
+
+        family = calendar.get_events_for_period(date(2025, 3, 5), date(2025, 3, 6), family_only=True)
+        assert len(family) == 2
+        single = calendar.get_events_for_period(date(2025, 3, 1), date(2025, 3, 31), event_type='single')
+        assert [event['date'] for event in single] == [date(2025, 3, 5)]
+
+
+class TestIftarMapFeed:
+    """Feeds are cached per filter combination until the next write"""
+
+    KEY = (date(2025, 3, 1), date(2025, 3, 7), None, False)
+
+    def test_geojson(self, mosque, legacy_db):
+        add_event(mosque, is_recurring=True, recurrence_type='daily', recurrence_end_date=date(2025, 3, 2))
+        etag, body = IftarMapFeed(legacy_db).get(self.KEY)
+        feed = json.loads(body)
+        assert feed['type'] == 'FeatureCollection'
+        assert [feature['properties']['date'] for feature in feed['features']] == ['2025-03-01', '2025-03-02']
+        assert feed['features'][0]['geometry'] == {'type': 'Point', 'coordinates': [3.72, 51.05]}
+        assert feed['features'][0]['properties']['start_time'] == '19:00'
+
+    def test_cached_until_write(self, mosque, legacy_db):
+        event = add_event(mosque)
+        feed = IftarMapFeed(legacy_db)
+        etag, body = feed.get(self.KEY)
+        assert feed.get(self.KEY) == (etag, body)
+        assert feed.builds == 1
+
+        # Other filters are separate entries
+        feed.get((date(2025, 3, 1), date(2025, 3, 7), mosque.id, True))
+        assert feed.builds == 2
+
+        event.location = 'Tuin'
+        db.session.commit()
+        assert feed.etag(self.KEY) != etag
+        new_etag, new_body = feed.get(self.KEY)
+        assert json.loads(new_body)['features'][0]['properties']['location'] == 'Tuin'
+        assert feed.builds == 3
+
+        mosque.name = 'Moskee Tevhid'
+        db.session.commit()
+        assert feed.etag(self.KEY) != new_etag
+
+    def test_eviction(self, mosque, legacy_db):
+        feed = IftarMapFeed(legacy_db, max_entries=1)
+        feed.get(self.KEY)
+        feed.get((date(2025, 3, 1), date(2025, 3, 1), None, False))
+        feed.get(self.KEY)
+        assert feed.builds == 3
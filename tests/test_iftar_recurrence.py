@@ -0,0 +1,109 @@
+"""
+Tests for iftar recurrence expansion (services/iftar_recurrence.py)
+"""
+
+from datetime import date, time, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from services.ifter_calendar import IfterCalendar
+from services.iftar_recurrence import RecurrenceRule, event_occurrences, parse_exdates
+
+
+def make_event(start, recurrence_type='daily', until=None, exdates=None, is_recurring=True):
+    return SimpleNamespace(
+        id=1, mosque_id=3, mosque=SimpleNamespace(name='Moskee Ensar', latitude=51.05, longitude=3.72),
+        date=start, start_time=time(19, 0), end_time=None, location='Zaal',
+        is_family_friendly=True, registration_required=False, capacity=80,
+        is_recurring=is_recurring, recurrence_type=recurrence_type,
+        recurrence_end_date=until, recurrence_exdates=exdates,
+    )
+
+
+def brute_force(rule, start, window_start, window_end):
+    """Every date from the start, kept when the rule matches it"""
+    dates = []
+    day = start
+    while day <= window_end:
+        weeks = (day - (start - timedelta(days=start.weekday()))).days // 7
+        if rule.freq == 'DAILY':
+            matches = (day - start).days % rule.interval == 0
+            matches = matches and (rule.weekdays is None or day.weekday() in rule.weekdays)
+        else:
+            weekdays = rule.weekdays or {start.weekday()}
+            matches = weeks % rule.interval == 0 and day.weekday() in weekdays
+        if matches and day >= window_start and (rule.until is None or day <= rule.until) \
+                and day not in rule.exdates:
+            dates.append(day)
+        day += timedelta(days=1)
+    return dates
+
+
+class TestRecurrenceRule:
+    """Named patterns and the RRULE subset"""
+
+    def test_window_is_clipped(self):
+        rule = RecurrenceRule.parse('daily')
+        dates = list(rule.occurrences(date(2015, 1, 1), date(2025, 3, 1), date(2025, 3, 3)))
+        assert dates == [date(2025, 3, 1), date(2025, 3, 2), date(2025, 3, 3)]
+
+    def test_weekdays(self):
+        dates = list(RecurrenceRule.parse('weekdays').occurrences(
+            date(2025, 3, 1), date(2025, 3, 1), date(2025, 3, 9)))
+        assert [day.weekday() for day in dates] == [0, 1, 2, 3, 4]
+
+    def test_fridays_of_ramadan(self):
+        rule = RecurrenceRule.parse('FREQ=WEEKLY;BYDAY=FR;UNTIL=20250329', exdates=[date(2025, 3, 14)])
+        dates = list(rule.occurrences(date(2025, 3, 1), date(2025, 1, 1), date(2025, 12, 31)))
+        assert dates == [date(2025, 3, 7), date(2025, 3, 21), date(2025, 3, 28)]
+
+    def test_interval(self):
+        rule = RecurrenceRule.parse('FREQ=DAILY;INTERVAL=3')
+        dates = list(rule.occurrences(date(2025, 3, 1), date(2025, 3, 5), date(2025, 3, 12)))
+        assert dates == [date(2025, 3, 7), date(2025, 3, 10)]
+
+    @pytest.mark.parametrize('recurrence_type', [
+        'daily', 'weekly', 'weekdays', 'weekends', 'fridays',
+        'FREQ=DAILY;INTERVAL=4;BYDAY=SA,SU', 'FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,TH', 'FREQ=WEEKLY;INTERVAL=3',
+    ])
+    def test_matches_brute_force(self, recurrence_type):
+        rule = RecurrenceRule.parse(recurrence_type, until=date(2025, 6, 30), exdates=[date(2025, 4, 3)])
+        start = date(2025, 1, 8)
+        for window_start in (date(2024, 12, 1), date(2025, 2, 17), date(2025, 4, 1)):
+            window_end = window_start + timedelta(days=45)
+            assert list(rule.occurrences(start, window_start, window_end)) == \
+                brute_force(rule, start, window_start, window_end)
+
+    @pytest.mark.parametrize('recurrence_type', ['monthly', 'FREQ=MONTHLY', 'FREQ=DAILY;COUNT=3', 'FREQ=WEEKLY;BYDAY=XX'])
+    def test_unsupported(self, recurrence_type):
+        with pytest.raises(ValueError):
+            RecurrenceRule.parse(recurrence_type)
+
+    def test_parse_exdates(self):
+        assert parse_exdates('2025-03-14, 2025-03-21,') == {date(2025, 3, 14), date(2025, 3, 21)}
+        assert parse_exdates(None) == frozenset()
+
+
+class TestIfterCalendar:
+    """Instances come from the engine, limited to the requested period"""
+
+    def test_single_event(self):
+        event = make_event(date(2025, 3, 5), is_recurring=False)
+        assert list(event_occurrences(event, date(2025, 3, 1), date(2025, 3, 31))) == [date(2025, 3, 5)]
+        assert list(event_occurrences(event, date(2025, 4, 1), date(2025, 4, 30))) == []
+
+    def test_default_span(self):
+        instances = list(IfterCalendar(db=None).generate_event_instances(make_event(date(2025, 3, 1))))
+        assert len(instances) == 31
+        assert instances[0]['mosque_name'] == 'Moskee Ensar'
+
+    def test_window_and_exdates(self):
+        event = make_event(date(2020, 3, 1), until=date(2030, 1, 1), exdates='2025-03-02')
+        instances = IfterCalendar(db=None).generate_event_instances(event, date(2025, 3, 1), date(2025, 3, 3))
+        assert [instance['date'] for instance in instances] == [date(2025, 3, 1), date(2025, 3, 3)]
+
+    def test_unknown_pattern_keeps_first_date(self):
+        event = make_event(date(2025, 3, 1), recurrence_type='monthly')
+        instances = list(IfterCalendar(db=None).generate_event_instances(event))
+        assert [instance['date'] for instance in instances] == [date(2025, 3, 1)]
@@ -0,0 +1,110 @@
+"""
+Tests for server-side map clustering (services/map_clusters.py)
+"""
+
+from datetime import date, time
+
+import pytest
+
+from models import db, IfterEvent, Mosque
+from services.map_clusters import GridClusters, MapClusters, parse_bounds
+
+# Two mosques in Gent about 500 m apart, one in Antwerp
+GENT_A = (51.0543, 3.7174)
+GENT_B = (51.0538, 3.7251)
+ANTWERP = (51.2194, 4.4025)
+
+
+def points(*positions):
+    return [(lat, lng, {'id': i}) for i, (lat, lng) in enumerate(positions)]
+
+
+class TestGridClusters:
+    """Grid clustering per zoom level"""
+
+    def test_zoom_levels(self):
+        clusters = GridClusters(points(GENT_A, GENT_B, ANTWERP))
+        assert [cluster['count'] for cluster in clusters.clusters(5)] == [3]
+        assert sorted(cluster['count'] for cluster in clusters.clusters(10)) == [1, 2]
+        assert [cluster['count'] for cluster in clusters.clusters(16)] == [1, 1, 1]
+
+    def test_cluster_shape(self):
+        cluster = GridClusters(points(GENT_A, GENT_B, ANTWERP)).clusters(5)[0]
+        assert cluster['latitude'] == pytest.approx((GENT_A[0] + GENT_B[0] + ANTWERP[0]) / 3)
+        assert cluster['bounds'] == [GENT_A[1], GENT_B[0], ANTWERP[1], ANTWERP[0]]
+        assert len(cluster['items']) == 3
+
+    def test_representatives_are_capped(self):
+        cluster = GridClusters(points(*[GENT_A] * 10)).clusters(20)[0]
+        assert cluster['count'] == 10
+        assert [item['id'] for item in cluster['items']] == [0, 1, 2]
+
+    def test_bounds(self):
+        clusters = GridClusters(points(GENT_A, ANTWERP, (0, 179.5), (0, -179.5)))
+        assert [c['count'] for c in clusters.clusters(12, (3.5, 50.9, 4.0, 51.2))] == [1]
+        across = clusters.clusters(12, (179, -1, -179, 1))
+        assert sorted(c['longitude'] for c in across) == [-179.5, 179.5]
+
+    @pytest.mark.parametrize('value', ['1,2,3', '4,52,3,51', 'a,b,c,d', '0,0,200,1'])
+    def test_parse_bounds(self, value):
+        with pytest.raises(ValueError):
+            parse_bounds(value)
+
+
+@pytest.fixture
+def mosques(legacy_db):
+    rows = [
+        Mosque(name='Moskee Ensar', address='Gent', latitude=GENT_A[0], longitude=GENT_A[1]),
+        Mosque(name='Moskee Tevhid', address='Gent', latitude=GENT_B[0], longitude=GENT_B[1]),
+    ]
+    legacy_db.session.add_all(rows)
+    legacy_db.session.commit()
+    return rows
+
+
+class TestMapClusters:
+    """Point sets are cached until a mosque or iftar changes"""
+
+    KEY = ('iftars', date(2025, 3, 1), date(2025, 3, 30), None, False)
+
+    def test_iftars_invalidated_by_writes(self, legacy_db, mosques):
+        db.session.add(IfterEvent(mosque_id=mosques[0].id, date=date(2025, 3, 1), start_time=time(19, 0),
+                                  is_recurring=True, recurrence_type='daily', recurrence_end_date=date(2025, 3, 10)))
+        db.session.commit()
+
+        cache = MapClusters(legacy_db)
+        version = cache.version(self.KEY)
+        clusters = cache.get(self.KEY).clusters(14)
+        assert [cluster['count'] for cluster in clusters] == [10]
+        assert clusters[0]['items'][0]['mosque_name'] == 'Moskee Ensar'
+        assert cache.get(self.KEY) is cache.get(self.KEY)
+        assert cache.builds == 1
+
+        db.session.add(IfterEvent(mosque_id=mosques[1].id, date=date(2025, 3, 5), start_time=time(19, 0)))
+        db.session.commit()
+        assert cache.version(self.KEY) != version
+        assert sorted(c['count'] for c in cache.get(self.KEY).clusters(14)) == [1, 10]
+        assert cache.builds == 2
+
+    def test_mosques_layer(self, legacy_db, mosques):
+        cache = MapClusters(legacy_db)
+        key = ('mosques', None, None, None, False)
+        assert [cluster['count'] for cluster in cache.get(key).clusters(8)] == [2]
+
+        version = cache.version(key)
+        mosques[1].latitude = ANTWERP[0]
+        mosques[1].longitude = ANTWERP[1]
+        db.session.commit()
+        assert cache.version(key) != version
+        assert [cluster['count'] for cluster in cache.get(key).clusters(8)] == [1, 1]
+
+    def test_mosques_layer_sees_new_mosques(self, legacy_db, mosques):
+        cache = MapClusters(legacy_db)
+        key = ('mosques', None, None, None, False)
+        assert len(cache.get(key).clusters(20)) == 2
+
+        db.session.add(Mosque(name='Moskee Antwerpen', address='Antwerpen', latitude=ANTWERP[0],
+                              longitude=ANTWERP[1]))
+        db.session.commit()
+        assert len(cache.get(key).clusters(20)) == 3
+        assert cache.builds == 2
@@ -0,0 +1,103 @@
+"""
+Tests for the mosque location index (services/mosque_locations.py) and the
+nearby queries in the raw SQLite app (app.py)
+"""
+
+import random
+
+import pytest
+
+from services.mosque_locations import haversine_km, parse_point
+
+
+@pytest.fixture
+def db_conn(sqlite_app):
+    conn = sqlite_app.extensions['db_pool'].connection()
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def scattered_mosques(db_conn):
+    """1500 mosques spread over the globe, denser around Gent and the antimeridian"""
+    rng = random.Random(7)
+    points = [(rng.uniform(-89, 89), rng.uniform(-180, 180)) for _ in range(500)]
+    points += [(51.05 + rng.uniform(-1, 1), 3.72 + rng.uniform(-1, 1)) for _ in range(500)]
+    points += [(rng.uniform(-60, 60), rng.choice([-1, 1]) * rng.uniform(178, 180)) for _ in range(500)]
+    db_conn.executemany(
+        "INSERT INTO mosques (name, address, latitude, longitude) VALUES ('Moskee', 'Adres', ?, ?)", points
+    )
+    db_conn.commit()
+    return {row[0]: (row[1], row[2]) for row in db_conn.execute(
+        'SELECT id, latitude, longitude FROM mosques WHERE latitude IS NOT NULL AND is_active = 1'
+    )}
+
+
+class TestMosqueLocationIndex:
+    """Grid lookups match a full scan"""
+
+    @pytest.mark.parametrize('lat, lng, radius', [
+        (51.05, 3.72, 5), (51.05, 3.72, 60), (0, 179.9, 300), (10, -179.95, 150), (88, 0, 500), (-30, 20, 100),
+    ])
+    def test_matches_brute_force(self, sqlite_app, scattered_mosques, lat, lng, radius):
+        expected = sorted(
+            ((mosque_id, haversine_km(lat, lng, *point)) for mosque_id, point in scattered_mosques.items()
+             if haversine_km(lat, lng, *point) <= radius),
+            key=lambda item: (item[1], item[0])
+        )
+        assert sqlite_app.extensions['mosque_locations'].nearby(lat, lng, radius) == expected
+
+    def test_rebuilt_on_change(self, sqlite_app, db_conn):
+        index = sqlite_app.extensions['mosque_locations']
+        assert [mosque_id for mosque_id, _ in index.nearby(51.0543, 3.7174, 1)] == [1, 2, 3]
+        rebuilds = index.rebuilds
+        index.nearby(51.0543, 3.7174, 1)
+        assert index.rebuilds == rebuilds
+
+        db_conn.execute('UPDATE mosques SET is_active = 0 WHERE id = 2')
+        db_conn.commit()
+        assert [mosque_id for mosque_id, _ in index.nearby(51.0543, 3.7174, 1)] == [1, 3]
+        assert index.rebuilds == rebuilds + 1
+
+    def test_parse_point(self):
+        assert parse_point('51.05, 3.72') == (51.05, 3.72)
+        for value in ('51.05', '91,0', '0,181', 'nan,0', 'a,b'):
+            with pytest.raises(ValueError):
+                parse_point(value)
+
+
+class TestNearbyAPI:
+    """/api/mosques/nearby and /api/search?near="""
+
+    def test_nearby(self, sqlite_client):
+        response = sqlite_client.get('/api/mosques/nearby', query_string={'lat': 51.0543, 'lng': 3.7174, 'radius': 0.6})
+        assert response.status_code == 200
+        data = response.get_json()
+        assert [mosque['id'] for mosque in data['mosques']] == [1, 2]
+        assert data['mosques'][0]['distance_km'] == 0
+        assert data['mosques'][1]['name'] == 'Moskee Al-Fath'
+
+        limited = sqlite_client.get('/api/mosques/nearby', query_string={'lat': 51.0543, 'lng': 3.7174, 'limit': 1})
+        assert [mosque['id'] for mosque in limited.get_json()['mosques']] == [1]
+
+    @pytest.mark.parametrize('params', [{'lat': 51}, {'lat': 95, 'lng': 3}, {'lat': 51, 'lng': 3, 'radius': 0},
+                                        {'lat': 51, 'lng': 3, 'radius': 5000}])
+    def test_nearby_validation(self, sqlite_client, params):
+        assert sqlite_client.get('/api/mosques/nearby', query_string=params).status_code == 400
+
+    def test_search_near(self, sqlite_client):
+        response = sqlite_client.get('/api/search', query_string={
+            'near': '51.0538,3.7251', 'radius': 0.7, 'sort': 'distance'
+        })
+        assert response.status_code == 200
+        results = response.get_json()
+        assert [mosque['id'] for mosque in results['mosques']] == [2, 1]
+        assert results['mosques'][0]['distance_km'] == 0
+        assert all(event['mosque_id'] in (1, 2) for event in results['events'])
+        assert all(campaign['mosque_id'] in (1, 2) for campaign in results['campaigns'])
+
+        far = sqlite_client.get('/api/search', query_string={'near': '50.0,5.0', 'radius': 1}).get_json()
+        assert far['mosques'] == far['events'] == far['campaigns'] == []
+
+    def test_search_near_invalid(self, sqlite_client):
+        assert sqlite_client.get('/api/search', query_string={'near': 'gent'}).status_code == 400
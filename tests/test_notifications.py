@@ -0,0 +1,310 @@
+"""
+Tests for notifications in the raw SQLite app (app.py)
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from notification_bus import NotificationBus
+from services.notification_broadcast import create_broadcast, run_broadcast, get_broadcast
+from services.notification_counts import get_unread_count, rebuild_notification_counters
+
+
+@pytest.fixture
+def db_conn(sqlite_app):
+    conn = sqlite_app.extensions['db_pool'].connection()
+    yield conn
+    conn.close()
+
+
+def add_notifications(conn, user_id, count, is_read=0):
+    conn.executemany(
+        "INSERT INTO notifications (user_id, title, message, notification_type, is_read)"
+        " VALUES (?, ?, 'Bericht', 'general', ?)",
+        [(user_id, f'Melding {i}', is_read) for i in range(count)]
+    )
+    conn.commit()
+
+
+def raw_unread(conn, user_id):
+    return conn.execute(
+        'SELECT COUNT(*) FROM notifications WHERE user_id = ? AND is_read = 0', (user_id,)
+    ).fetchone()[0]
+
+
+def add_users(conn, count, mosque_id=None, role='user', is_active=1):
+    start = conn.execute('SELECT COALESCE(MAX(id), 0) FROM users').fetchone()[0]
+    conn.executemany(
+        "INSERT INTO users (email, password_hash, first_name, last_name, role, mosque_id, is_active)"
+        " VALUES (?, 'x', 'Lid', ?, ?, ?, ?)",
+        [(f'lid{start + i}@example.be', str(i), role, mosque_id, is_active) for i in range(count)]
+    )
+    conn.commit()
+
+
+def notification_users(conn, title):
+    return [row[0] for row in conn.execute(
+        'SELECT user_id FROM notifications WHERE title = ? ORDER BY user_id', (title,)
+    )]
+
+
+class TestUnreadCounter:
+    """Triggers keep notification_counters equal to the raw unread count"""
+
+    def test_counter_follows_writes(self, db_conn):
+        assert get_unread_count(db_conn, 7) == (0, 0)
+
+        add_notifications(db_conn, 7, 5)
+        add_notifications(db_conn, 7, 2, is_read=1)
+        assert get_unread_count(db_conn, 7)[0] == 5
+
+        db_conn.execute('UPDATE notifications SET is_read = 1 WHERE user_id = 7 AND id = '
+                        '(SELECT MIN(id) FROM notifications WHERE user_id = 7 AND is_read = 0)')
+        # Marking an already read row again changes nothing
+        db_conn.execute('UPDATE notifications SET is_read = 1 WHERE user_id = 7 AND is_read = 1')
+        db_conn.commit()
+        assert get_unread_count(db_conn, 7)[0] == 4
+
+        db_conn.execute("UPDATE notifications SET user_id = 8 WHERE user_id = 7 AND is_read = 0 AND title = 'Melding 4'")
+        db_conn.execute("DELETE FROM notifications WHERE user_id = 7 AND title = 'Melding 3'")
+        db_conn.commit()
+        assert get_unread_count(db_conn, 7)[0] == raw_unread(db_conn, 7) == 2
+        assert get_unread_count(db_conn, 8)[0] == 1
+
+    def test_rolled_back_write_leaves_counter(self, db_conn):
+        add_notifications(db_conn, 7, 1)
+        before = get_unread_count(db_conn, 7)
+        db_conn.execute(
+            "INSERT INTO notifications (user_id, title, message, notification_type) VALUES (7, 'x', 'y', 'general')"
+        )
+        db_conn.rollback()
+        assert get_unread_count(db_conn, 7) == before
+
+    def test_rebuild_matches_raw_and_bumps_version(self, db_conn):
+        add_notifications(db_conn, 7, 3)
+        count, version = get_unread_count(db_conn, 7)
+        # Simulate drift
+        db_conn.execute('UPDATE notification_counters SET unread_count = 99 WHERE user_id = 7')
+        db_conn.commit()
+
+        rebuild_notification_counters(db_conn)
+        new_count, new_version = get_unread_count(db_conn, 7)
+        assert new_count == count == 3
+        assert new_version > version
+
+
+class TestCountEndpoint:
+    """/api/notifications/count reads the counter and supports conditional polls"""
+
+    def test_etag_and_304(self, sqlite_client, sqlite_admin_headers):
+        response = sqlite_client.get('/api/notifications/count', headers=sqlite_admin_headers)
+        assert response.status_code == 200
+        assert response.get_json() == {'unread_count': 0}
+        etag = response.headers['ETag']
+
+        conditional = dict(sqlite_admin_headers, **{'If-None-Match': etag})
+        unchanged = sqlite_client.get('/api/notifications/count', headers=conditional)
+        assert unchanged.status_code == 304
+        assert unchanged.headers['ETag'] == etag
+
+        created = sqlite_client.post('/api/admin/notifications', headers=sqlite_admin_headers, json={
+            'user_id': 1, 'title': 'Eid', 'message': 'Eid-gebed om 8u'
+        })
+        assert created.status_code == 200
+
+        changed = sqlite_client.get('/api/notifications/count', headers=conditional)
+        assert changed.status_code == 200
+        assert changed.get_json() == {'unread_count': 1}
+        assert changed.headers['ETag'] != etag
+
+        sqlite_client.post('/api/notifications/read-all', headers=sqlite_admin_headers)
+        listing = sqlite_client.get('/api/notifications', headers=sqlite_admin_headers).get_json()
+        assert listing['unread_count'] == 0
+        assert len(listing['notifications']) == 1
+
+
+class TestBroadcast:
+    """Audience expansion in SQL, batched and resumable"""
+
+    def test_audiences(self, db_conn):
+        add_users(db_conn, 12, mosque_id=2)
+        add_users(db_conn, 5, mosque_id=3, role='imam')
+        add_users(db_conn, 3, mosque_id=2, is_active=0)
+        active = db_conn.execute('SELECT COUNT(*) FROM users WHERE is_active = 1').fetchone()[0]
+
+        for audience, value, title, expected in [
+            ('all', None, 'Iedereen', active),
+            ('mosque', 2, 'Moskee', 12),
+            ('role', 'imam', 'Imams', 5),
+        ]:
+            broadcast_id = create_broadcast(db_conn, audience, value, {
+                'title': title, 'message': 'Bericht', 'notification_type': 'general'
+            })
+            assert get_broadcast(db_conn, broadcast_id)['total_recipients'] == expected
+            assert run_broadcast(db_conn, broadcast_id, batch_size=4) == expected
+            assert len(set(notification_users(db_conn, title))) == expected
+
+            broadcast = get_broadcast(db_conn, broadcast_id)
+            assert broadcast['status'] == 'completed'
+            assert broadcast['delivered'] == expected
+            assert broadcast['progress'] == 1.0
+
+    def test_unknown_audience_rejected(self, db_conn):
+        with pytest.raises(ValueError):
+            create_broadcast(db_conn, 'followers', None, {'title': 't', 'message': 'm'})
+        with pytest.raises(ValueError):
+            create_broadcast(db_conn, 'mosque', None, {'title': 't', 'message': 'm'})
+
+    def test_interrupted_run_resumes_without_duplicates(self, db_conn):
+        add_users(db_conn, 30)
+        broadcast_id = create_broadcast(db_conn, 'all', None, {
+            'title': 'Eid', 'message': 'Eid-gebed', 'notification_type': 'general'
+        })
+        total = get_broadcast(db_conn, broadcast_id)['total_recipients']
+        fail_at = db_conn.execute('SELECT id FROM users ORDER BY id LIMIT 1 OFFSET 17').fetchone()[0]
+        db_conn.execute(f"""
+            CREATE TEMP TRIGGER fail_broadcast BEFORE INSERT ON notifications
+            WHEN NEW.user_id = {fail_at} BEGIN SELECT RAISE(ABORT, 'disk full'); END
+        """)
+
+        with pytest.raises(sqlite3.Error):
+            run_broadcast(db_conn, broadcast_id, batch_size=5)
+        failed = get_broadcast(db_conn, broadcast_id)
+        assert failed['status'] == 'failed'
+        # Only whole batches before the failing one were committed
+        assert failed['delivered'] == len(notification_users(db_conn, 'Eid')) == 15
+
+        db_conn.execute('DROP TRIGGER fail_broadcast')
+        assert run_broadcast(db_conn, broadcast_id, batch_size=5) == total - 15
+        users = notification_users(db_conn, 'Eid')
+        assert len(users) == len(set(users)) == total
+        assert get_unread_count(db_conn, fail_at)[0] == 1
+
+    def test_endpoint_runs_in_background(self, sqlite_app, sqlite_client, sqlite_admin_headers, db_conn):
+        add_users(db_conn, 25, mosque_id=2)
+        sqlite_app.config['NOTIFICATION_BROADCAST_BATCH'] = 10
+
+        response = sqlite_client.post('/api/admin/notifications/broadcast', headers=sqlite_admin_headers, json={
+            'audience': 'mosque', 'mosque_id': 2, 'title': 'Iftar', 'message': 'Iftar om 19u'
+        })
+        assert response.status_code == 202
+        body = response.get_json()
+        assert body['total_recipients'] >= 25
+
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            status = sqlite_client.get(body['status_url'], headers=sqlite_admin_headers).get_json()
+            if status['status'] == 'completed':
+                break
+            time.sleep(0.02)
+        assert status['status'] == 'completed'
+        assert status['delivered'] == body['total_recipients']
+
+    def test_endpoint_validation(self, sqlite_client, sqlite_admin_headers):
+        url = '/api/admin/notifications/broadcast'
+        assert sqlite_client.post(url, headers=sqlite_admin_headers, json={'title': 't'}).status_code == 400
+        assert sqlite_client.post(url, headers=sqlite_admin_headers, json={
+            'audience': 'everyone', 'title': 't', 'message': 'm'
+        }).status_code == 400
+        assert sqlite_client.post(url, headers=sqlite_admin_headers, json={
+            'audience': 'role', 'title': 't', 'message': 'm'
+        }).status_code == 400
+        assert sqlite_client.get('/api/admin/notifications/broadcasts/999',
+                                 headers=sqlite_admin_headers).status_code == 404
+
+
+def parse_events(chunks):
+    """(event, id, data) for every SSE event in the chunks; comments are skipped"""
+    events = []
+    for block in ''.join(chunks).split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if line and not line.startswith(':'))
+        if 'event' in fields:
+            events.append((fields['event'], fields.get('id'), json.loads(fields['data'])))
+    return events
+
+
+class TestNotificationBus:
+    """In-process wake-ups"""
+
+    def test_wakes_only_subscribed_users(self):
+        bus = NotificationBus()
+        first, other = bus.subscribe(1), bus.subscribe(2)
+
+        bus.publish([1, 1, None])
+        assert first.wait(0.5)
+        assert not other.wait(0.01)
+        # Wake-ups coalesce: one wait consumes them
+        assert not first.wait(0.01)
+
+        bus.unsubscribe(first)
+        bus.unsubscribe(other)
+        assert bus.get_stats()['streams'] == 0
+
+    def test_wait_returns_when_woken_from_another_thread(self):
+        bus = NotificationBus()
+        subscription = bus.subscribe(5)
+        threading.Timer(0.05, bus.publish, args=([5],)).start()
+        started = time.monotonic()
+        assert subscription.wait(5)
+        assert time.monotonic() - started < 2
+
+
+class TestNotificationStream:
+    """/api/notifications/stream pushes new rows and count changes"""
+
+    def test_requires_token(self, sqlite_client):
+        assert sqlite_client.get('/api/notifications/stream').status_code == 401
+        assert sqlite_client.get('/api/notifications/stream?token=invalid').status_code == 401
+
+    def test_resume_from_last_event_id(self, sqlite_app, sqlite_client, sqlite_admin_headers, db_conn):
+        sqlite_app.config['NOTIFICATION_STREAM_MAX_SECONDS'] = 0
+        add_notifications(db_conn, 1, 3)
+        first_id = db_conn.execute('SELECT MIN(id) FROM notifications WHERE user_id = 1').fetchone()[0]
+
+        headers = dict(sqlite_admin_headers, **{'Last-Event-ID': str(first_id)})
+        response = sqlite_client.get('/api/notifications/stream', headers=headers)
+        assert response.mimetype == 'text/event-stream'
+        events = parse_events(response.get_data(as_text=True))
+
+        assert [(name, event_id) for name, event_id, _ in events] == [
+            ('notification', str(first_id + 1)),
+            ('notification', str(first_id + 2)),
+            ('unread_count', None),
+        ]
+        assert events[-1][2] == {'unread_count': 3}
+
+    def test_pushes_new_notifications_and_count_changes(self, sqlite_app, sqlite_client, sqlite_admin_headers):
+        sqlite_app.config['NOTIFICATION_STREAM_HEARTBEAT'] = 0.05
+        sqlite_app.config['NOTIFICATION_STREAM_MAX_SECONDS'] = 10
+        bus = sqlite_app.extensions['notification_bus']
+
+        response = sqlite_client.get('/api/notifications/stream', headers=sqlite_admin_headers, buffered=False)
+        stream = iter(response.response)
+        assert next(stream).startswith(b'retry:')
+        assert parse_events([next(stream).decode()]) == [('unread_count', None, {'unread_count': 0})]
+        assert next(stream) == b': heartbeat\n\n'
+
+        sqlite_client.post('/api/admin/notifications', headers=sqlite_admin_headers, json={
+            'user_id': 1, 'title': 'Eid', 'message': 'Eid-gebed om 8u'
+        })
+        chunks = []
+        while len(parse_events(chunks)) < 2:
+            chunk = next(stream).decode()
+            if not chunk.startswith(':'):
+                chunks.append(chunk)
+        (name, event_id, data), count = parse_events(chunks)
+        assert (name, data['title']) == ('notification', 'Eid')
+        assert count == ('unread_count', None, {'unread_count': 1})
+
+        sqlite_client.post('/api/notifications/read-all', headers=sqlite_admin_headers)
+        chunk = next(stream).decode()
+        while chunk.startswith(':'):
+            chunk = next(stream).decode()
+        assert parse_events([chunk]) == [('unread_count', None, {'unread_count': 0})]
+
+        response.close()
+        assert bus.get_stats()['streams'] == 0
@@ -0,0 +1,185 @@
+"""
+Tests for the offline prayer time engine (services/prayer_calculation.py)
+"""
+
+import os
+from datetime import date, time, timedelta
+
+import pytest
+
+from services.prayer_calculation import (
+    DIYANET, HANAFI, METHODS, PRAYERS, SHAFI, calculate_day, calculate_range, calculate_year,
+    compare_with_reference, compute_day_hours, load_reference, ramadan_window
+)
+
+REFERENCE = os.path.join(os.path.dirname(__file__), 'data', 'prayer_reference_brussels.json')
+
+# All six prayers under the parameters the services request (Diyanet, Hanafi),
+# generated with scripts/generate_prayer_reference.py
+DIYANET_REFERENCE = os.path.join(os.path.dirname(__file__), 'data', 'prayer_reference_gent_diyanet.json')
+
+GENT = (51.0543, 3.7174)
+
+
+def minutes(value):
+    hours, mins = value.split(':')
+    return int(hours) * 60 + int(mins)
+
+
+class TestCalculation:
+    """Calculated times against reference tables and basic invariants"""
+
+    def test_matches_reference_within_tolerance(self):
+        location, reference = load_reference(REFERENCE)
+        computed = calculate_range(
+            min(reference), max(reference), location['latitude'], location['longitude'],
+            method=location['method'], school=location['school'], timezone=location['timezone']
+        )
+        assert compare_with_reference(computed, reference, tolerance_minutes=2) == []
+
+    def test_matches_diyanet_reference(self):
+        location, reference = load_reference(DIYANET_REFERENCE)
+        computed = calculate_range(
+            min(reference), max(reference), location['latitude'], location['longitude'],
+            method=location['method'], school=location['school'], timezone=location['timezone']
+        )
+        # Tight enough that a temkin minute off by two or more is reported
+        assert compare_with_reference(computed, reference, tolerance_minutes=1) == []
+
+    def test_compare_reports_differences(self):
+        day = date(2024, 1, 1)
+        differences = compare_with_reference({day: {'fajr': '06:30'}}, {day: {'fajr': '06:35'}})
+        assert differences == ['2024-01-01 fajr: 06:30 vs reference 06:35 (-5 min)']
+
+    @pytest.mark.parametrize('day', [date(2024, 1, 15), date(2024, 4, 10), date(2024, 10, 5)])
+    def test_prayers_in_order(self, day):
+        times = calculate_day(day, *GENT)
+        values = [minutes(times[prayer]) for prayer in PRAYERS]
+        assert values == sorted(values)
+
+    def test_hanafi_asr_is_later(self):
+        day = date(2024, 5, 1)
+        shafi = calculate_day(day, *GENT, school=SHAFI)
+        hanafi = calculate_day(day, *GENT, school=HANAFI)
+        assert minutes(hanafi['asr']) > minutes(shafi['asr'])
+        assert hanafi['dhuhr'] == shafi['dhuhr']
+
+    def test_high_latitude_summer_has_fajr_and_isha(self):
+        # Around the solstice the sun never reaches 18 degrees below the horizon in Gent
+        hours = compute_day_hours(date(2024, 6, 21), *GENT, method=DIYANET)
+        assert hours['fajr'] < hours['sunrise']
+        assert hours['isha'] > hours['maghrib']
+        assert hours['isha'] - hours['maghrib'] <= (24 - (hours['maghrib'] - hours['sunrise'])) * 17 / 60
+
+    def test_diyanet_offsets(self):
+        location, _ = load_reference(DIYANET_REFERENCE)
+        offsets = METHODS[DIYANET]['offsets']
+        assert {prayer: offsets.get(prayer, 0) for prayer in PRAYERS} == location['temkin']
+
+    def test_daylight_saving_switch(self):
+        before = calculate_day(date(2024, 3, 30), *GENT)
+        after = calculate_day(date(2024, 3, 31), *GENT)
+        assert 55 <= minutes(after['dhuhr']) - minutes(before['dhuhr']) <= 65
+
+        before = calculate_day(date(2024, 10, 26), *GENT)
+        after = calculate_day(date(2024, 10, 27), *GENT)
+        assert 55 <= minutes(before['dhuhr']) - minutes(after['dhuhr']) <= 65
+
+    @pytest.mark.parametrize('params', [{'method': 99}, {'school': 2}, {'high_latitude_rule': 7}])
+    def test_unsupported_parameters(self, params):
+        with pytest.raises(ValueError):
+            calculate_day(date(2024, 1, 1), *GENT, **params)
+
+    @pytest.mark.parametrize('year, days', [(2024, 366), (2025, 365)])
+    def test_full_year(self, year, days):
+        times = calculate_year(year, *GENT)
+        assert len(times) == days
+        assert all(set(day_times) == set(PRAYERS) for day_times in times.values())
+
+
+class TestRamadanWindow:
+    """Tabular Islamic calendar, padded by a day on both sides"""
+
+    @pytest.mark.parametrize('year, first_day, eid', [
+        (2023, date(2023, 3, 23), date(2023, 4, 22)),
+        (2024, date(2024, 3, 11), date(2024, 4, 10)),
+        (2025, date(2025, 3, 1), date(2025, 3, 31)),
+    ])
+    def test_window(self, year, first_day, eid):
+        start, end = ramadan_window(year)
+        assert start == first_day - timedelta(days=1)
+        assert end == eid + timedelta(days=1)
+
+
+class TestBulkGeneration:
+    """generate-prayer-times upserts a range for every active mosque"""
+
+    def stored(self, mosque_id):
+        from models_new import PrayerTime
+        return PrayerTime.query.filter_by(mosque_id=mosque_id).order_by(PrayerTime.date)
+
+    def test_year_is_upserted(self, app, db_session, test_mosque):
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=['generate-prayer-times', '--year', '2024', '--mosque-id', str(test_mosque.id)])
+        assert result.exit_code == 0, result.output
+        assert '366 rows for 1 mosques' in result.output
+        assert self.stored(test_mosque.id).count() == 366
+
+        # A second run updates in place instead of failing on the unique constraint
+        first = self.stored(test_mosque.id).first()
+        expected_fajr = first.fajr
+        first.fajr = time(1, 0)
+        db_session.commit()
+        result = runner.invoke(args=['generate-prayer-times', '--year', '2024', '--mosque-id', str(test_mosque.id)])
+        assert result.exit_code == 0, result.output
+        db_session.expire_all()
+        assert self.stored(test_mosque.id).count() == 366
+        assert self.stored(test_mosque.id).first().fajr == expected_fajr
+
+    def test_ramadan_window(self, app, test_mosque):
+        result = app.test_cli_runner().invoke(
+            args=['generate-prayer-times', '--ramadan', '--year', '2025', '--mosque-id', str(test_mosque.id)]
+        )
+        assert result.exit_code == 0, result.output
+        days = [row.date for row in self.stored(test_mosque.id)]
+        assert (days[0], days[-1]) == ramadan_window(2025)
+
+    def test_endpoint_reads_generated_row(self, app, client, test_mosque):
+        app.test_cli_runner().invoke(args=['generate-prayer-times', '--year', '2026', '--mosque-id', str(test_mosque.id)])
+        response = client.get(f'/api/prayer-times?mosque_id={test_mosque.id}&date=2026-06-01')
+        assert response.status_code == 200
+        assert response.get_json()['id'] == self.stored(test_mosque.id).filter_by(date=date(2026, 6, 1)).one().id
+
+    def test_cache_is_warmed(self, app, db_session, test_mosque, monkeypatch):
+        from services import prayer_generation
+
+        warmed = {}
+        monkeypatch.setattr(
+            prayer_generation, 'cache_prayer_times_many',
+            lambda mosque_id, times, ttl_seconds: warmed.update(times) or True
+        )
+        today = date.today()
+        summary = prayer_generation.generate_prayer_times(
+            [test_mosque], today - timedelta(days=3), today + timedelta(days=30), warm_days=7
+        )
+        assert summary == {'mosques': 1, 'rows': 34, 'cached': 7}
+        assert sorted(warmed) == [(today + timedelta(days=i)).isoformat() for i in range(7)]
+        assert set(warmed[today.isoformat()]) == {'fajr', 'dhuhr', 'asr', 'maghrib', 'isha'}
+
+
+class TestPrayerTimesEndpoint:
+    """/api/prayer-times in app_new.py calculates and stores missing days"""
+
+    def test_calculates_missing_day(self, client, test_mosque):
+        from models_new import PrayerTime
+
+        response = client.get(f'/api/prayer-times?mosque_id={test_mosque.id}&date=2024-12-21')
+        assert response.status_code == 200
+        times = response.get_json()
+        assert times == {
+            prayer: value for prayer, value in calculate_day(date(2024, 12, 21), 51.0543, 3.7174).items()
+            if prayer != 'sunrise'
+        }
+
+        stored = PrayerTime.query.filter_by(mosque_id=test_mosque.id, date=date(2024, 12, 21)).one()
+        assert stored.fajr.strftime('%H:%M') == times['fajr']
@@ -0,0 +1,287 @@
+"""
+Tests for hedged prayer time fetching (services/prayer_fetch.py) against a local stub server
+"""
+
+import json
+import threading
+import time
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from services.mawaqit_directory import MawaqitDirectory, city_key, mosque_key
+from services.prayer_fetch import CircuitBreaker, HedgedFetcher, months_between
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Aladhan calendar, Mawaqit search and Mawaqit prayers, with configurable delay and status"""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        source = 'aladhan' if url.path.startswith('/v1/') else 'mawaqit'
+        config = self.server.config[source]
+        self.server.requests.append((url.path, params))
+
+        started = time.monotonic()
+        time.sleep(config['delay'])
+        self.server.spans.append((source, started, time.monotonic()))
+        if config['status'] != 200:
+            return self.reply(config['status'], {'error': 'unavailable'})
+
+        if url.path == '/v1/calendar':
+            year, month = int(params['year']), int(params['month'])
+            first = date(year, month, 1)
+            days = [first + timedelta(days=i) for i in range(31) if (first + timedelta(days=i)).month == month]
+            self.reply(200, {'data': [{
+                'date': {'gregorian': {'date': day.strftime('%d-%m-%Y')}},
+                'timings': {name: '06:00 (CET)' for name in ('Fajr', 'Sunrise', 'Dhuhr', 'Asr', 'Maghrib', 'Isha')},
+            } for day in days]})
+        elif url.path == '/api/2.0/mosque/search':
+            self.reply(200, {'mosques': [{'uuid': 'stub-uuid'}]})
+        elif url.path.startswith('/api/2.0/mosque/gone/'):
+            self.reply(404, {'error': 'unknown mosque'})
+        else:
+            start = datetime.strptime(params['start'], '%Y-%m-%d').date()
+            end = datetime.strptime(params['end'], '%Y-%m-%d').date()
+            self.reply(200, {'prayers': [
+                dict({prayer: '07:00' for prayer in ('fajr', 'sunrise', 'dhuhr', 'asr', 'maghrib', 'isha')},
+                     date=(start + timedelta(days=i)).isoformat())
+                for i in range((end - start).days + 1)
+            ]})
+
+    def reply(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Requests that lost a hedge race or timed out hang up early
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = StubServer(('127.0.0.1', 0), StubHandler)
+    server.config = {source: {'delay': 0, 'status': 200} for source in ('aladhan', 'mawaqit')}
+    server.requests = []
+    server.spans = []  # (source, start, end) of every handled request
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.base = f'http://127.0.0.1:{server.server_address[1]}'
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def fetcher(stub):
+    return HedgedFetcher(f'{stub.base}/v1/calendar', f'{stub.base}/api/2.0', hedge_after=0.2, timeout=2)
+
+
+def fetch(fetcher, start_date, end_date, source='diyanet', mosque_id=None):
+    return fetcher.fetch_ranges(source, [(start_date, end_date)], mosque_id=mosque_id)[0]
+
+
+def paths(stub):
+    return [path for path, _ in stub.requests]
+
+
+class TestHedgedFetcher:
+    """Concurrent months, hedging and fallback"""
+
+    def test_months_between(self):
+        assert months_between(date(2024, 11, 30), date(2025, 2, 1)) == [(2024, 11), (2024, 12), (2025, 1), (2025, 2)]
+
+    def test_months_are_fetched_concurrently(self, stub, fetcher):
+        stub.config['aladhan']['delay'] = 0.15
+        times = fetch(fetcher, date(2025, 1, 31), date(2025, 4, 2))
+
+        assert len(times) == (date(2025, 4, 2) - date(2025, 1, 31)).days + 1
+        assert times[date(2025, 3, 1)]['fajr'] == '06:00'
+        assert sorted(params['month'] for _, params in stub.requests) == ['1', '2', '3', '4']
+        # Every request started before any of them was answered
+        spans = [(start, end) for source, start, end in stub.spans if source == 'aladhan']
+        assert len(spans) == 4
+        assert max(start for start, _ in spans) < min(end for _, end in spans)
+
+    def test_hedges_to_mawaqit_when_aladhan_is_slow(self, stub, fetcher):
+        stub.config['aladhan']['delay'] = 1
+        started = time.monotonic()
+        times = fetch(fetcher, date(2025, 3, 1), date(2025, 3, 5))
+        assert time.monotonic() - started < 0.8
+        assert times[date(2025, 3, 1)]['fajr'] == '07:00'
+        assert '/api/2.0/mosque/stub-uuid/prayers' in paths(stub)
+        # Losing the race is not held against the primary
+        assert fetcher.breakers['aladhan'].failures == 0
+
+    def test_fast_primary_is_not_hedged(self, stub, fetcher):
+        assert fetch(fetcher, date(2025, 3, 1), date(2025, 3, 5))[date(2025, 3, 1)]['fajr'] == '06:00'
+        assert not any(path.startswith('/api/2.0') for path in paths(stub))
+
+    def test_failed_primary_falls_back_immediately(self, stub, fetcher):
+        stub.config['aladhan']['status'] = 500
+        times = fetch(fetcher, date(2025, 3, 1), date(2025, 3, 5))
+        assert times[date(2025, 3, 5)]['isha'] == '07:00'
+        assert fetcher.breakers['aladhan'].failures == 1
+
+    def test_mawaqit_source_skips_aladhan(self, stub, fetcher):
+        assert fetch(fetcher, date(2025, 3, 1), date(2025, 3, 2), source='mawaqit')
+        assert not any(path.startswith('/v1/') for path in paths(stub))
+
+    def test_nothing_in_time(self, stub, fetcher):
+        for source in ('aladhan', 'mawaqit'):
+            stub.config[source]['delay'] = 3
+        fetcher.timeout = 0.5
+        assert fetch(fetcher, date(2025, 3, 1), date(2025, 3, 2)) is None
+        # Both sources were too slow, which counts against them
+        assert fetcher.breakers['aladhan'].failures == 1
+        assert fetcher.breakers['mawaqit'].failures == 1
+
+    def test_open_circuit_is_skipped(self, stub, fetcher):
+        stub.config['aladhan']['status'] = 503
+        for _ in range(3):
+            fetch(fetcher, date(2025, 3, 1), date(2025, 3, 2))
+        assert fetcher.get_stats()['aladhan']['state'] == CircuitBreaker.OPEN
+
+        stub.requests.clear()
+        assert fetch(fetcher, date(2025, 3, 1), date(2025, 3, 2))
+        assert not any(path.startswith('/v1/') for path in paths(stub))
+
+
+class TestCircuitBreaker:
+    """Closed, open, half open"""
+
+    def test_lifecycle(self):
+        breaker = CircuitBreaker('test', threshold=2, reset_timeout=0.1)
+        breaker.record_failure()
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+
+        time.sleep(0.15)
+        # One trial at a time
+        assert breaker.allow()
+        assert not breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+
+        time.sleep(0.15)
+        assert breaker.allow()
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0
+
+    def test_cancelled_trial_is_released(self):
+        breaker = CircuitBreaker('test', threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        assert breaker.allow()
+        breaker.release()
+        assert breaker.allow()
+
+
+class TestMawaqitUuids:
+    """The Mawaqit fallback makes a single request once the UUID is known"""
+
+    def test_search_happens_once(self, stub, fetcher):
+        fetch(fetcher, date(2025, 3, 1), date(2025, 3, 2), source='mawaqit')
+        fetch(fetcher, date(2025, 4, 1), date(2025, 4, 2), source='mawaqit')
+        assert paths(stub).count('/api/2.0/mosque/search') == 1
+        assert paths(stub).count('/api/2.0/mosque/stub-uuid/prayers') == 2
+        assert fetcher.directory.lookup(city_key('Gent')) == 'stub-uuid'
+
+    def test_pinned_mosque_uuid(self, stub, fetcher):
+        fetcher.directory.pin(3, 'pinned-uuid')
+        fetcher.directory.remember(mosque_key(3), 'searched-uuid')
+        assert fetch(fetcher, date(2025, 3, 1), date(2025, 3, 2), source='mawaqit', mosque_id=3)
+        assert paths(stub) == ['/api/2.0/mosque/pinned-uuid/prayers']
+
+    def test_unknown_uuid_is_forgotten(self, stub, fetcher):
+        fetcher.directory.remember(city_key('Gent'), 'gone')
+        assert fetch(fetcher, date(2025, 3, 1), date(2025, 3, 2), source='mawaqit') is None
+        assert fetcher.directory.lookup(city_key('Gent')) is None
+
+    def test_directory_is_read_off_the_loop(self, stub, fetcher):
+        threads = []
+        lookup = fetcher.directory.lookup
+        fetcher.directory.lookup = lambda key: threads.append(threading.get_ident()) or lookup(key)
+        assert fetch(fetcher, date(2025, 3, 1), date(2025, 3, 2), source='mawaqit')
+        assert threads and threading.get_ident() not in threads
+
+    def test_stale_uuid_is_refreshed_in_background(self, stub):
+        directory = MawaqitDirectory(f'{stub.base}/api/2.0/mosque/search', max_age=0)
+        directory.remember(city_key('Gent'), 'old-uuid')
+        # The stale UUID is used right away while a new one is looked up
+        assert directory.lookup(city_key('Gent')) == 'old-uuid'
+        deadline = time.monotonic() + 2
+        while directory.lookup(city_key('Gent')) == 'old-uuid' and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert directory.lookup(city_key('Gent')) == 'stub-uuid'
+
+
+class TestMawaqitUuidAdmin:
+    """Pinned UUIDs in the raw SQLite app (app.py)"""
+
+    def test_pin_and_unpin(self, sqlite_app, sqlite_client, sqlite_admin_headers):
+        url = '/api/admin/mosques/1/mawaqit-uuid'
+        response = sqlite_client.put(url, json={'uuid': 'pinned-uuid'}, headers=sqlite_admin_headers)
+        assert response.status_code == 200
+
+        # Stored in the table, so every worker sees it
+        directory = MawaqitDirectory('http://unused', sqlite_app.extensions['db_pool'].connection)
+        assert directory.lookup(mosque_key(1)) == 'pinned-uuid'
+        directory.remember(mosque_key(1), 'searched-uuid')
+        assert directory.lookup(mosque_key(1)) == 'pinned-uuid'
+
+        listing = sqlite_client.get('/api/admin/mawaqit-uuids', headers=sqlite_admin_headers).get_json()
+        assert listing[0]['key'] == 'mosque:1' and listing[0]['pinned']
+
+        assert sqlite_client.delete(url, headers=sqlite_admin_headers).status_code == 200
+        assert directory.lookup(mosque_key(1)) is None
+
+    @pytest.mark.parametrize('url, body, status', [
+        ('/api/admin/mosques/999/mawaqit-uuid', {'uuid': 'x'}, 404),
+        ('/api/admin/mosques/1/mawaqit-uuid', {}, 400),
+    ])
+    def test_invalid_pins(self, sqlite_client, sqlite_admin_headers, url, body, status):
+        assert sqlite_client.put(url, json=body, headers=sqlite_admin_headers).status_code == status
+
+    def test_requires_admin(self, sqlite_client):
+        assert sqlite_client.get('/api/admin/mawaqit-uuids').status_code == 401
+
+    def test_pin_reaches_fetcher(self, sqlite_app, sqlite_client, sqlite_admin_headers, stub):
+        fetcher = sqlite_app.extensions['prayer_time_service'].fetcher
+        fetcher.mawaqit_url = f'{stub.base}/api/2.0'
+        url = '/api/admin/mosques/1/mawaqit-uuid'
+
+        for pinned in ('pinned-uuid', 'other-uuid'):
+            sqlite_client.put(url, json={'uuid': pinned}, headers=sqlite_admin_headers)
+            stub.requests.clear()
+            assert fetch(fetcher, date(2025, 3, 1), date(2025, 3, 2), source='mawaqit', mosque_id=1)
+            assert paths(stub) == [f'/api/2.0/mosque/{pinned}/prayers']
+
+    def test_bulk_refresh_keeps_pins(self, sqlite_app, stub):
+        directory = sqlite_app.extensions['mawaqit_directory']
+        directory.search_url = f'{stub.base}/api/2.0/mosque/search'
+        directory.pin(1, 'pinned-uuid')
+
+        result = sqlite_app.test_cli_runner().invoke(args=['refresh-mawaqit-uuids'])
+        assert result.exit_code == 0, result.output
+        assert directory.lookup(mosque_key(1)) == 'pinned-uuid'
+        assert directory.lookup(city_key('Gent')) == 'stub-uuid'
+        active = sqlite_app.extensions['db_pool'].connection().execute(
+            'SELECT id FROM mosques WHERE is_active = 1 AND id != 1'
+        ).fetchall()
+        assert all(directory.lookup(mosque_key(row[0])) == 'stub-uuid' for row in active)
+        assert f"{len(active) + 1} Mawaqit UUIDs resolved" in result.output
@@ -0,0 +1,117 @@
+"""
+Tests for the Aladhan-backed PrayerService (services/prayer_service.py)
+"""
+
+import os
+from datetime import date, timedelta
+
+import pytest
+
+from services import prayer_service
+from services.prayer_service import MonthCache, PrayerService
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, year, month):
+        first = date(year, month, 1)
+        last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        self.days = [first + timedelta(days=i) for i in range(last.day)]
+
+    def json(self):
+        return {'data': [
+            {
+                'date': {'gregorian': {'date': day.strftime('%d-%m-%Y')}},
+                'timings': {name: f'{hour:02d}:{day.day:02d} (CET)' for hour, name in enumerate(
+                    ('Fajr', 'Sunrise', 'Dhuhr', 'Asr', 'Maghrib', 'Isha'), start=5)},
+            }
+            for day in self.days
+        ]}
+
+
+@pytest.fixture
+def aladhan(monkeypatch):
+    """Records the months requested from Aladhan"""
+    requested = []
+
+    def fake_get(url, params, timeout):
+        requested.append((params['year'], params['month']))
+        return FakeResponse(params['year'], params['month'])
+
+    monkeypatch.setattr(prayer_service.requests, 'get', fake_get)
+    return requested
+
+
+class TestMonthCache:
+    """Bounded, TTL-aware month cache"""
+
+    def test_evicts_least_recently_used(self):
+        cache = MonthCache(max_entries=2)
+        cache.set('a', {})
+        cache.set('b', {})
+        cache.get('a')
+        cache.set('c', {})
+        assert len(cache) == 2
+        assert cache.get('b') is None
+        assert cache.get('a') == {} and cache.get('c') == {}
+
+    def test_expired_entries_are_dropped(self):
+        cache = MonthCache(ttl_seconds=0)
+        cache.set('a', {'2025-01-01': {}})
+        assert cache.get('a') is None
+        assert len(cache) == 0
+
+    def test_persists_across_instances(self, tmp_path):
+        path = str(tmp_path / 'months.json')
+        MonthCache(path=path).set('Gent:2025-03', {'2025-03-01': {'fajr': '05:30'}})
+        assert MonthCache(path=path).get('Gent:2025-03') == {'2025-03-01': {'fajr': '05:30'}}
+        # The stored expiry applies after loading, and so does the bound
+        assert len(MonthCache(max_entries=0, path=path)) == 0
+        MonthCache(path=path, ttl_seconds=0).set('Gent:2025-04', {})
+        assert MonthCache(path=path).get('Gent:2025-04') is None
+
+    def test_unreadable_file_is_ignored(self, tmp_path):
+        path = tmp_path / 'months.json'
+        path.write_text('{not json')
+        cache = MonthCache(path=str(path))
+        assert len(cache) == 0
+        cache.set('a', {})
+        assert os.path.getsize(path) > 0
+
+
+class TestPrayerService:
+    """Calendars are downloaded once per month"""
+
+    def test_range_fetches_each_month_once(self, aladhan):
+        service = PrayerService(MonthCache())
+        times = service.get_prayer_times_range(date(2025, 2, 20), date(2025, 4, 5))
+        assert aladhan == [(2025, 2), (2025, 3), (2025, 4)]
+        assert len(times) == 45
+        assert times[date(2025, 3, 17)]['asr'] == '08:17'
+
+        # Later single days and overlapping ranges come from the cache
+        service.get_prayer_times(date(2025, 3, 1))
+        service.get_prayer_times_range(date(2025, 3, 25), date(2025, 4, 2))
+        assert len(aladhan) == 3
+
+    def test_restart_reuses_persisted_months(self, aladhan, tmp_path):
+        path = str(tmp_path / 'months.json')
+        PrayerService(MonthCache(path=path)).get_prayer_times_range(date(2025, 3, 1), date(2025, 3, 30))
+        restarted = PrayerService(MonthCache(path=path))
+        assert restarted.get_prayer_times(date(2025, 3, 10))['fajr'] == '05:10'
+        assert aladhan == [(2025, 3)]
+
+    def test_failed_month_falls_back_once(self, monkeypatch):
+        requested = []
+
+        def failing_get(url, params, timeout):
+            requested.append(params['month'])
+            raise prayer_service.requests.ConnectionError('down')
+
+        monkeypatch.setattr(prayer_service.requests, 'get', failing_get)
+        service = PrayerService(MonthCache())
+        times = service.get_prayer_times_range(date(2025, 3, 1), date(2025, 3, 31))
+        assert requested == [3]
+        assert len(times) == 31
+        assert all(set(day) >= {'fajr', 'maghrib', 'isha'} for day in times.values())
@@ -0,0 +1,96 @@
+"""
+Tests for the multi-source PrayerTimeService (services/prayer_times.py)
+"""
+
+from datetime import date, timedelta
+
+import pytest
+
+from services.prayer_times import DayCache, PrayerTimeService
+
+
+def days(start_date, end_date):
+    return [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+
+
+class RecordingFetcher:
+    """Answers every range and records the ranges it is asked for"""
+
+    def __init__(self):
+        self.requested = []
+        self.available = True
+
+    def fetch_ranges(self, source, ranges, city, mosque_id=None):
+        self.requested.extend(ranges)
+        if not self.available:
+            return [None] * len(ranges)
+        return [
+            {day: {'fajr': f'05:{day.day:02d}', 'isha': '22:00'} for day in days(start_date, end_date)}
+            for start_date, end_date in ranges
+        ]
+
+
+@pytest.fixture
+def service():
+    service = PrayerTimeService(DayCache(), RecordingFetcher())
+    service.requested = service.fetcher.requested
+    return service
+
+
+class TestDayCache:
+    """Range lookups split into cached days and missing gaps"""
+
+    def test_gaps(self):
+        cache = DayCache()
+        cache.put('diyanet', 'Gent', {date(2025, 3, day): {} for day in (3, 4, 5, 9)})
+        found, gaps = cache.get_range('diyanet', 'Gent', date(2025, 3, 1), date(2025, 3, 10))
+        assert sorted(found) == [date(2025, 3, day) for day in (3, 4, 5, 9)]
+        assert gaps == [(date(2025, 3, 1), date(2025, 3, 2)), (date(2025, 3, 6), date(2025, 3, 8)),
+                        (date(2025, 3, 10), date(2025, 3, 10))]
+        assert cache.stats()['hits'] == 4 and cache.stats()['misses'] == 6
+
+        # Sources and cities are kept apart
+        assert cache.get_range('mawaqit', 'Gent', date(2025, 3, 3), date(2025, 3, 3))[0] == {}
+
+    def test_eviction_and_expiry(self):
+        cache = DayCache(max_days=3)
+        cache.put('diyanet', 'Gent', {date(2025, 3, day): {} for day in (1, 2, 3)})
+        cache.get_range('diyanet', 'Gent', date(2025, 3, 1), date(2025, 3, 1))
+        cache.put('diyanet', 'Gent', {date(2025, 3, 4): {}})
+        found, _ = cache.get_range('diyanet', 'Gent', date(2025, 3, 1), date(2025, 3, 4))
+        assert sorted(day.day for day in found) == [1, 3, 4]
+        assert cache.stats()['evictions'] == 1
+
+        expiring = DayCache(ttl_seconds=0)
+        expiring.put('diyanet', 'Gent', {date(2025, 3, 1): {}})
+        assert expiring.get_range('diyanet', 'Gent', date(2025, 3, 1), date(2025, 3, 1))[0] == {}
+        assert expiring.stats()['days'] == 0
+
+
+class TestPrayerTimeService:
+    """Overlapping ranges share cached days"""
+
+    def test_sub_range_is_served_from_cache(self, service):
+        month = service.get_prayer_times_for_range('diyanet', date(2025, 3, 1), date(2025, 3, 30))
+        assert len(month) == 30
+        week = service.get_prayer_times_for_range('diyanet', date(2025, 3, 5), date(2025, 3, 10))
+        assert week == {day: month[day] for day in days(date(2025, 3, 5), date(2025, 3, 10))}
+        assert service.requested == [(date(2025, 3, 1), date(2025, 3, 30))]
+
+    def test_only_gaps_are_fetched(self, service):
+        service.get_prayer_times_for_range('diyanet', date(2025, 3, 10), date(2025, 3, 20))
+        times = service.get_prayer_times_for_range('diyanet', date(2025, 3, 5), date(2025, 3, 25))
+        assert len(times) == 21
+        assert service.requested[1:] == [(date(2025, 3, 5), date(2025, 3, 9)), (date(2025, 3, 21), date(2025, 3, 25))]
+
+    def test_batch_uses_cache(self, service):
+        service.get_prayer_times_for_range('diyanet', date(2025, 3, 1), date(2025, 3, 31))
+        batch = service.get_prayer_times_batch('diyanet', [date(2025, 3, 2), date(2025, 3, 17)], 'Fajr')
+        assert batch == {date(2025, 3, 2): '05:02', date(2025, 3, 17): '05:17'}
+        assert len(service.requested) == 1
+        assert service.cache.stats()['hits'] == 16
+
+    def test_failed_fetch_is_not_cached(self, service):
+        service.fetcher.available = False
+        assert service.get_prayer_times_for_range('diyanet', date(2025, 3, 1), date(2025, 3, 2)) is None
+        assert service.cache.stats()['days'] == 0
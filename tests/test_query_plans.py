@@ -0,0 +1,189 @@
+"""
+Query-plan regression tests for the hand-written SQL in app.py
+
+Every statement the API issues while the requests below run is captured with
+a trace callback and checked with EXPLAIN QUERY PLAN. A plan step that scans a
+whole large table (``SCAN <table>``, with or without an index) fails the test
+unless the statement is listed in ALLOWED_SCANS with a reason.
+"""
+
+import re
+
+import pytest
+
+# Tables expected to grow with usage; small lookup tables (mosques,
+# notification_templates, ...) may be scanned
+LARGE_TABLES = {
+    'events', 'news', 'users', 'user_sessions', 'donations', 'campaigns',
+    'media_files', 'notifications', 'notification_preferences',
+    'analytics_events', 'page_views', 'user_activity',
+}
+
+# (regex matched against the statement, table scanned, reason)
+ALLOWED_SCANS = [
+    (r'SELECT COUNT\(\*\) FROM users$', 'users', 'overview total'),
+    (r'SELECT COUNT\(\*\) FROM donations$', 'donations', 'overview total'),
+    (r'FROM users u\s+LEFT JOIN user_activity', 'users', 'users report lists every user'),
+    (r'FROM donations d\s+LEFT JOIN mosques', 'donations', 'full donation listing for admins'),
+    (r'FROM users u ORDER BY u\.id$', 'users', 'users export covers every user'),
+]
+
+# Requests exercising every read path; (method, url, needs admin token, json body)
+REQUESTS = [
+    ('GET', '/api/mosques', False, None),
+    ('GET', '/api/events', False, None),
+    ('GET', '/api/news', False, None),
+    ('GET', '/api/campaigns', False, None),
+    ('GET', '/api/campaigns/1', False, None),
+    ('GET', '/api/files', False, None),
+    ('GET', '/api/files/1', False, None),
+    ('GET', '/api/donations', True, None),
+    ('GET', '/api/notifications', True, None),
+    ('GET', '/api/notifications?unread_only=true', True, None),
+    ('GET', '/api/notifications/count', True, None),
+    ('POST', '/api/notifications/1/read', True, None),
+    ('POST', '/api/notifications/read-all', True, None),
+    ('GET', '/api/notifications/preferences', True, None),
+    ('GET', '/api/exports/donations?date_from=2025-01-01&date_to=2025-12-31', True, None),
+    ('GET', '/api/exports/page_views?format=ndjson&date_from=2025-01-01', True, None),
+    ('GET', '/api/exports/users', True, None),
+    ('GET', '/api/analytics/summary', True, None),
+    ('GET', '/api/analytics/reports?type=overview', True, None),
+    ('GET', '/api/analytics/reports?type=users', True, None),
+    ('GET', '/api/analytics/reports?type=mosques', True, None),
+    ('GET', '/api/search?q=moskee', False, None),
+    ('GET', '/api/search?q=moskee&count=exact&sort=newest', False, None),
+    ('GET', '/api/search', False, None),
+    ('GET', '/api/search?date_from=2025-01-01&date_to=2025-12-31&type=events', False, None),
+]
+
+
+def table_aliases(sql):
+    """Map alias (or bare name) -> table for every FROM/JOIN in a statement"""
+    aliases = {}
+    for table, alias in re.findall(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', sql, re.IGNORECASE):
+        aliases[table] = table
+        if alias and alias.upper() not in {'WHERE', 'LEFT', 'JOIN', 'ON', 'ORDER', 'GROUP', 'LIMIT', 'INNER', 'UNION'}:
+            aliases[alias] = table
+    return aliases
+
+
+def full_scans(conn, sql):
+    """Large tables scanned in full by the statement's plan"""
+    aliases = table_aliases(sql)
+    scanned = set()
+    for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}'):
+        detail = row[3]
+        match = re.match(r'SCAN (\w+)', detail)
+        if not match or 'VIRTUAL TABLE' in detail:
+            continue
+        table = aliases.get(match.group(1), match.group(1))
+        if table in LARGE_TABLES:
+            scanned.add(table)
+    return scanned
+
+
+def allowed_by(sql, table):
+    """The ALLOWED_SCANS patterns that permit the statement to scan the table"""
+    flat = ' '.join(sql.split())
+    return {
+        pattern for pattern, allowed_table, _ in ALLOWED_SCANS
+        if re.search(pattern, flat) and allowed_table == table
+    }
+
+
+@pytest.fixture
+def captured_statements(sqlite_app, monkeypatch):
+    """Record the SQL of every statement run on pooled connections"""
+    pool = sqlite_app.extensions['db_pool']
+    statements = []
+    connect = pool._connect
+
+    def traced_connect():
+        conn = connect()
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    pool.close_all()
+    monkeypatch.setattr(pool, '_connect', traced_connect)
+    return statements
+
+
+def seed(conn):
+    """Enough rows that every code path returns data"""
+    conn.executemany(
+        "INSERT INTO notifications (user_id, title, message, notification_type) VALUES (1, ?, 'Bericht', 'general')",
+        [(f'Melding {i}',) for i in range(20)]
+    )
+    conn.executemany(
+        "INSERT INTO donations (donor_name, amount, mosque_id, campaign_id, status) VALUES (?, 10, 1, 1, 'completed')",
+        [(f'Donor {i}',) for i in range(20)]
+    )
+    conn.execute(
+        "INSERT INTO media_files (filename, original_filename, file_path, file_size, file_type, mime_type, uploaded_by)"
+        " VALUES ('a.txt', 'a.txt', '/tmp/a.txt', 1, 'txt', 'text/plain', 1)"
+    )
+    conn.executemany(
+        "INSERT INTO page_views (page_path) VALUES (?)", [(f'/pagina/{i % 3}',) for i in range(20)]
+    )
+    conn.executemany(
+        "INSERT INTO analytics_events (event_type, mosque_id) VALUES ('click', ?)", [(i % 3 + 1,) for i in range(20)]
+    )
+    conn.executemany(
+        "INSERT INTO user_activity (user_id, activity_type) VALUES (1, ?)", [('login',) for _ in range(20)]
+    )
+    conn.commit()
+
+
+class TestQueryPlans:
+    """No API statement scans a large table unless explicitly allowed"""
+
+    def test_api_statements_use_indexes(self, sqlite_app, sqlite_client, sqlite_admin_headers, captured_statements):
+        pool = sqlite_app.extensions['db_pool']
+        conn = pool.dedicated_connection()
+        seed(conn)
+        del captured_statements[:]
+
+        for method, url, admin, body in REQUESTS:
+            headers = sqlite_admin_headers if admin else {}
+            response = sqlite_client.open(url, method=method, headers=headers, json=body)
+            # The seeded file row has no file on disk, so /api/files/1 fails after its query
+            if not url.startswith('/api/files/'):
+                assert response.status_code < 500, f"{method} {url}: {response.get_data(as_text=True)}"
+
+        statements = {
+            statement for statement in captured_statements
+            if re.match(r'\s*(SELECT|UPDATE|DELETE|WITH)\b', statement, re.IGNORECASE)
+            and 'sqlite_master' not in statement
+        }
+        assert len(statements) > 20
+
+        violations = []
+        used = set()
+        for statement in sorted(statements):
+            for table in sorted(full_scans(conn, statement)):
+                allowed = allowed_by(statement, table)
+                if not allowed:
+                    violations.append(f"full scan of {table}: {' '.join(statement.split())}")
+                used |= allowed
+        conn.close()
+
+        assert not violations, '\n'.join(violations)
+        # An entry no statement needs any more would silently cover a new one
+        unused = [pattern for pattern, _, _ in ALLOWED_SCANS if pattern not in used]
+        assert not unused, f"ALLOWED_SCANS entries without a matching scan: {unused}"
+
+    def test_indexes_created(self, sqlite_app):
+        conn = sqlite_app.extensions['db_pool'].connection()
+        names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        conn.close()
+        for name in ('idx_notifications_user_created', 'idx_notifications_user_unread',
+                     'idx_page_views_created', 'idx_donations_created',
+                     'idx_media_files_public_created', 'idx_events_active_date'):
+            assert name in names
+
+    def test_detects_full_scan(self, sqlite_app):
+        conn = sqlite_app.extensions['db_pool'].connection()
+        assert full_scans(conn, "SELECT * FROM page_views WHERE user_agent = 'x'") == {'page_views'}
+        assert full_scans(conn, "SELECT * FROM notifications n WHERE n.user_id = 1") == set()
+        conn.close()
@@ -0,0 +1,282 @@
+"""
+Tests for /api/search in the raw SQLite app (app.py)
+"""
+
+import pytest
+
+
+def search(client, **params):
+    response = client.get('/api/search', query_string=params)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def ids(results, content_type):
+    return sorted(item['id'] for item in results[content_type])
+
+
+@pytest.fixture
+def db_conn(sqlite_app):
+    conn = sqlite_app.extensions['db_pool'].connection()
+    yield conn
+    conn.close()
+
+
+class TestFullTextIndex:
+    """FTS5 index keeps LIKE semantics and stays in sync with writes"""
+
+    @pytest.mark.parametrize('query', ['moskee', 'GENT', 'ramadan', 'Al-Fath', 'iftar', 'Mansouri'])
+    def test_fts_matches_like_results(self, sqlite_app, sqlite_client, query):
+        assert sqlite_app.config['SEARCH_FTS_AVAILABLE']
+
+        sqlite_app.config['SEARCH_BACKEND'] = 'like'
+        like_results = search(sqlite_client, q=query)
+        sqlite_app.config['SEARCH_BACKEND'] = 'fts'
+        fts_results = search(sqlite_client, q=query)
+
+        for content_type in ('mosques', 'events', 'news', 'campaigns'):
+            assert ids(fts_results, content_type) == ids(like_results, content_type)
+        assert fts_results['total_results'] > 0
+
+    def test_short_query_falls_back_to_like(self, sqlite_client):
+        results = search(sqlite_client, q='Fa', type='mosques')
+        assert ids(results, 'mosques') == [2]
+
+    def test_insert_update_delete_are_indexed(self, sqlite_client, db_conn):
+        cursor = db_conn.execute(
+            "INSERT INTO news (title, content, author_id) VALUES ('Eid viering', 'Feest in het park', 1)"
+        )
+        news_id = cursor.lastrowid
+        db_conn.commit()
+        assert ids(search(sqlite_client, q='feest', type='news'), 'news') == [news_id]
+
+        db_conn.execute("UPDATE news SET content = 'Samenkomst in de sporthal' WHERE id = ?", (news_id,))
+        db_conn.commit()
+        assert ids(search(sqlite_client, q='feest', type='news'), 'news') == []
+        assert ids(search(sqlite_client, q='sporthal', type='news'), 'news') == [news_id]
+
+        db_conn.execute('DELETE FROM news WHERE id = ?', (news_id,))
+        db_conn.commit()
+        assert ids(search(sqlite_client, q='sporthal', type='news'), 'news') == []
+
+    def test_mosque_rename_reindexes_events_and_campaigns(self, sqlite_client, db_conn):
+        db_conn.execute("UPDATE mosques SET name = 'Moskee Tawhied' WHERE id = 3")
+        db_conn.commit()
+
+        results = search(sqlite_client, q='tawhied')
+        assert ids(results, 'mosques') == [3]
+        assert ids(results, 'events') == [3]
+        assert ids(results, 'campaigns') == [3]
+
+    def test_rebuild_command(self, sqlite_app, db_conn):
+        db_conn.execute('DELETE FROM mosques_fts')
+        db_conn.commit()
+
+        result = sqlite_app.test_cli_runner().invoke(args=['rebuild-search-index'])
+        assert result.exit_code == 0
+        assert 'mosques: 3 rows indexed' in result.output
+        assert db_conn.execute('SELECT COUNT(*) FROM mosques_fts').fetchone()[0] == 3
+
+
+@pytest.fixture
+def many_news(db_conn):
+    """45 published articles sharing a search term, plus the 3 seeded ones"""
+    db_conn.executemany(
+        "INSERT INTO news (title, content, author_id, published_at) VALUES (?, ?, 1, ?)",
+        [(f"Jumu'ah bericht {i:02d}", 'Wekelijkse khutbah samenvatting', f"2025-01-{(i % 28) + 1:02d} 12:00:00")
+         for i in range(45)]
+    )
+    db_conn.commit()
+
+
+class TestPagination:
+    """Keyset pagination, cursors and count modes"""
+
+    def test_page_is_bounded(self, sqlite_client, many_news):
+        results = search(sqlite_client, q='khutbah', type='news', per_page=20)
+        assert len(results['news']) == 20
+        assert results['has_more'] == {'news': True}
+        assert results['counts'] == {'news': 45}
+        assert results['counts_exact'] is True
+        assert results['total_pages'] == 3
+        assert results['next_cursor']
+
+    def test_cursor_walks_all_rows_once(self, sqlite_client, many_news):
+        full = search(sqlite_client, q='khutbah', type='news', per_page=100)
+        expected = [item['id'] for item in full['news']]
+
+        seen = []
+        params = {'q': 'khutbah', 'type': 'news', 'per_page': 20, 'count': 'none'}
+        while True:
+            results = search(sqlite_client, **params)
+            seen.extend(item['id'] for item in results['news'])
+            assert '_sort_key_0' not in (results['news'] or [{}])[0]
+            if not results['next_cursor']:
+                break
+            params['cursor'] = results['next_cursor']
+
+        assert seen == expected
+        assert len(seen) == 45
+
+    @pytest.mark.parametrize('sort', ['relevance', 'oldest', 'name', 'name_desc'])
+    def test_cursor_matches_offset_pages(self, sqlite_client, many_news, sort):
+        first = search(sqlite_client, q='khutbah', type='news', per_page=10, sort=sort)
+        via_cursor = search(sqlite_client, q='khutbah', type='news', per_page=10, sort=sort,
+                            cursor=first['next_cursor'])
+        via_offset = search(sqlite_client, q='khutbah', type='news', per_page=10, sort=sort, page=2)
+        assert ids(via_cursor, 'news') == ids(via_offset, 'news')
+
+    def test_cursor_only_continues_unfinished_types(self, sqlite_client, many_news):
+        first = search(sqlite_client, per_page=5)
+        assert first['has_more'] == {'mosques': False, 'events': False, 'news': True, 'campaigns': False}
+
+        second = search(sqlite_client, per_page=5, cursor=first['next_cursor'])
+        assert list(second['has_more']) == ['news']
+        assert second['mosques'] == []
+
+    def test_per_page_is_capped(self, sqlite_client, many_news):
+        results = search(sqlite_client, type='news', per_page=10000)
+        assert results['per_page'] == 100
+
+    def test_estimated_count_is_capped(self, sqlite_client, many_news, monkeypatch):
+        import app as legacy_app
+        monkeypatch.setattr(legacy_app, 'SEARCH_COUNT_ESTIMATE_CAP', 10)
+
+        estimate = search(sqlite_client, q='khutbah', type='news')
+        assert estimate['counts'] == {'news': 10}
+        assert estimate['counts_exact'] is False
+
+        exact = search(sqlite_client, q='khutbah', type='news', count='exact')
+        assert exact['counts'] == {'news': 45}
+        assert exact['counts_exact'] is True
+
+    @pytest.mark.parametrize('cursor', [
+        'not-a-cursor',
+        'eyJ2IjoxfQ',
+        # {"v":1,"s":"relevance","k":{"news":[{"a":1},1]}}: non-scalar key value
+        'eyJ2IjoxLCJzIjoicmVsZXZhbmNlIiwiayI6eyJuZXdzIjpbeyJhIjoxfSwxXX19',
+    ])
+    def test_invalid_cursor_rejected(self, sqlite_client, cursor):
+        response = sqlite_client.get('/api/search', query_string={'cursor': cursor})
+        assert response.status_code == 400
+
+    def test_cursor_bound_to_sort(self, sqlite_client, many_news):
+        first = search(sqlite_client, type='news', per_page=5)
+        response = sqlite_client.get('/api/search', query_string={
+            'type': 'news', 'per_page': 5, 'sort': 'oldest', 'cursor': first['next_cursor']
+        })
+        assert response.status_code == 400
+
+
+class TestSearchCache:
+    """Redis-backed result cache with per-type version invalidation"""
+
+    def test_repeat_query_served_from_cache(self, sqlite_client, fake_redis):
+        first = sqlite_client.get('/api/search', query_string={'q': 'moskee'})
+        assert first.headers['X-Cache'] == 'MISS'
+
+        second = sqlite_client.get('/api/search', query_string={'q': 'moskee'})
+        assert second.headers['X-Cache'] == 'HIT'
+        assert second.get_json() == first.get_json()
+
+    def test_equivalent_parameters_share_entry(self, sqlite_client, fake_redis):
+        search(sqlite_client, q='Moskee', type=['news', 'mosques'])
+        response = sqlite_client.get('/api/search', query_string={'q': ' moskee ', 'type': ['mosques', 'news']})
+        assert response.headers['X-Cache'] == 'HIT'
+
+    def test_page_ignored_with_cursor(self, sqlite_client, many_news, fake_redis):
+        first = search(sqlite_client, q='khutbah', type='news', per_page=10)
+        search(sqlite_client, q='khutbah', type='news', per_page=10, cursor=first['next_cursor'])
+        response = sqlite_client.get('/api/search', query_string={
+            'q': 'khutbah', 'type': 'news', 'per_page': 10, 'cursor': first['next_cursor'], 'page': 7
+        })
+        assert response.headers['X-Cache'] == 'HIT'
+        assert response.get_json()['page'] == 1
+
+    def test_bypassed_without_redis(self, sqlite_client):
+        response = sqlite_client.get('/api/search', query_string={'q': 'moskee'})
+        assert response.headers['X-Cache'] == 'BYPASS'
+
+    def test_invalidation_follows_dependencies(self, sqlite_client, db_conn, fake_redis):
+        from cache_service import invalidate_search_cache
+
+        search(sqlite_client, q='gent', type='news')
+        search(sqlite_client, q='gent', type='events')
+
+        db_conn.execute("UPDATE mosques SET name = 'Moskee Tawhied' WHERE id = 3")
+        db_conn.commit()
+        invalidate_search_cache('mosques')
+
+        news = sqlite_client.get('/api/search', query_string={'q': 'gent', 'type': 'news'})
+        assert news.headers['X-Cache'] == 'HIT'
+        events = sqlite_client.get('/api/search', query_string={'q': 'tawhied', 'type': 'events'})
+        assert events.headers['X-Cache'] == 'MISS'
+        assert ids(events.get_json(), 'events') == [3]
+        stale = sqlite_client.get('/api/search', query_string={'q': 'gent', 'type': 'events'})
+        assert stale.headers['X-Cache'] == 'MISS'
+
+
+class TestFanOut:
+    """Per-type queries on a thread pool with a time budget"""
+
+    @pytest.mark.parametrize('params', [
+        {'q': 'moskee'},
+        {'q': 'gent', 'sort': 'name', 'per_page': 2},
+        {'q': 'khutbah', 'count': 'exact'},
+        {'location': 'gent', 'capacity_min': 100},
+    ])
+    def test_parallel_matches_sequential(self, sqlite_app, sqlite_client, many_news, params):
+        sqlite_app.config['SEARCH_FANOUT_WORKERS'] = 1
+        sequential = search(sqlite_client, **params)
+        sqlite_app.config['SEARCH_FANOUT_WORKERS'] = 4
+        parallel = search(sqlite_client, **params)
+
+        assert parallel == sequential
+        assert parallel['timed_out'] == []
+
+    def test_slow_type_returns_partial_results(self, sqlite_app, sqlite_client, db_conn, fake_redis):
+        db_conn.executemany(
+            "INSERT INTO news (title, content, author_id) VALUES (?, ?, 1)",
+            [(f"Bericht {i}", 'Lange tekst over de gemeenschap ' * 20) for i in range(20000)]
+        )
+        db_conn.commit()
+        sqlite_app.config['SEARCH_BACKEND'] = 'like'
+        sqlite_app.config['SEARCH_TYPE_BUDGET_MS'] = 1
+
+        response = sqlite_client.get('/api/search', query_string={'q': 'khutbah', 'count': 'exact'})
+        assert response.status_code == 200
+        results = response.get_json()
+        assert 'news' in results['timed_out']
+        assert results['counts_exact'] is False
+
+        # Partial responses are not cached
+        again = sqlite_client.get('/api/search', query_string={'q': 'khutbah', 'count': 'exact'})
+        assert again.headers['X-Cache'] == 'MISS'
+
+    def test_interrupted_page_keeps_rows_read(self, sqlite_app, sqlite_client, db_conn):
+        # Ordered by an index, so matching rows stream out before the slow
+        # scan over the non-matching tail is interrupted
+        db_conn.execute('CREATE INDEX idx_news_status_title ON news (status, title COLLATE NOCASE, id)')
+        db_conn.executemany(
+            "INSERT INTO news (title, content, author_id) VALUES (?, ?, 1)",
+            [(f"Aaa khutbah {i:02d}", 'Kort', ) for i in range(20)]
+            + [(f"Bericht {i}", 'Lange tekst over de gemeenschap ' * 20) for i in range(20000)]
+        )
+        db_conn.commit()
+        sqlite_app.config['SEARCH_BACKEND'] = 'like'
+        sqlite_app.config['SEARCH_TYPE_BUDGET_MS'] = 20
+
+        results = search(sqlite_client, q='khutbah', type='news', sort='name', per_page=50, count='none')
+        assert results['timed_out'] == ['news']
+        titles = [item['title'] for item in results['news']]
+        assert titles
+        assert titles == [f"Aaa khutbah {i:02d}" for i in range(len(titles))]
+        assert results['has_more'] == {'news': True}
+        assert results['next_cursor']
+
+    def test_budget_disabled(self, sqlite_app, sqlite_client, many_news):
+        sqlite_app.config['SEARCH_TYPE_BUDGET_MS'] = 0
+        results = search(sqlite_client, q='khutbah')
+        assert results['timed_out'] == []
+        assert results['counts']['news'] == 45
+        assert results['counts_exact'] is True